@@ -1,2 +1,9 @@
-from .ax25UIframe_decoder import AX25UIFrameDecoder
-from .ax25UI import AX25UIFrame
\ No newline at end of file
+from .ax25UIframe_decoder import AX25UIFrameDecoder, FCSError
+from .ax25UI import AX25UIFrame
+from .fcs import FCS, compute_fcs, verify_many
+from .deframer import AX25UIDeframer, RawFrame
+from .encoder import AX25UIPacketEncoder
+from .frame_view import AX25UIFrameView
+from .fragmentation import AX25UIFragmenter, AX25UIReassembler, FRAGMENT_SSID
+from .dedup import AX25UIDeduplicator
+from .command_codec import AX25UICommandCodec, COMMAND_SSID, parse_command, format_command, decode_commands, is_binary_commands
@@ -1,4 +1,6 @@
-import struct
+from functools import lru_cache
+
+from .fcs import FCS_POLY, compute_fcs
 
 """ 
 The AX25UIFrame class creates a frame using the AX.25 protocol using a 
@@ -9,7 +11,7 @@ class AX25UIFrame:
     FLAG = 0x7E         # Flags are at then beginning and end of the frame
     CONTROL = 0x3F      # Control field is 3F for UI frames
     PID = 0xF0          # F0 for PID field specifies that no layer 3 protol is used
-    FCS_POLY = 0x8408
+    FCS_POLY = FCS_POLY
 
     def __init__(self, info, ssid_type):
         self.source = "GROUND"
@@ -29,21 +31,7 @@ class AX25UIFrame:
         Returns:
             _type_: _description_
         """
-        # Address needs 6 bytes so must be padded
-        callsign = callsign.ljust(6)
-        encoded = bytearray()
-
-        # Each character of the callsign must be bit shifted with a 0 at the end
-        for char in callsign:
-            encoded.append(ord(char) << 1)
-        
-        # The final bit of the address should be a 1 if it is the last callsign in the address field
-        if(ssid != 0b0000):
-            ssid_byte = 0b01100000 | (ssid << 1) | 1  
-        else:
-            ssid_byte = 0b01100000 | (ssid << 1)
-        encoded.append(ssid_byte)
-        return encoded
+        return bytearray(encode_address(callsign, ssid))
 
     def create_frame(self):
         """Creates the UI frame based on all the information specified"""
@@ -89,31 +77,30 @@ class AX25UIFrame:
         Returns:
             bytes: The computed FCS which is two bytes
         """
-        # Initialize FCS to 0xFFFF
-        fcs = 0xFFFF
-        
-        # Loop through each byte in the frame
-        for byte in frame:
-            # XOR the byte with the current FCS value
-            fcs ^= byte
-            
-            # Perform bitwise operations for each of the 8 bits in the byte
-            for _ in range(8):
-                # Check if the least significant bit of the FCS is 1
-                if fcs & 0x01:
-                    # If it is 1, right shift the FCS and XOR with the polynomial
-                    fcs = (fcs >> 1) ^ self.FCS_POLY
-                else:
-                    # If it is 0, simply right shift the FCS
-                    fcs >>= 1
-        
-        # Invert all the bits in the FCS and mask to ensure it fits within 16 bits
-        fcs = ~fcs & 0xFFFF
-        
-        # Return the FCS packed as a little-endian 16-bit unsigned integer
-        return struct.pack('<H', fcs)
+        return compute_fcs(frame)
 
 
     def to_hex(self, frame):
         """Converts bytes to hexadecimal"""
-        return ' '.join(format(x, '02x') for x in frame)
\ No newline at end of file
+        return ' '.join(format(x, '02x') for x in frame)
+
+
+@lru_cache(maxsize=64)
+def encode_address(callsign, ssid):
+    """Encode a callsign and SSID into the 7 byte address format, the result
+    is cached as the same few addresses are used for every frame"""
+    # Address needs 6 bytes so must be padded
+    callsign = callsign.ljust(6)
+    encoded = bytearray()
+
+    # Each character of the callsign must be bit shifted with a 0 at the end
+    for char in callsign:
+        encoded.append(ord(char) << 1)
+    
+    # The final bit of the address should be a 1 if it is the last callsign in the address field
+    if(ssid != 0b0000):
+        ssid_byte = 0b01100000 | (ssid << 1) | 1  
+    else:
+        ssid_byte = 0b01100000 | (ssid << 1)
+    encoded.append(ssid_byte)
+    return bytes(encoded)
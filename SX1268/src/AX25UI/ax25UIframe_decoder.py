@@ -1,58 +1,35 @@
-import struct
+from .fcs import check_fcs, compute_fcs
+from .frame_view import AX25UIFrameView
+
+class FCSError(ValueError):
+    """The frame check sequence of a received frame does not match its contents"""
+
 
 class AX25UIFrameDecoder:
-    def decode_ax25_frame(self, frame):
-        """Decode an AX.25 frame and extract the relevant fields"""
+    # Flags, addresses, control, PID and FCS
+    MIN_FRAME_LEN = 1 + 7 + 7 + 1 + 1 + 2 + 1
+
+    def decode_view(self, frame):
+        """Check an AX.25 frame and return a zero-copy view of its fields"""
         # Ensure there are beginning and ending flags
         if frame[0] != 0x7E or frame[-1] != 0x7E:
             raise ValueError("Invalid AX.25 frame - flag bit not present")
+        if len(frame) < self.MIN_FRAME_LEN:
+            raise ValueError("Invalid AX.25 frame - too short")
 
-        # Address field - destination
-        destination_callsign = ''.join([chr((frame[i] >> 1) & 0x7F) for i in range(1, 7)]).strip()
-        destination_ssid = (frame[7] >> 1) & 0x0F
-
-        # Address field - source
-        source_callsign = ''.join([chr((frame[i] >> 1) & 0x7F) for i in range(8, 14)]).strip()
-        source_ssid = (frame[14] >> 1) & 0x0F
-
-        # Control
-        control_field = frame[15]
+        # FCS, checked over the frame and its own FCS
+        view = AX25UIFrameView(frame)
+        if not check_fcs(view.frame[1:-1]):
+            raise FCSError("FCS check failed")
+        return view
 
-        # PID
-        pid_field = frame[16]
-
-        # Info
-        info_field = frame[17:-3]#.decode('ascii')
-
-        # FCS
-        received_fcs = frame[-3:-1]
-        calculated_fcs = self.compute_fcs(frame[1:-3])
-
-        if received_fcs != calculated_fcs:
-            raise ValueError("FCS check failed")
-
-        return {
-            'd_call': destination_callsign,
-            'd_ssid': destination_ssid,
-            's_call': source_callsign,
-            's_ssid': source_ssid,
-            'control': control_field,
-            'pid': pid_field,
-            'info': info_field
-        }
+    def decode_ax25_frame(self, frame):
+        """Decode an AX.25 frame and extract the relevant fields"""
+        return self.decode_view(frame).to_dict()
 
     def compute_fcs(self, frame):
         """Compute the Frame Check Sequence (FCS) for a given frame using the CRC-CCITT algorithm."""
-        fcs = 0xFFFF
-        for byte in frame:
-            fcs ^= byte
-            for _ in range(8):
-                if fcs & 0x01:
-                    fcs = (fcs >> 1) ^ 0x8408
-                else:
-                    fcs >>= 1
-        fcs = ~fcs & 0xFFFF
-        return struct.pack('<H', fcs)
+        return compute_fcs(frame)
 
 
 # ~\x8e\xa4\x9e\xaa\x9c\x88|\x88\x8a\x84\xa4\x82@a?\xf0\xd2\x02\x96I\x01\x80@ \x10\x08\x04\x02\x00\x81A!\x11\t\x05\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\xd0!~
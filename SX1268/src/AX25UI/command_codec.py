@@ -0,0 +1,120 @@
+import struct
+
+from .encoder import FRAME_OVERHEAD
+from .fragmentation import MODULE_ECHO_LEN
+
+"""
+Binary encoding of <component>,<component_id>,<command> commands. Instead of
+one ASCII command per frame, as many commands as fit in the module packet
+are packed into the info field of one command frame:
+
+    magic (0xCB), command count, then per command:
+    component (1 ASCII character), component_id (uint8), command (uint8)
+
+"c,0,1" takes 3 bytes of a shared frame instead of a frame of its own. The
+magic byte is never the first byte of an ASCII command, so decoders can tell
+the two formats apart and still accept the text commands of older software.
+"""
+
+COMMAND_SSID = 0b0111
+COMMAND_MAGIC = 0xCB
+
+# Magic, number of commands
+COMMAND_HEADER = struct.Struct('<BB')
+
+# Component, component_id, command
+COMMAND_FORMAT = struct.Struct('<cBB')
+
+
+def parse_command(command):
+    """
+    Split a text command into its fields
+
+    Args:
+        command (str or tuple): "<component>,<component_id>,<command>" or a
+            (component, component_id, command) tuple
+
+    Returns:
+        tuple: (component, component_id, command) as (str, int, int)
+    """
+    if isinstance(command, str):
+        fields = [field.strip() for field in command.split(',')]
+        if len(fields) != 3:
+            raise ValueError(f"Command {command!r} is not in the format <component>,<component_id>,<command>")
+    else:
+        fields = list(command)
+        if len(fields) != 3:
+            raise ValueError(f"Command {command!r} does not have 3 fields")
+
+    component, component_id, value = fields
+    try:
+        component_id, value = int(component_id), int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Command {command!r} needs a numeric component_id and command")
+    if not isinstance(component, str) or len(component) != 1 or not component.isascii():
+        raise ValueError(f"Command {command!r} needs a single ASCII character component")
+    if not 0 <= component_id <= 255 or not 0 <= value <= 255:
+        raise ValueError(f"Command {command!r} has a component_id or command outside 0-255")
+    return component, component_id, value
+
+
+def format_command(command):
+    """Text form of a (component, component_id, command) tuple"""
+    return "{0},{1},{2}".format(*command)
+
+
+def is_binary_commands(payload):
+    """True if a command frame payload uses the binary encoding"""
+    return len(payload) >= COMMAND_HEADER.size and payload[0] == COMMAND_MAGIC
+
+
+def decode_commands(payload):
+    """
+    Unpack a binary command payload
+
+    Returns:
+        list: (component, component_id, command) tuples in the order they were packed
+    """
+    magic, count = COMMAND_HEADER.unpack_from(payload)
+    if magic != COMMAND_MAGIC:
+        raise ValueError("Not a binary command payload")
+    if len(payload) != COMMAND_HEADER.size + count * COMMAND_FORMAT.size:
+        raise ValueError(f"Binary command payload of {len(payload)} bytes does not hold {count} commands")
+    return [
+        (component.decode('ascii'), component_id, value)
+        for component, component_id, value in COMMAND_FORMAT.iter_unpack(bytes(payload[COMMAND_HEADER.size:]))
+    ]
+
+
+class AX25UICommandCodec:
+    def __init__(self, buffer_size=240):
+        """
+        Args:
+            buffer_size (int): Module packet size, one of transceiver.config.PACKET_SIZES
+        """
+        self.max_payload = buffer_size - MODULE_ECHO_LEN - FRAME_OVERHEAD
+        self.max_commands = min(255, (self.max_payload - COMMAND_HEADER.size) // COMMAND_FORMAT.size)
+        if self.max_commands < 1:
+            raise ValueError(f"Packet size of {buffer_size} bytes is too small for a command")
+
+    def encode(self, commands):
+        """
+        Pack commands into as few command frame payloads as possible
+
+        Args:
+            commands (list): Text commands or (component, component_id, command) tuples
+
+        Returns:
+            list: Info fields for frames with COMMAND_SSID, in command order
+        """
+        parsed = [parse_command(command) for command in commands]
+        payloads = []
+        for start in range(0, len(parsed), self.max_commands):
+            batch = parsed[start:start + self.max_commands]
+            payload = bytearray(COMMAND_HEADER.pack(COMMAND_MAGIC, len(batch)))
+            for component, component_id, value in batch:
+                payload += COMMAND_FORMAT.pack(component.encode('ascii'), component_id, value)
+            payloads.append(bytes(payload))
+        return payloads
+
+    decode = staticmethod(decode_commands)
@@ -0,0 +1,104 @@
+import time
+from collections import OrderedDict
+
+"""
+The AX25UIDeduplicator class recognises frames that have already been
+received, e.g. when a relay repeats them or several radios hear the same
+transmission. Frames are looked up by a cheap fingerprint (FCS, source
+address, SSID and length) and a match is confirmed by comparing the frame
+contents, so a fingerprint collision never drops a new frame. Memory is
+bounded by the number of frames remembered and by how long they are kept.
+"""
+
+class AX25UIDeduplicator:
+    def __init__(self, max_entries=1024, window=30.0, refresh_on_hit=False, clock=time.monotonic):
+        """
+        Args:
+            max_entries (int): Frames remembered, the oldest entry is evicted first
+            window (float): Seconds a frame is remembered, None to only evict by count
+            refresh_on_hit (bool): Restart the window of a frame and make it the newest
+                entry when a copy arrives (LRU), so a frame that keeps being repeated is
+                never stored twice. Otherwise entries age from when they were first seen.
+            clock (callable): Time source, in seconds
+        """
+        self.max_entries = max_entries
+        self.window = window
+        self.refresh_on_hit = refresh_on_hit
+        self.clock = clock
+
+        # Fingerprint -> (frame contents, time first or last seen), oldest first
+        self._entries = OrderedDict()
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.evicted = 0
+        self.expired = 0
+
+    @staticmethod
+    def fingerprint(frame):
+        """FCS, source address and SSID byte and length of a frame view"""
+        data = frame.frame
+        return bytes(data[-3:-1]), bytes(data[8:15]), data[7], len(data)
+
+    def seen(self, frame):
+        """
+        Check a frame and remember it
+
+        Args:
+            frame (AX25UIFrameView): A decoded frame
+
+        Returns:
+            bool: True if the same frame was received within the window
+        """
+        now = self.clock()
+        self._expire(now)
+
+        key = self.fingerprint(frame)
+        contents = bytes(frame.frame[1:-3])
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] == contents:
+                self.hits += 1
+                if self.refresh_on_hit:
+                    self._entries[key] = (contents, now)
+                    self._entries.move_to_end(key)
+                return True
+            # Same fingerprint, different frame
+            self.collisions += 1
+            del self._entries[key]
+
+        self.misses += 1
+        self._entries[key] = (contents, now)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+        return False
+
+    def _expire(self, now):
+        if self.window is None:
+            return
+        cutoff = now - self.window
+        while self._entries:
+            key, (_, seen_at) = next(iter(self._entries.items()))
+            if seen_at > cutoff:
+                break
+            del self._entries[key]
+            self.expired += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
@@ -0,0 +1,166 @@
+from collections import namedtuple
+
+from .fcs import FCS_GOOD, FCS_INIT, update_fcs
+
+"""
+The AX25UIDeframer class splits a raw byte stream from the LoRa module into
+AX.25 UI frames. Bytes can be fed in chunks of any size and every frame is
+returned as soon as its closing flag arrives and its FCS checks out.
+
+Frames are not bit-stuffed, so 0x7E can also appear inside the address and
+info fields and in the module's address/RSSI bytes. Every flag is therefore
+tracked as a candidate opening flag, and a frame only ends on a flag where
+the FCS of the bytes since a candidate is valid.
+"""
+
+# A received frame, with the module bytes that came before and after it
+RawFrame = namedtuple('RawFrame', ['frame', 'header', 'rssi'])
+
+
+class AX25UIDeframer:
+    FLAG = 0x7E
+
+    # Destination and source addresses, control, PID and FCS
+    MIN_BODY_LEN = 7 + 7 + 1 + 1 + 2
+
+    def __init__(self, prefix_len=3, rssi=False, max_frame_len=256, max_candidates=16):
+        """
+        Args:
+            prefix_len (int): Number of module bytes (sender address and channel)
+                before each frame. They are returned as the frame header.
+            rssi (bool): True if the module appends a packet RSSI byte after each frame
+            max_frame_len (int): Longest frame accepted, including flags. Candidate
+                starts that run longer are dropped, which bounds the internal buffer.
+            max_candidates (int): How many candidate opening flags are tracked at
+                once. 1 only resynchronises once the current candidate has expired.
+        """
+        self.prefix_len = prefix_len
+        self.rssi = rssi
+        self.max_frame_len = max_frame_len
+        self.max_candidates = max(1, max_candidates)
+
+        # Statistics
+        self.frames_out = 0
+        self.bytes_discarded = 0
+
+        self.reset()
+
+    def reset(self):
+        """Drop all buffered bytes, e.g. after the module has been reconfigured"""
+        self.buffer = bytearray()
+
+        # Each candidate is [index of the opening flag, FCS register]
+        self._candidates = []
+
+        # Index of the next byte that has not been checksummed yet
+        self._scan = 0
+
+        # Frame waiting for its trailing RSSI byte, as (start, end) indexes
+        self._awaiting = None
+
+    def feed(self, data):
+        """
+        Add bytes read from the module and return the frames they completed
+
+        Args:
+            data (bytes): Any number of bytes, frames may be split anywhere
+
+        Returns:
+            list: RawFrame tuples, in the order the frames were received
+        """
+        frames = []
+        buf = self.buffer
+        buf.extend(data)
+
+        while True:
+            if self._awaiting is not None:
+                start, end = self._awaiting
+                if len(buf) <= end + 1:
+                    break
+                frames.append(self._emit(start, end, buf[end + 1]))
+                self._consume(end + 2)
+                continue
+
+            if self._scan >= len(buf):
+                break
+
+            flag = buf.find(self.FLAG, self._scan)
+            stop = flag if flag >= 0 else len(buf)
+
+            # Checksum the bytes up to the next flag for every candidate
+            if stop > self._scan and self._candidates:
+                chunk = bytes(buf[self._scan:stop])
+                for candidate in self._candidates:
+                    candidate[1] = update_fcs(candidate[1], chunk)
+            self._scan = stop
+            self._expire_candidates()
+
+            if flag < 0:
+                break
+
+            # Check whether this flag closes a frame, oldest candidate first
+            closed = None
+            for candidate in self._candidates:
+                if flag - candidate[0] - 1 >= self.MIN_BODY_LEN and candidate[1] == FCS_GOOD:
+                    closed = candidate
+                    break
+
+            if closed is not None:
+                if self.rssi:
+                    self._awaiting = (closed[0], flag)
+                else:
+                    frames.append(self._emit(closed[0], flag, None))
+                    self._consume(flag + 1)
+                continue
+
+            # The flag is part of the frame data for the open candidates. A
+            # flag straight after a candidate start means that start was only
+            # a flag fill, as an address byte can never be 0x7E.
+            if self._candidates and self._candidates[-1][0] == flag - 1:
+                self._candidates.pop()
+            for candidate in self._candidates:
+                candidate[1] = update_fcs(candidate[1], (self.FLAG,))
+            if len(self._candidates) >= self.max_candidates:
+                self._candidates.pop(0)
+            self._candidates.append([flag, FCS_INIT])
+            self._scan = flag + 1
+
+        self._trim()
+        return frames
+
+    def _emit(self, start, end, rssi):
+        """Build the RawFrame for the frame between the flags at start and end"""
+        buf = self.buffer
+        header = bytes(buf[max(0, start - self.prefix_len):start])
+        self.frames_out += 1
+        return RawFrame(bytes(buf[start:end + 1]), header, rssi)
+
+    def _consume(self, length):
+        """Remove a finished frame and everything before it from the buffer"""
+        del self.buffer[:length]
+        self._candidates = []
+        self._scan = 0
+        self._awaiting = None
+
+    def _expire_candidates(self):
+        """Drop candidate starts which have grown longer than any valid frame"""
+        limit = self._scan - self.max_frame_len + 1
+        if self._candidates and self._candidates[0][0] < limit:
+            self._candidates = [c for c in self._candidates if c[0] >= limit]
+
+    def _trim(self):
+        """Discard bytes that can no longer be part of a frame or its header"""
+        if self._awaiting is not None:
+            return
+        if self._candidates:
+            keep_from = self._candidates[0][0] - self.prefix_len
+        else:
+            keep_from = self._scan - self.prefix_len
+        if keep_from <= 0:
+            return
+
+        del self.buffer[:keep_from]
+        self.bytes_discarded += keep_from
+        self._scan -= keep_from
+        for candidate in self._candidates:
+            candidate[0] -= keep_from
@@ -0,0 +1,98 @@
+import struct
+
+from .ax25UI import AX25UIFrame, encode_address
+from .fcs import FCS_INIT, update_fcs
+
+"""
+The AX25UIPacketEncoder class builds complete packets for the LoRa module:
+the 6-byte module header (target address and channel, then our own address
+and channel) followed by an AX.25 UI frame. Everything except the info field
+and FCS is the same for every packet sent with the same settings, so it is
+built once per combination, together with the FCS register over the fixed
+bytes, and each packet is written into a preallocated buffer.
+"""
+
+# Bytes of a frame that are not info: 2 flags, 2 addresses, control, PID and FCS
+FRAME_OVERHEAD = 1 + 7 + 7 + 1 + 1 + 2 + 1
+
+# Target address, target channel, own address and own channel
+MODULE_HEADER = struct.Struct('>HBHB')
+
+
+class PacketTemplate:
+    """Preallocated packet for one set of addresses and module settings"""
+    __slots__ = ('buffer', 'view', 'info_start', 'fcs_register', 'max_info_len')
+
+    def __init__(self, module_header, address_block, max_info_len):
+        frame_start = address_block + bytes([AX25UIFrame.CONTROL, AX25UIFrame.PID])
+        prefix = module_header + bytes([AX25UIFrame.FLAG]) + frame_start
+        self.info_start = len(prefix)
+        self.max_info_len = max_info_len
+        self.buffer = bytearray(prefix) + bytearray(max_info_len + 3)
+        self.view = memoryview(self.buffer)
+
+        # FCS register after the addresses, control and PID
+        self.fcs_register = update_fcs(FCS_INIT, frame_start)
+
+    def fill(self, info):
+        """Write the info field, FCS and closing flag and return a view of the packet"""
+        length = len(info)
+        if length > self.max_info_len:
+            raise ValueError(f"Info field is {length} bytes, the maximum is {self.max_info_len}")
+
+        start = self.info_start
+        end = start + length
+        view = self.view
+        view[start:end] = info
+        fcs = ~update_fcs(self.fcs_register, view[start:end]) & 0xFFFF
+        view[end] = fcs & 0xFF
+        view[end + 1] = fcs >> 8
+        view[end + 2] = AX25UIFrame.FLAG
+        return view[:end + 3]
+
+
+class AX25UIPacketEncoder:
+    def __init__(self, source="GROUND", destination="DEBRA", max_info_len=240):
+        """
+        Args:
+            source (str): Our callsign
+            destination (str): Satellite callsign
+            max_info_len (int): Largest info field that will be encoded
+        """
+        self.source = source
+        self.destination = destination
+        self.max_info_len = max_info_len
+        self._templates = {}
+
+    def template(self, ssid, target_addr, target_freq, own_addr, own_freq):
+        """Return the cached template for these settings, building it on first use"""
+        key = (self.source, self.destination, ssid, target_addr, target_freq, own_addr, own_freq)
+        template = self._templates.get(key)
+        if template is None:
+            module_header = MODULE_HEADER.pack(target_addr, target_freq, own_addr, own_freq)
+            address_block = encode_address(self.destination, 0b0000) + encode_address(self.source, ssid)
+            template = PacketTemplate(module_header, address_block, self.max_info_len)
+            self._templates[key] = template
+        return template
+
+    def encode_into(self, info, ssid, target_addr, target_freq, own_addr, own_freq):
+        """
+        Build a packet in the template's buffer without copying it
+
+        The returned memoryview is only valid until the next packet is encoded
+        with the same settings.
+
+        Args:
+            info (str or bytes-like): Message to send
+            ssid (int): Data type of the message
+
+        Returns:
+            memoryview: Module header followed by the AX.25 frame
+        """
+        if isinstance(info, str):
+            info = info.encode('ascii')
+        return self.template(ssid, target_addr, target_freq, own_addr, own_freq).fill(info)
+
+    def encode(self, info, ssid, target_addr, target_freq, own_addr, own_freq):
+        """Build a packet, returned as bytes so it can be kept or queued"""
+        return bytes(self.encode_into(info, ssid, target_addr, target_freq, own_addr, own_freq))
@@ -0,0 +1,174 @@
+import itertools
+import random
+import struct
+import time
+from collections import OrderedDict
+
+from .encoder import FRAME_OVERHEAD
+
+"""
+Fragmentation of payloads that do not fit in one LoRa module packet. Each
+fragment is sent as the info field of a frame with FRAGMENT_SSID and starts
+with a small header: the SSID of the whole payload, a message id, the
+fragment index and the number of fragments. The receiving side rebuilds the
+payload with bounded memory and hands it on with its original SSID.
+"""
+
+FRAGMENT_SSID = 0b1001
+
+# Payload SSID, message id, fragment index, fragment count
+FRAGMENT_HEADER = struct.Struct('<BHBB')
+
+# Our own address and channel, which the module sends in front of each frame
+MODULE_ECHO_LEN = 3
+
+
+def max_fragment_payload(buffer_size):
+    """Payload bytes that fit in one fragment for a module packet size"""
+    return buffer_size - MODULE_ECHO_LEN - FRAME_OVERHEAD - FRAGMENT_HEADER.size
+
+
+class AX25UIFragmenter:
+    def __init__(self, buffer_size=240):
+        """
+        Args:
+            buffer_size (int): Module packet size, one of transceiver.config.PACKET_SIZES
+        """
+        self.max_payload = max_fragment_payload(buffer_size)
+        if self.max_payload <= 0:
+            raise ValueError(f"Packet size of {buffer_size} bytes is too small for fragments")
+        # Started at random, so ids after a restart do not join partial
+        # payloads the receiver still holds from before it
+        self._message_ids = itertools.count(random.randrange(0x10000))
+
+    def fits(self, payload):
+        """True if the payload can be sent in a single unfragmented frame"""
+        return len(payload) <= self.max_payload + FRAGMENT_HEADER.size
+
+    def fragment(self, payload, ssid):
+        """
+        Split a payload into fragment info fields
+
+        Args:
+            payload (bytes-like): Data to send
+            ssid (int): Data type of the whole payload
+
+        Returns:
+            list: Info fields to send with FRAGMENT_SSID, in order
+        """
+        payload = memoryview(bytes(payload))
+        count = max(1, -(-len(payload) // self.max_payload))
+        if count > 255:
+            raise ValueError(f"Payload of {len(payload)} bytes needs more than 255 fragments")
+
+        message_id = next(self._message_ids) & 0xFFFF
+        fragments = []
+        for index in range(count):
+            chunk = payload[index * self.max_payload:(index + 1) * self.max_payload]
+            fragments.append(FRAGMENT_HEADER.pack(ssid, message_id, index, count) + chunk)
+        return fragments
+
+
+class AX25UIReassembler:
+    DEFAULT_TIMEOUT = 30.0
+
+    def __init__(self, max_messages=16, max_bytes=64 * 1024, timeout=DEFAULT_TIMEOUT, clock=time.monotonic):
+        """
+        Args:
+            max_messages (int): Maximum number of partial payloads held
+            max_bytes (int): Maximum number of fragment bytes held in total
+            timeout (float): Seconds without a new fragment before a partial payload is dropped
+            clock (callable): Time source, in seconds
+        """
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.clock = clock
+
+        # (stream, message id) -> partial payload, least recently updated first
+        self.pending = OrderedDict()
+        self.held_bytes = 0
+
+        # Statistics
+        self.completed = 0
+        self.evicted = 0
+        self.expired = 0
+        self.duplicates = 0
+
+    def add(self, info, stream=None):
+        """
+        Add a fragment
+
+        Args:
+            info (bytes-like): Info field of a FRAGMENT_SSID frame
+            stream (hashable): Where the fragment came from, so message ids
+                from different senders do not mix
+
+        Returns:
+            tuple: (ssid, payload) once every fragment has arrived, otherwise None
+        """
+        if len(info) < FRAGMENT_HEADER.size:
+            raise ValueError("Fragment shorter than its header")
+        ssid, message_id, index, count = FRAGMENT_HEADER.unpack_from(info)
+        if count == 0 or index >= count:
+            raise ValueError(f"Invalid fragment {index} of {count}")
+
+        now = self.clock()
+        self._expire(now)
+
+        key = (stream, message_id)
+        entry = self.pending.get(key)
+        if entry is None or entry["count"] != count or entry["ssid"] != ssid:
+            if entry is not None:
+                # The message id has wrapped around onto a stale entry
+                self._drop(key)
+            entry = {"ssid": ssid, "count": count, "fragments": {}, "size": 0, "updated": now}
+            self.pending[key] = entry
+
+        if index in entry["fragments"]:
+            self.duplicates += 1
+            return None
+
+        data = bytes(info[FRAGMENT_HEADER.size:])
+        entry["fragments"][index] = data
+        entry["size"] += len(data)
+        entry["updated"] = now
+        self.held_bytes += len(data)
+        self.pending.move_to_end(key)
+
+        if len(entry["fragments"]) == count:
+            self._drop(key)
+            self.completed += 1
+            return ssid, b''.join(entry["fragments"][i] for i in range(count))
+
+        while self.pending and (len(self.pending) > self.max_messages or self.held_bytes > self.max_bytes):
+            self._drop(next(iter(self.pending)))
+            self.evicted += 1
+        return None
+
+    def _drop(self, key):
+        entry = self.pending.pop(key)
+        self.held_bytes -= entry["size"]
+
+    def flush_expired(self, force=False):
+        """
+        Drop partial payloads older than the timeout, they cannot be decoded
+
+        Args:
+            force (bool): Drop all of them whatever their age, e.g. at the end of a capture
+
+        Returns:
+            int: Number of partial payloads dropped
+        """
+        expired = self.expired
+        self._expire(float('inf') if force else self.clock())
+        return self.expired - expired
+
+    def _expire(self, now):
+        cutoff = now - self.timeout
+        while self.pending:
+            key, entry = next(iter(self.pending.items()))
+            if entry["updated"] > cutoff:
+                break
+            self._drop(key)
+            self.expired += 1
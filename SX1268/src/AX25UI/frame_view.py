@@ -0,0 +1,82 @@
+"""
+The AX25UIFrameView class gives access to the fields of a received AX.25
+UI frame without copying it. It wraps a memoryview over the receive buffer,
+the info field is a slice of that view and callsigns are only decoded (and
+then cached) when they are used.
+"""
+
+# Address bytes hold the ASCII character shifted left by one
+_CALLSIGN_TABLE = bytes(((value >> 1) & 0x7F) for value in range(256))
+
+
+class AX25UIFrameView:
+    __slots__ = ('frame', 'rssi', '_d_call', '_s_call')
+
+    def __init__(self, frame):
+        """
+        Args:
+            frame (bytes-like): Complete frame including the flags, it is not copied
+        """
+        self.frame = frame if isinstance(frame, memoryview) else memoryview(frame)
+        # Packet RSSI in dBm, set by the receiver when the module reports it
+        self.rssi = None
+        self._d_call = None
+        self._s_call = None
+
+    @staticmethod
+    def _callsign(address):
+        return bytes(address).translate(_CALLSIGN_TABLE).decode('ascii').strip()
+
+    @property
+    def ssid(self):
+        """Data type of the frame, the destination SSID"""
+        return (self.frame[7] >> 1) & 0x0F
+
+    @property
+    def d_call(self):
+        if self._d_call is None:
+            self._d_call = self._callsign(self.frame[1:7])
+        return self._d_call
+
+    @property
+    def d_ssid(self):
+        return (self.frame[7] >> 1) & 0x0F
+
+    @property
+    def s_call(self):
+        if self._s_call is None:
+            self._s_call = self._callsign(self.frame[8:14])
+        return self._s_call
+
+    @property
+    def s_ssid(self):
+        return (self.frame[14] >> 1) & 0x0F
+
+    @property
+    def control(self):
+        return self.frame[15]
+
+    @property
+    def pid(self):
+        return self.frame[16]
+
+    @property
+    def info(self):
+        """Info field as a memoryview slice of the frame"""
+        return self.frame[17:-3]
+
+    @property
+    def fcs(self):
+        return self.frame[-3:-1]
+
+    def to_dict(self):
+        """Return the fields in the dict format of AX25UIFrameDecoder.decode_ax25_frame"""
+        return {
+            'd_call': self.d_call,
+            'd_ssid': self.d_ssid,
+            's_call': self.s_call,
+            's_ssid': self.s_ssid,
+            'control': self.control,
+            'pid': self.pid,
+            'info': bytes(self.info)
+        }
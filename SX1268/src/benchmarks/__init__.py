@@ -0,0 +1 @@
+from .runner import run_benchmarks, compare, regressions, FakeSerial
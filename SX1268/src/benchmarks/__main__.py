@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+
+from .runner import DEFAULT_CONFIG, run_benchmarks, compare, regressions, save, load
+
+"""
+Command line entry point, run from the src directory:
+
+    python -m benchmarks --save-baseline          # record a baseline
+    python -m benchmarks                          # compare with it
+    python -m benchmarks --filter decoder --quick
+
+Results are written as JSON. The exit status is 1 if any benchmark is slower
+than the baseline by more than the threshold, --quick runs are not compared. The committed baseline.json
+records the machine it was taken on in its "meta", compare against a
+baseline saved on the same machine.
+"""
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks', description="Ground station pipeline benchmarks")
+    parser.add_argument('--output', default='benchmark_results.json', help="Where to write the results")
+    parser.add_argument('--baseline', default=BASELINE, help="Baseline to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.1, help="Allowed slowdown as a fraction, default 0.1")
+    parser.add_argument('--filter', default=None, help="Only run benchmarks whose name contains this")
+    parser.add_argument('--quick', action='store_true', help="Shorter runs, for a rough check")
+    parser.add_argument('--seed', type=int, default=DEFAULT_CONFIG["seed"])
+    args = parser.parse_args(argv)
+
+    config = {"seed": args.seed}
+    if args.quick:
+        config.update(repeat=3, min_time=0.05)
+
+    results = run_benchmarks(config, selected=args.filter)
+    save(results, args.output)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        save(results, args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if args.quick:
+        # Quick runs are too short to compare, the noise alone exceeds the threshold
+        print("Quick run, not compared with the baseline")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with, run with --save-baseline first")
+        return 0
+
+    rows = compare(results, load(args.baseline))
+    print(f"\n{'benchmark':<70} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, base, current, ratio in rows:
+        print(f"{name:<70} {base:12.2f} {current:12.2f} {ratio:7.2f}")
+
+    slower = regressions(rows, args.threshold)
+    if slower:
+        print(f"\n{len(slower)} benchmark(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import itertools
+import random
+import struct
+
+from AX25UI import AX25UIFrame, compute_fcs
+from AX25UI.ax25UI import encode_address
+from data_management.schemas import SCIENCE_SCHEMA, SATELLITE_POSE_SCHEMA
+from data_management.wod import DATASET_SIZE, SATELLITE_ID_FORMAT, TIME_FORMAT
+
+"""
+Synthetic downlink data for the benchmarks. Every generator takes a
+random.Random so the same seed always gives the same frames, and
+downlink_frame wraps an info field the way the satellite does, with the
+data type in the destination SSID.
+"""
+
+SCIENCE_SSID = SCIENCE_SCHEMA.ssid
+WOD_SSID = 0b1110
+POSE_SSID = SATELLITE_POSE_SCHEMA.ssid
+MISC_SSID = 0b1011
+COMMANDS_SSID = 0b0111
+
+# Datasets per WOD packet, two packets make a record
+WOD_DATASETS = 16
+
+
+def science_payload(rng):
+    values = [rng.uniform(-7000.0, 7000.0) for _ in range(7)]
+    return SCIENCE_SCHEMA.struct.pack(*values, rng.randrange(2 ** 31), rng.randrange(100))
+
+
+def pose_payload(rng):
+    return SATELLITE_POSE_SCHEMA.struct.pack(*(rng.uniform(-1.0, 1.0) for _ in range(10)))
+
+
+def wod_packets(rng, satellite_id=b'DEBRA'):
+    """Return the two packets of one WOD record"""
+    def datasets():
+        return bytes(rng.randrange(256) for _ in range(WOD_DATASETS * DATASET_SIZE))
+
+    first = bytes([1]) + SATELLITE_ID_FORMAT.pack(satellite_id) + TIME_FORMAT.pack(rng.randrange(2 ** 32)) + datasets()
+    second = bytes([2]) + datasets()
+    return first, second
+
+
+def misc_payload(rng, length=64):
+    return bytes(rng.choice(b'abcdefghijklmnopqrstuvwxyz0123456789 ') for _ in range(length))
+
+
+def commands_payload(rng):
+    return "{},{},{}".format(rng.choice('abcdef'), rng.randrange(10), rng.randrange(2)).encode('ascii')
+
+
+def downlink_frame(info, ssid, source="DEBRA", destination="GROUND"):
+    """Build a frame as sent by the satellite, the data type is the destination SSID"""
+    frame = bytearray([AX25UIFrame.FLAG])
+    frame += encode_address(destination, ssid)
+    frame += encode_address(source, 0b0000)
+    frame += bytes([AX25UIFrame.CONTROL, AX25UIFrame.PID])
+    frame += info
+    frame += compute_fcs(frame[1:])
+    frame.append(AX25UIFrame.FLAG)
+    return bytes(frame)
+
+
+def module_packet(frame, sender_addr=0, sender_channel=23, rssi=None):
+    """What the module puts on the UART for a received frame"""
+    packet = struct.pack('>HB', sender_addr, sender_channel) + frame
+    if rssi is not None:
+        packet += bytes([(256 + rssi) & 0xFF])
+    return packet
+
+
+def payloads(ssid, rng):
+    """Info fields of one message of the given data type, WOD gives two packets"""
+    if ssid == WOD_SSID:
+        return list(wod_packets(rng))
+    generator = {
+        SCIENCE_SSID: science_payload,
+        POSE_SSID: pose_payload,
+        MISC_SSID: misc_payload,
+        COMMANDS_SSID: commands_payload,
+    }[ssid]
+    return [generator(rng)]
+
+
+def frames(ssid, count, seed=0):
+    """Return count downlink frames of one data type"""
+    rng = random.Random(seed)
+    result = []
+    while len(result) < count:
+        result.extend(downlink_frame(info, ssid) for info in payloads(ssid, rng))
+    return result[:count]
+
+
+def mixed_frames(count, seed=0):
+    """Return count downlink frames with every data type interleaved"""
+    rng = random.Random(seed)
+    ssids = (SCIENCE_SSID, WOD_SSID, POSE_SSID, MISC_SSID, COMMANDS_SSID)
+    result = []
+    for ssid in itertools.cycle(ssids):
+        if len(result) >= count:
+            break
+        result.extend(downlink_frame(info, ssid) for info in payloads(ssid, rng))
+    return result[:count]
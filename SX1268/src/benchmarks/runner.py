@@ -0,0 +1,277 @@
+import contextlib
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import timeit
+
+from AX25UI import AX25UIFrame, AX25UIFrameDecoder, compute_fcs
+from data_management import DataManager, JSONArrayStorage, JSONLinesStorage
+from . import frames
+
+"""
+Runs the benchmarks and compares their results with a stored baseline.
+Each suite yields (name, function) pairs, setting up just before its
+benchmark runs, or (name, function, options) with extra measure() arguments. Every benchmark reports the best time per operation over
+several repeats, which is the figure compared against the baseline since it
+is the least affected by other load on the machine.
+"""
+
+DATA_TYPES = {
+    'science': frames.SCIENCE_SSID,
+    'wod': frames.WOD_SSID,
+    'pose': frames.POSE_SSID,
+    'misc': frames.MISC_SSID,
+    'commands': frames.COMMANDS_SSID,
+}
+
+
+class FakeSerial:
+    """In-memory serial port that acknowledges configuration commands like the module"""
+    def __init__(self):
+        self.rx = bytearray()
+
+    def feed(self, data):
+        self.rx.extend(data)
+
+    def write(self, data):
+        if data[:1] in (b'\xC0', b'\xC2'):
+            self.rx.extend(b'\xC1' + bytes(data[1:]))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def inWaiting(self):
+        return len(self.rx)
+
+    def read(self, size=1):
+        data = bytes(self.rx[:size])
+        del self.rx[:size]
+        return data
+
+    def flushInput(self):
+        self.rx.clear()
+
+
+def measure(func, repeat=5, min_time=0.2, setup=None, max_number=None):
+    """
+    Time a function
+
+    Args:
+        func (callable): Called with no arguments, once per operation
+        repeat (int): Number of timing runs
+        min_time (float): Minimum duration of each run in seconds
+        setup (callable): Called before each timing run, not timed
+        max_number (int): Most operations per run, for operations that change their
+            own state, capped runs are repeated more often
+
+    Returns:
+        dict: Best and mean time per operation in microseconds and operations per run
+    """
+    timer = timeit.Timer(func, setup=setup or 'pass')
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        if max_number and number * 2 > max_number:
+            # Capped runs are short, more of them keep the figure as steady
+            repeat = min(max(repeat, int(repeat * min_time / max(elapsed, 1e-9))), 200)
+            break
+        number *= 2
+    times = [timer.timeit(number) / number for _ in range(repeat)]
+    return {
+        "best_us": min(times) * 1e6,
+        "mean_us": sum(times) / len(times) * 1e6,
+        "number": number,
+    }
+
+
+def cycle(items):
+    """Return a function giving the next item on each call, wrapping around"""
+    state = {"index": -1}
+    def next_item():
+        state["index"] = (state["index"] + 1) % len(items)
+        return items[state["index"]]
+    return next_item
+
+
+def bench_fcs(config):
+    rng = random.Random(config["seed"])
+    data = bytes(rng.randrange(256) for _ in range(240))
+    yield "fcs.compute_fcs[240B]", lambda: compute_fcs(data)
+
+
+def bench_create_frame(config):
+    rng = random.Random(config["seed"])
+    for name, ssid in DATA_TYPES.items():
+        info = frames.payloads(ssid, rng)[0]
+        yield f"ax25.create_frame[{name}]", lambda info=info, ssid=ssid: AX25UIFrame(info, ssid).create_frame()
+
+
+def bench_decode(config):
+    decoder = AX25UIFrameDecoder()
+    for name, ssid in DATA_TYPES.items():
+        next_frame = cycle(frames.frames(ssid, 64, config["seed"]))
+        yield f"decoder.decode_ax25_frame[{name}]", lambda next_frame=next_frame: decoder.decode_ax25_frame(next_frame())
+
+
+def bench_parse(config):
+    rng = random.Random(config["seed"])
+    manager = DataManager()
+    for method, generator in (
+        ('parse_science_data', frames.science_payload),
+        ('parse_satellite_pose', frames.pose_payload),
+        ('parse_misc_data', frames.misc_payload),
+        ('parse_commands_data', frames.commands_payload),
+    ):
+        next_payload = cycle([generator(rng) for _ in range(64)])
+        parse = getattr(manager, method)
+        yield f"data_manager.{method}", lambda parse=parse, next_payload=next_payload: parse(next_payload())
+
+    # One operation is a whole record, both of its packets
+    next_record = cycle([frames.wod_packets(rng) for _ in range(64)])
+    def parse_wod():
+        first, second = next_record()
+        manager.parse_wod_data(first)
+        return manager.parse_wod_data(second)
+    yield "data_manager.parse_wod_data[record]", parse_wod
+
+
+def bench_append(config):
+    """Cost of one append once the file already holds history records"""
+    rng = random.Random(config["seed"])
+    record = DataManager().parse_science_data(frames.science_payload(rng))
+    for storage in (JSONArrayStorage, JSONLinesStorage):
+        for history in config["history"]:
+            # Set up just before the benchmark runs, they share the data directory
+            manager = DataManager(storage=storage)
+
+            def restore(manager=manager, history=history):
+                # Every timing run starts from history records, and only adds a
+                # few so the history stays close to its label
+                manager.storage.close()
+                manager.clear_json_files()
+                manager.append_many_to_json([record] * history, frames.SCIENCE_SSID)
+                manager.storage.flush()
+
+            yield (f"data_manager.append_to_json[{storage.__name__},history={history}]",
+                   lambda manager=manager: manager.append_to_json(record, frames.SCIENCE_SSID),
+                   {"setup": restore, "max_number": config["append_number"]})
+            manager.storage.close()
+
+
+def bench_receive(config):
+    """Everything from UART bytes to stored records for a batch of mixed frames"""
+    from transceiver.simulator import FakeGPIO
+    from transceiver import Transceiver
+
+    batch = config["batch"]
+    ser = FakeSerial()
+    transceiver = Transceiver(gpio=FakeGPIO(), ser=ser)
+    # The JSON array backend slows down as history grows, which would make
+    # the figure depend on the number of runs
+    transceiver.data_manager = DataManager(storage=JSONLinesStorage)
+    transceiver.data_manager.clear_json_files()
+
+    stream = b''.join(frames.module_packet(frame) for frame in frames.mixed_frames(batch, config["seed"]))
+    def receive():
+        ser.feed(stream)
+        received = transceiver.receive_data()
+        if len(received) != batch:
+            raise RuntimeError(f"Received {len(received)} of {batch} frames")
+    yield f"transceiver.receive_data[mixed,batch={batch}]", receive
+
+
+BENCHMARKS = (bench_fcs, bench_create_frame, bench_decode, bench_parse, bench_append, bench_receive)
+
+DEFAULT_CONFIG = {
+    "seed": 1,
+    "repeat": 5,
+    "min_time": 0.2,
+    "history": (0, 100, 1000),
+    "append_number": 8,
+    "batch": 100,
+}
+
+
+def run_benchmarks(config=None, selected=None, quiet=False):
+    """
+    Run the benchmarks in a temporary directory, so the data directory is left alone
+
+    Args:
+        config (dict): Overrides for DEFAULT_CONFIG
+        selected (str): Only run benchmarks whose name contains this
+        quiet (bool): Do not print each result
+
+    Returns:
+        dict: 'meta' describing the run and 'results' per benchmark name
+    """
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for suite in BENCHMARKS:
+                for name, func, *options in suite(config):
+                    if selected and selected not in name:
+                        continue
+                    # The pipeline prints every packet it handles
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        results[name] = measure(func, config["repeat"], config["min_time"], **(options[0] if options else {}))
+                    if not quiet:
+                        print(f"{name:<70} {results[name]['best_us']:12.2f} us")
+        finally:
+            os.chdir(cwd)
+
+    return {
+        "meta": {
+            "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "config": {key: list(value) if isinstance(value, tuple) else value for key, value in config.items()},
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline):
+    """
+    Compare results with a baseline
+
+    Args:
+        results (dict): Output of run_benchmarks
+        baseline (dict): Earlier output of run_benchmarks
+
+    Returns:
+        list: (name, baseline us, current us, ratio) for every benchmark in both,
+            slowest ratio first
+    """
+    rows = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["best_us"] / base["best_us"] if base["best_us"] else float('inf')
+        rows.append((name, base["best_us"], result["best_us"], ratio))
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows
+
+
+def regressions(rows, threshold=0.1):
+    """Rows of compare() that are more than threshold (a fraction) slower than the baseline"""
+    return [row for row in rows if row[3] > 1 + threshold]
+
+
+def save(results, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=4)
+
+
+def load(path):
+    with open(path, 'r') as file:
+        return json.load(file)
@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from transceiver import MultiRadioRunner, TxScheduler
+from main import RADIOS
+
+"""
+Headless ground station. Receives on every radio in main.RADIOS and serves
+a Unix domain socket so scripts can uplink commands and follow downlinked
+frames, without a terminal. Run from the src directory:
+
+    python daemon.py --socket /tmp/sx1268.sock
+
+Clients send one JSON object per line and get JSON lines back, replies
+carry the "id" of their request:
+
+    {"id": 1, "op": "send", "commands": ["c,0,1", "c,1,3"], "priority": "urgent"}
+        -> {"id": 1, "index": 0, "status": "sent", "sequence": 7}   per command,
+           or "status": "error" if it could not be sent in time
+        -> {"id": 1, "status": "done", "sent": 2, "failed": 0}
+    {"id": 2, "op": "subscribe"}      then {"event": "frame", ...} per frame
+    {"id": 3, "op": "unsubscribe"}
+    {"id": 4, "op": "status"}
+
+SIGTERM and SIGINT stop the daemon cleanly: queued commands are sent and
+the ending command goes out before the radios are released.
+"""
+
+DEFAULT_SOCKET = '/tmp/sx1268.sock'
+
+PRIORITIES = {
+    'urgent': TxScheduler.PRIORITY_URGENT,
+    'normal': TxScheduler.PRIORITY_NORMAL,
+    'bulk': TxScheduler.PRIORITY_BULK,
+}
+
+
+class Client:
+    """One connection, replies and frame events are written in order by a single task"""
+    def __init__(self, reader, writer, max_pending_frames):
+        self.reader = reader
+        self.writer = writer
+        self.max_pending_frames = max_pending_frames
+        self.outbox = asyncio.Queue()
+        self.subscribed = False
+        self.dropped_frames = 0
+
+    def reply(self, message):
+        self.outbox.put_nowait(message)
+
+    def push_frame(self, event):
+        # A slow subscriber loses frames rather than holding up reception
+        if self.outbox.qsize() >= self.max_pending_frames:
+            self.dropped_frames += 1
+            return
+        self.outbox.put_nowait(event)
+
+    async def write_loop(self):
+        while True:
+            message = await self.outbox.get()
+            if message is None:
+                return
+            self.writer.write(json.dumps(message).encode() + b'\n')
+            await self.writer.drain()
+
+
+class CommandServer:
+    def __init__(self, runner, path=DEFAULT_SOCKET, max_pending_frames=256, send_timeout=60.0):
+        """
+        Args:
+            runner (MultiRadioRunner): Started runner, commands go out on its first radio
+            path (str): Unix domain socket to listen on
+            max_pending_frames (int): Frame events queued per subscriber before they are dropped
+            send_timeout (float): Seconds before commands of a send request that have not
+                gone out are reported as failed
+        """
+        self.runner = runner
+        self.transceiver = runner.radios[0]
+        self.path = path
+        self.max_pending_frames = max_pending_frames
+        self.send_timeout = send_timeout
+        self.clients = set()
+        self.server = None
+        self.loop = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self._remove_stale_socket()
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+        os.chmod(self.path, 0o660)
+        self.runner.add_listener(self._on_frame)
+        print(f"Listening on {self.path}")
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)
+        else:
+            raise RuntimeError(f"Another daemon is listening on {self.path}")
+        finally:
+            probe.close()
+
+    async def close(self, timeout=5.0):
+        self.runner.remove_listener(self._on_frame)
+        if self.server is not None:
+            self.server.close()
+            # Connections are closed first, wait_closed() waits for all of them
+            # on newer Python versions
+            for client in list(self.clients):
+                client.writer.close()
+            try:
+                await asyncio.wait_for(self.server.wait_closed(), timeout)
+            except asyncio.TimeoutError:
+                print("Timed out waiting for clients to disconnect")
+            self.server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader, writer):
+        client = Client(reader, writer, self.max_pending_frames)
+        self.clients.add(client)
+        write_task = asyncio.create_task(client.write_loop())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    self._handle(client, line)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(client)
+            client.reply(None)
+            try:
+                await write_task
+            except (ConnectionError, asyncio.CancelledError):
+                write_task.cancel()
+            writer.close()
+
+    def _handle(self, client, line):
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("Requests are JSON objects")
+            request_id = request.get('id')
+            op = request.get('op')
+            if op == 'send':
+                self._send(client, request_id, request)
+            elif op == 'subscribe':
+                client.subscribed = True
+                client.reply({"id": request_id, "status": "subscribed"})
+            elif op == 'unsubscribe':
+                client.subscribed = False
+                client.reply({"id": request_id, "status": "unsubscribed", "dropped_frames": client.dropped_frames})
+            elif op == 'status':
+                client.reply({
+                    "id": request_id,
+                    "status": "ok",
+                    "radios": self.runner.statistics(),
+                    "tx": self.transceiver.tx_scheduler.stats(),
+                })
+            else:
+                raise ValueError(f"Unknown op {op!r}")
+        except ValueError as e:
+            client.reply({"id": request_id, "status": "error", "error": str(e)})
+
+    def _send(self, client, request_id, request):
+        commands = request.get('commands')
+        if isinstance(commands, str):
+            commands = [commands]
+        if not isinstance(commands, list) or not commands:
+            raise ValueError("send needs a list of commands")
+        priority = request.get('priority', 'normal')
+        if isinstance(priority, str):
+            priority = PRIORITIES.get(priority, priority)
+        if not isinstance(priority, int):
+            raise ValueError(f"Unknown priority {request.get('priority')!r}")
+
+        progress = {"waiting": set(), "sent": 0, "failed": 0, "queued": False, "finished": False, "timer": None}
+
+        def finish_if_done():
+            if progress["queued"] and not progress["waiting"] and not progress["finished"]:
+                progress["finished"] = True
+                if progress["timer"] is not None:
+                    progress["timer"].cancel()
+                client.reply({"id": request_id, "status": "done", "sent": progress["sent"], "failed": progress["failed"]})
+
+        def completed(index, sequence, error):
+            # Ignored once the request has timed out
+            if index not in progress["waiting"]:
+                return
+            progress["waiting"].discard(index)
+            if error is None:
+                progress["sent"] += 1
+                client.reply({"id": request_id, "index": index, "status": "sent", "sequence": sequence})
+            else:
+                progress["failed"] += 1
+                client.reply({"id": request_id, "index": index, "status": "error", "sequence": sequence, "error": str(error)})
+            finish_if_done()
+
+        def timed_out():
+            for index in sorted(progress["waiting"]):
+                progress["failed"] += 1
+                client.reply({"id": request_id, "index": index, "status": "error", "error": "Timed out waiting to be sent"})
+            progress["waiting"].clear()
+            finish_if_done()
+
+        for index, command in enumerate(commands):
+            try:
+                if not isinstance(command, str):
+                    raise ValueError("Commands are strings")
+                # The scheduler thread sends, the acknowledgement is written from the loop
+                self.transceiver.send_command(
+                    command, priority,
+                    lambda sequence, error, index=index: self.loop.call_soon_threadsafe(completed, index, sequence, error)
+                )
+                progress["waiting"].add(index)
+            except Exception as e:
+                progress["failed"] += 1
+                client.reply({"id": request_id, "index": index, "status": "error", "error": str(e)})
+        progress["queued"] = True
+        if progress["waiting"]:
+            progress["timer"] = self.loop.call_later(self.send_timeout, timed_out)
+        finish_if_done()
+
+    def _on_frame(self, name, frame):
+        subscribers = [client for client in self.clients if client.subscribed]
+        if not subscribers:
+            return
+        event = frame.to_dict()
+        event['info'] = event['info'].hex()
+        event.update({"event": "frame", "radio": name, "received_at": time.time(), "rssi": frame.rssi})
+        for client in subscribers:
+            client.push_frame(event)
+
+
+async def run(socket_path, clear=False):
+    runner = MultiRadioRunner.from_settings(RADIOS)
+    transceiver = runner.radios[0]
+    if clear:
+        runner.data_manager.clear_json_files()
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+
+    server = CommandServer(runner, socket_path)
+    transceiver.startup_command()
+    try:
+        await runner.start()
+        transceiver.tx_scheduler.start()
+        await server.start()
+        await stop.wait()
+        print("Shutting down")
+    finally:
+        await server.close()
+        await runner.stop()
+        # Commands still queued go out before the ending command
+        await loop.run_in_executor(None, transceiver.tx_scheduler.stop)
+        transceiver.ending_command()
+        runner.data_manager.storage.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='daemon', description="Headless ground station with a command socket")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix domain socket to listen on")
+    parser.add_argument('--clear', action='store_true', help="Clear the json files on startup")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.socket, args.clear))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
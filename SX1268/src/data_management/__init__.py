@@ -1 +1,7 @@
-from .data_management import DataManager
\ No newline at end of file
+from .data_management import DataManager
+from .storage import JSONArrayStorage, JSONLinesStorage, StorageGroup
+from .schemas import PayloadSchema, SchemaRegistry, payload_schemas, register_schema
+from .wod import decode_datasets, decode_wod_packets
+from .reassembly import WODReassembler
+from .archive import ColumnarArchive, ArchiveReader
+from .sqlite_storage import SQLiteStorage
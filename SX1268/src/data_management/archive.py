@@ -0,0 +1,319 @@
+import json
+import os
+import shutil
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from . import wod
+from .schemas import payload_schemas
+
+"""
+Columnar telemetry archive for analysis over many passes. Every fixed-width
+data type gets a directory holding one append-only file per column, the raw
+little-endian values one after another, so any column can be memory mapped
+as a NumPy array without reading the rest:
+
+    archive/science_data/columns.json     column names and dtypes, whether time is sorted
+    archive/science_data/time.col         float64, one per row
+    archive/science_data/debris_diameter.col
+    ...
+
+The time column comes from time_of_detection (science), time_field (WOD)
+or the time the record was stored for types without one. WOD records are
+stored one row per dataset. Variable-size types (misc, commands) are not
+archived. ColumnarArchive is a DataManager storage backend and is fed the
+same records as the JSON files; StorageGroup writes to both.
+"""
+
+TIME_COLUMN = 'time'
+COLUMN_SUFFIX = '.col'
+LAYOUT_FILE = 'columns.json'
+
+WOD_SSID = 0b1110
+
+# Record field used as the time column, by data type name
+TIME_FIELDS = {
+    'science': 'time_of_detection',
+    'wod': 'time_field',
+}
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is required for the columnar archive")
+
+
+class ColumnarArchive:
+    def __init__(self, json_files, directory=None, schemas=None, clock=time.time):
+        """
+        Args:
+            json_files (dict): SSID -> JSON file of the DataManager, names the tables
+            directory (str): Archive directory, 'archive' beside the JSON files by default
+            schemas (SchemaRegistry): Fixed-size payload types, defaults to payload_schemas
+            clock (callable): Time stored for records without a time field
+        """
+        _require_numpy()
+        self.json_files = json_files
+        if directory is None:
+            first = next(iter(json_files.values()), os.path.join('data', 'x'))
+            directory = os.path.join(os.path.dirname(first), 'archive')
+        self.directory = directory
+        self.schemas = schemas if schemas is not None else payload_schemas
+        self.clock = clock
+
+        # SSID -> (table name, [(column, dtype)], record -> rows)
+        self.layouts = {}
+        for schema in self.schemas:
+            if schema.ssid in json_files:
+                self.layouts[schema.ssid] = self._schema_layout(schema)
+        if WOD_SSID in json_files:
+            self.layouts[WOD_SSID] = self._wod_layout()
+
+        # Open column files per SSID, column -> file
+        self._files = {}
+
+        # SSID -> [time of the last row, whether the time column is sorted]
+        self._order = {}
+
+    def _table_name(self, ssid):
+        return os.path.splitext(os.path.basename(self.json_files[ssid]))[0]
+
+    def _schema_layout(self, schema):
+        dtype = schema.dtype
+        time_field = TIME_FIELDS.get(schema.name)
+        columns = [(TIME_COLUMN, np.dtype('<f8'))]
+        columns += [(name, dtype.fields[name][0].newbyteorder('<')) for name in schema.fields]
+
+        def rows(record):
+            stamp = record[time_field] if time_field is not None else self.clock()
+            return [(stamp,) + tuple(record[name] for name in schema.fields)]
+
+        return self._table_name(schema.ssid), columns, rows
+
+    def _wod_layout(self):
+        columns = [
+            (TIME_COLUMN, np.dtype('<f8')),
+            ('satellite_id', np.dtype('S5')),
+            ('dataset', np.dtype('<u2')),
+            ('incomplete', np.dtype('u1')),
+        ]
+        columns += [(name, np.dtype('u1') if name == 'satellite_mode' else np.dtype('<f8')) for name in wod.WOD_FIELD_NAMES]
+
+        def rows(record):
+            head = (record["time_field"], record["satellite_id"].encode('ascii'))
+            incomplete = 1 if record.get("incomplete") else 0
+            return [
+                head + (index, incomplete) + tuple(dataset[name] for name in wod.WOD_FIELD_NAMES)
+                for index, dataset in enumerate(record["datasets"])
+            ]
+
+        return self._table_name(WOD_SSID), columns, rows
+
+    def _open(self, ssid):
+        """ Open the column files of an SSID, writing its layout if the table is new """
+        name, columns, _ = self.layouts[ssid]
+        table = os.path.join(self.directory, name)
+        os.makedirs(table, exist_ok=True)
+
+        layout = [[column, dtype.str] for column, dtype in columns]
+        stored, in_order = _read_layout(table)
+        if stored is not None and stored != layout:
+            raise ValueError(f"Archive table {name} has a different layout, archive to a new directory")
+
+        # Cut back to whole rows, in case a previous run stopped mid write
+        rows = min(_column_rows(table, column, dtype) for column, dtype in columns)
+        files = {}
+        for column, dtype in columns:
+            file = open(os.path.join(table, column + COLUMN_SUFFIX), 'ab')
+            file.truncate(rows * dtype.itemsize)
+            files[column] = file
+        self._files[ssid] = files
+
+        # New tables, and tables written before the sorted flag, get it recorded
+        recorded = in_order is not None
+        in_order = True if in_order is None else in_order
+        last = None
+        if rows:
+            times = np.memmap(os.path.join(table, TIME_COLUMN + COLUMN_SUFFIX), dtype=columns[0][1], mode='r', shape=(rows,))
+            last = float(times[-1])
+            if not recorded:
+                in_order = bool(np.all(times[1:] >= times[:-1]))
+            del times
+        if not recorded:
+            _write_layout(table, layout, in_order)
+        self._order[ssid] = [last, in_order]
+        return files
+
+    def append(self, data, ssid):
+        """ Append the rows of one record """
+        self.append_many([data], ssid)
+
+    def append_many(self, records, ssid):
+        """ Append the rows of several records of an SSID, one write per column """
+        layout = self.layouts.get(ssid)
+        if layout is None or not records:
+            return
+        _, columns, to_rows = layout
+        rows = [row for record in records for row in to_rows(record)]
+        if not rows:
+            return
+
+        files = self._files.get(ssid) or self._open(ssid)
+        values = list(zip(*rows))
+
+        # Readers bisect the time column while it is known to be in order, it
+        # is marked unsorted before the first row out of order is written
+        times = np.asarray(values[0], dtype=columns[0][1])
+        order = self._order[ssid]
+        if order[1] and ((order[0] is not None and times[0] < order[0]) or np.any(times[1:] < times[:-1])):
+            order[1] = False
+            _write_layout(os.path.join(self.directory, layout[0]),
+                          [[column, dtype.str] for column, dtype in columns], False)
+        order[0] = float(times[-1])
+        # The time column is written last, so it never has more rows than the others
+        for index in list(range(1, len(columns))) + [0]:
+            column, dtype = columns[index]
+            column_values = times if index == 0 else np.asarray(values[index], dtype=dtype)
+            files[column].write(column_values.tobytes())
+
+    def clear(self):
+        """ The archive outlives the JSON files, purge() deletes it """
+        pass
+
+    def purge(self):
+        """ Delete every archived row """
+        self.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def flush(self):
+        for files in self._files.values():
+            for file in files.values():
+                file.flush()
+
+    def close(self):
+        for files in self._files.values():
+            for file in files.values():
+                file.close()
+        self._files = {}
+        self._order = {}
+
+
+def _read_layout(table):
+    """ Return the [[column, dtype]] layout of a table and whether its time column is sorted """
+    path = os.path.join(table, LAYOUT_FILE)
+    if not os.path.exists(path):
+        return None, None
+    with open(path) as file:
+        layout = json.load(file)
+    # Tables written before the sorted flag hold just the column list
+    if isinstance(layout, list):
+        return layout, None
+    return layout["columns"], layout["sorted"]
+
+
+def _write_layout(table, columns, in_order):
+    path = os.path.join(table, LAYOUT_FILE)
+    with open(path + '.tmp', 'w') as file:
+        json.dump({"columns": columns, "sorted": in_order}, file, indent=4)
+    os.replace(path + '.tmp', path)
+
+
+def _column_rows(table, column, dtype):
+    path = os.path.join(table, column + COLUMN_SUFFIX)
+    return os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+
+
+class ArchiveReader:
+    """ Reads ColumnarArchive tables as memory mapped NumPy arrays """
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Archive directory written by ColumnarArchive
+        """
+        _require_numpy()
+        self.directory = directory
+
+    def tables(self):
+        """ Names of the archived tables """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.exists(os.path.join(self.directory, name, LAYOUT_FILE)))
+
+    def columns(self, table):
+        """ Return {column: dtype} of a table """
+        layout, _ = _read_layout(os.path.join(self.directory, table))
+        if layout is None:
+            raise KeyError(f"No archived table {table}")
+        return {column: np.dtype(dtype) for column, dtype in layout}
+
+    def is_sorted(self, table):
+        """ True if the time column of a table was written in order, None if not recorded """
+        return _read_layout(os.path.join(self.directory, table))[1]
+
+    def rows(self, table):
+        """ Number of complete rows of a table """
+        path = os.path.join(self.directory, table)
+        return min(_column_rows(path, column, dtype) for column, dtype in self.columns(table).items())
+
+    def column(self, table, column):
+        """ Memory mapped array of one whole column, nothing is read until it is used """
+        dtype = self.columns(table)[column]
+        return self._map(table, column, dtype, self.rows(table))
+
+    def _map(self, table, column, dtype, rows):
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        path = os.path.join(self.directory, table, column + COLUMN_SUFFIX)
+        return np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+
+    def read(self, table, start=None, end=None, columns=None):
+        """
+        Return the rows of a table with start <= time < end
+
+        Rows are views into the memory mapped files, found by bisection, when the
+        archive recorded the time column as sorted, otherwise the time column is
+        scanned and only the matching rows are copied.
+
+        Args:
+            table (str): Table name, e.g. 'science_data'
+            start (float): Earliest time, None for no limit
+            end (float): Time to stop before, None for no limit
+            columns (list): Columns wanted, all of them by default
+
+        Returns:
+            dict: Column name -> NumPy array, always including 'time'
+        """
+        layout = self.columns(table)
+        in_order = self.is_sorted(table)
+        rows = self.rows(table)
+        wanted = list(layout) if columns is None else [TIME_COLUMN] + [c for c in columns if c != TIME_COLUMN]
+        unknown = [column for column in wanted if column not in layout]
+        if unknown:
+            raise KeyError(f"{table} has no column {', '.join(unknown)}")
+
+        times = self._map(table, TIME_COLUMN, layout[TIME_COLUMN], rows)
+        if rows and in_order:
+            low = 0 if start is None else int(np.searchsorted(times, start, 'left'))
+            high = rows if end is None else int(np.searchsorted(times, end, 'left'))
+            selection = slice(low, max(low, high))
+        else:
+            mask = np.ones(rows, dtype=bool)
+            if start is not None:
+                mask &= times >= start
+            if end is not None:
+                mask &= times < end
+            selection = np.flatnonzero(mask)
+
+        return {column: self._map(table, column, layout[column], rows)[selection] for column in wanted}
+
+    def time_range(self, table):
+        """ Return (earliest, latest) time of a table, None if it is empty """
+        times = self.column(table, TIME_COLUMN)
+        if len(times) == 0:
+            return None
+        return float(times.min()), float(times.max())
@@ -3,10 +3,22 @@ import struct
 
 import os
 import json
+from AX25UI.command_codec import decode_commands, format_command, is_binary_commands
+from . import wod
+from .reassembly import WODReassembler
+from .schemas import payload_schemas
+from .storage import JSONArrayStorage
 
 class DataManager:
     """ A class that maintains and updates json files depending on the type of data downlinked """
-    def __init__(self):
+    def __init__(self, storage=JSONArrayStorage, schemas=None, wod_reassembler=None):
+        """
+        Args:
+            storage (callable): Storage backend class (or factory) called with the
+                SSID -> JSON file map, e.g. JSONArrayStorage or JSONLinesStorage
+            schemas (SchemaRegistry): Fixed-size payload types, defaults to payload_schemas
+            wod_reassembler (WODReassembler): Holds partial WOD records, to configure its limits
+        """
         # Define the directory for JSON files
         self.data_directory = 'data'
 
@@ -22,173 +34,146 @@ class DataManager:
             0b1111: os.path.join(self.data_directory, 'science_data.json')    # Science Data
         }
 
-        # WOD data information
-        self.satellite_id = None
-        self.time_field = None
-        self.datasets = []
+        # Fixed-size payload types are decoded through their schemas
+        self.schemas = schemas if schemas is not None else payload_schemas
+        for schema in self.schemas:
+            self.json_files.setdefault(schema.ssid, os.path.join(self.data_directory, schema.file_name))
 
-    # Various static methods to convert 8 bit unsigned integers back to floats
-    @staticmethod
-    def decode_voltage(voltage):
-        if voltage == 0:
-            return 0.0
-        else:
-            return (voltage + 60) / 20.0
+        # Variable-size payload types that need their own parser
+        self.parsers = {
+            0b1110: ('wod', self.parse_wod_data),           # Whole Orbit Data
+            0b1011: ('misc', self.parse_misc_data),         # Miscellaneous Data
+            0b0111: ('commands', self.parse_commands_data)  # Commands
+        }
 
-    @staticmethod
-    def decode_current(current):
-        return (current - 127) / 127.0
+        # Backend used to persist the parsed data
+        self.storage = storage(self.json_files)
 
-    @staticmethod
-    def decode_bus_current(current):
-        return current / 40.0
+        # WOD records arrive in several packets which are reassembled here
+        self.wod_reassembler = WODReassembler() if wod_reassembler is None else wod_reassembler
 
-    @staticmethod
-    def decode_temperature(temp):
-        return (temp - 60) / 4.0
+    # Various static methods to convert 8 bit unsigned integers back to floats
+    decode_voltage = staticmethod(wod.decode_voltage)
+    decode_current = staticmethod(wod.decode_current)
+    decode_bus_current = staticmethod(wod.decode_bus_current)
+    decode_temperature = staticmethod(wod.decode_temperature)
 
     def append_to_json(self, data, ssid):
         """ Append data to a JSON file based on SSID"""
-        file_path = self.json_files.get(ssid)
-        try:
-            with open(file_path, 'r+') as file:
-                existing_data = json.load(file)
-                existing_data.append(data)
-                file.seek(0)
-                json.dump(existing_data, file, indent=4)
-        except (FileNotFoundError, json.JSONDecodeError):
-            with open(file_path, 'w') as file:
-                json.dump([data], file, indent=4)
+        self.storage.append(data, ssid)
+
+    def append_many_to_json(self, records, ssid):
+        """ Append several records of one SSID in a single write """
+        self.storage.append_many(records, ssid)
 
+    def flush_json_files(self):
+        """ Push records buffered by the storage backend to disk """
+        self.storage.flush()
 
     def clear_json_files(self):
         """ Clears all json files on startup """
-        for path in self.json_files.values():
-            try:
-                with open(path, 'w') as file:
-                    file.write('[]')
-            except Exception as e:
-                print(f"Failed to clear JSON file {path}: {str(e)}")
+        self.storage.clear()
+
+    def convert_bytes_to_json(self, raw_data, ssid, stream=None):
+        """ Convert raw byte data to JSON based on SSID
 
+        Args:
+            raw_data (bytes-like): Info field of the frame
+            ssid (int): Data type of the frame
+            stream (hashable): Where the frame came from, used to reassemble WOD
+        """
+        parser = self.parsers.get(ssid)
+        schema = self.schemas.get(ssid)
 
-    def convert_bytes_to_json(self, raw_data, ssid):
-        """ Convert raw byte data to JSON based on SSID """
         # Print data type received
-        data_type = {
-            0b1111: 'science',
-            0b1110: 'wod',
-            0b1101: 'satellite_pose',
-            0b1011: 'misc',
-            0b0111: 'commands'
-        }.get(ssid, 'unknown')
+        if parser is not None:
+            data_type = parser[0]
+        elif schema is not None:
+            data_type = schema.name
+        else:
+            data_type = 'unknown'
 
         print(f"Received {data_type} data")
 
         # Parse differently depending on ssid
-        if ssid == 0b1111:  # Science Data
-            return self.parse_science_data(raw_data)
-        elif ssid == 0b1110:  # Whole Orbit Data
-            return self.parse_wod_data(raw_data)
-        elif ssid == 0b1101:  # Satellite Pose
-            return self.parse_satellite_pose(raw_data)
-        elif ssid == 0b1011:  # Miscellaneous Data
-            return self.parse_misc_data(raw_data)
-        elif ssid == 0b0111:  # Commands
-            return self.parse_commands_data(raw_data)
+        if ssid == 0b1110:
+            # WOD fragments are matched up per stream
+            return self.parse_wod_data(raw_data, stream)
+        elif parser is not None:
+            return parser[1](raw_data)
+        elif schema is not None:
+            return schema.decode(raw_data)
         else:
             return {"raw_data": raw_data.hex()}
 
+    def convert_many(self, payloads, ssid):
+        """ Decode many payloads of one fixed-size type into a NumPy record array """
+        schema = self.schemas.get(ssid)
+        if schema is None:
+            raise ValueError(f"No payload schema registered for SSID {ssid:#06b}")
+        return schema.decode_many(payloads)
+
     def parse_science_data(self, raw_data):
         """ Parse science data to JSON """
-        format_string = '<fff fff f i i'
-        unpacked_data = struct.unpack(format_string, raw_data)
-        return {
-            "debris_position_x": unpacked_data[0],
-            "debris_position_y": unpacked_data[1],
-            "debris_position_z": unpacked_data[2],
-            "debris_velocity_x": unpacked_data[3],
-            "debris_velocity_y": unpacked_data[4],
-            "debris_velocity_z": unpacked_data[5],
-            "debris_diameter": unpacked_data[6],
-            "time_of_detection": unpacked_data[7],
-            "object_count": unpacked_data[8],
-        }
+        return self.schemas.get(0b1111).decode(raw_data)
 
     def parse_satellite_pose(self, raw_data):
         """ Parse satellite pose data to JSON """
-        format_string = '<fff ffff fff'
-        unpacked_data = struct.unpack(format_string, raw_data)
-        return {
-            "position_x": unpacked_data[0],
-            "position_y": unpacked_data[1],
-            "position_z": unpacked_data[2],
-            "orientation_x": unpacked_data[3],
-            "orientation_y": unpacked_data[4],
-            "orientation_z": unpacked_data[5],
-            "orientation_w": unpacked_data[6],
-            "velocity_x": unpacked_data[7],
-            "velocity_y": unpacked_data[8],
-            "velocity_z": unpacked_data[9]
-        }
+        return self.schemas.get(0b1101).decode(raw_data)
 
     def parse_misc_data(self, raw_data):
         """ Parse miscellaneous data to JSON """
         return {
-            "Data": raw_data.decode('ascii')
+            "Data": str(raw_data, 'ascii')
         }
 
-    def parse_wod_data(self, raw_data):
-        """Parse WOD data from raw bytes to JSON."""
-        # Unpack the packet identifier (first vs second half of wod)
-        packet_id = raw_data[0]
-        dataset_size = struct.calcsize('8B')
-
-        if packet_id == 1:
-            # First packet has satellite_id and time as well as half the datasets
-            # Satellite_id
-            satellite_id_format = '5s'
-            satellite_id_size = struct.calcsize(satellite_id_format)
-            self.satellite_id = struct.unpack(satellite_id_format, raw_data[1:1 + satellite_id_size])[0].decode('ascii')
-
-            # Time_field
-            time_format = '<I'
-            time_size = struct.calcsize(time_format)
-            self.time_field = struct.unpack(time_format, raw_data[1 + satellite_id_size:1 + satellite_id_size + time_size])[0]
-
-            # Datasets
-            dataset_data = raw_data[1 + satellite_id_size + time_size:]
-
-        elif packet_id == 2:
-            # Second half of wod data only has the other half of the datasets
-            dataset_data = raw_data[1:]
-
-        # Combining datasets
-        for i in range(16):
-            if len(dataset_data) < (i + 1) * dataset_size:
-                break
-            dataset_chunk = dataset_data[i * dataset_size:(i + 1) * dataset_size]
-            unpacked_dataset = struct.unpack('8B', dataset_chunk)
-            self.datasets.append({
-                "satellite_mode": int(unpacked_dataset[0]),
-                "battery_voltage": self.decode_voltage(unpacked_dataset[1]),
-                "battery_current": self.decode_current(unpacked_dataset[2]),
-                "regulated_bus_current_3v3": self.decode_bus_current(unpacked_dataset[3]),
-                "regulated_bus_current_5v": self.decode_bus_current(unpacked_dataset[4]),
-                "temperature_comm": self.decode_temperature(unpacked_dataset[5]),
-                "temperature_eps": self.decode_temperature(unpacked_dataset[6]),
-                "temperature_battery": self.decode_temperature(unpacked_dataset[7])
-            })
-
-        # Final parsing of wod data
-        if packet_id == 2:
-            parsed_data = {
-                "satellite_id": self.satellite_id,
-                "time_field": self.time_field,
-                "datasets": self.datasets
+    def parse_commands_data(self, raw_data):
+        """ Parse echoed command data to JSON, packed binary commands or a legacy ASCII command """
+        if is_binary_commands(raw_data):
+            commands = decode_commands(raw_data)
+            return {
+                "Data": ";".join(format_command(command) for command in commands),
+                "commands": [
+                    {"component": component, "component_id": component_id, "command": command}
+                    for component, component_id, command in commands
+                ]
             }
-            # Clear the stored data for the next packets
-            self.satellite_id = None
-            self.time_field = None
-            self.datasets = []
-            return parsed_data
-        return None
+        return {
+            "Data": str(raw_data, 'ascii')
+        }
+
+    def parse_wod_data(self, raw_data, stream=None):
+        """Parse WOD data from raw bytes to JSON, once all of its packets have arrived.
+
+        Partial records that time out are not returned here, see flush_wod_data.
+        """
+        return self.wod_reassembler.add(raw_data, stream)
+
+    def expired_wod_data(self, force=False):
+        """ Take the partial WOD records that have timed out, without storing them
+
+        Args:
+            force (bool): Take every partial record whatever its age, e.g. at shutdown
+
+        Returns:
+            list: The records, marked with "incomplete" and "missing_fragments"
+        """
+        return self.wod_reassembler.flush_expired(force)
+
+    def flush_wod_data(self, force=False):
+        """ Store partial WOD records that have timed out, marked as incomplete
+
+        Args:
+            force (bool): Store every partial record whatever its age, e.g. at shutdown
+
+        Returns:
+            list: The records stored
+        """
+        records = self.expired_wod_data(force)
+        if records:
+            self.append_many_to_json(records, 0b1110)
+        return records
+
+    def decode_wod_columns(self, packets):
+        """ Decode many WOD packets into columns, see wod.decode_wod_packets """
+        return wod.decode_wod_packets(packets)
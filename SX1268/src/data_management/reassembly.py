@@ -0,0 +1,204 @@
+import time
+from collections import OrderedDict, deque
+
+from . import wod
+
+"""
+The WODReassembler class rebuilds Whole Orbit Data records from their
+fragments. Partial records are keyed by (satellite_id, time_field), so
+records from several satellites or radios can be in flight at once and a
+lost packet only affects its own record.
+
+Only the first fragment carries the satellite_id and time_field. Later
+fragments are matched to the most recently updated record from the same
+stream (e.g. radio and source callsign) that is still missing them, and
+fragments that arrive before their first fragment are held for a while.
+"""
+class WODReassembler:
+    DEFAULT_TIMEOUT = 600.0
+
+    def __init__(self, max_pending=32, max_bytes=64 * 1024, max_early=32, timeout=DEFAULT_TIMEOUT, clock=time.monotonic):
+        """
+        Args:
+            max_pending (int): Maximum number of partial records held
+            max_bytes (int): Maximum number of fragment bytes held in total
+            max_early (int): Maximum number of fragments held while waiting for their first fragment
+            timeout (float): Seconds after which partial records and early fragments are flushed
+            clock (callable): Time source, in seconds
+        """
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self.max_early = max_early
+        self.timeout = timeout
+        self.clock = clock
+
+        # (satellite_id, time_field) -> partial record, least recently updated first
+        self.pending = OrderedDict()
+
+        # Fragments waiting for their first fragment, as (stream, index, total, data, arrived)
+        self.early = deque()
+        self.held_bytes = 0
+
+        # Statistics
+        self.completed = 0
+        self.evicted = 0
+        self.orphaned = 0
+        self.expired = 0
+
+    def counters(self):
+        """ Return the reassembly statistics as a dict """
+        return {
+            "completed": self.completed,
+            "evicted": self.evicted,
+            "orphaned": self.orphaned,
+            "expired": self.expired,
+            "pending": len(self.pending),
+            "early": len(self.early),
+            "held_bytes": self.held_bytes,
+        }
+
+    def add(self, raw_data, stream=None):
+        """
+        Add a WOD packet
+
+        Args:
+            raw_data (bytes-like): WOD payload, packet_id byte first
+            stream (hashable): Where the packet came from, used to match fragments
+                that do not carry the satellite_id and time_field
+
+        Returns:
+            dict: The finished record in the wod_data.json format, or None
+        """
+        now = self.clock()
+        packet_id, satellite_id, time_field, dataset_data = wod.split_packet(raw_data)
+        index, total = wod.fragment_position(packet_id)
+        if not wod.valid_position(index, total):
+            # e.g. a low nibble of 0, which would make a record look complete
+            self.orphaned += 1
+            return None
+        dataset_data = bytes(dataset_data)
+
+        if index == 1:
+            entry = self._entry(satellite_id, time_field, total, stream, now)
+            self._store(entry, index, dataset_data, now)
+
+            # Pick up fragments of this record which arrived first
+            for fragment in list(self.early):
+                early_stream, early_index, early_total, early_data, _ = fragment
+                if early_stream == stream and early_total == total and early_index not in entry["fragments"]:
+                    self.early.remove(fragment)
+                    self.held_bytes -= len(early_data)
+                    self._store(entry, early_index, early_data, now)
+        else:
+            entry = self._match(stream, index, total)
+            if entry is None:
+                self._hold_early(stream, index, total, dataset_data, now)
+                self._enforce_limits()
+                return None
+            self._store(entry, index, dataset_data, now)
+
+        if len(entry["fragments"]) == entry["total"]:
+            del self.pending[entry["key"]]
+            self.held_bytes -= entry["size"]
+            self.completed += 1
+            return self._record(entry)
+
+        self._enforce_limits()
+        return None
+
+    def flush_expired(self, force=False):
+        """
+        Remove partial records and early fragments older than the timeout
+
+        Args:
+            force (bool): Remove all of them whatever their age, e.g. at shutdown
+
+        Returns:
+            list: The incomplete records, marked with "incomplete" and "missing_fragments"
+        """
+        cutoff = float('inf') if force else self.clock() - self.timeout
+        flushed = []
+        while self.pending:
+            entry = next(iter(self.pending.values()))
+            if entry["updated"] > cutoff:
+                break
+            self._drop(entry)
+            self.expired += 1
+            flushed.append(self._record(entry))
+
+        while self.early and self.early[0][4] <= cutoff:
+            self.held_bytes -= len(self.early.popleft()[3])
+            self.orphaned += 1
+        return flushed
+
+    def _entry(self, satellite_id, time_field, total, stream, now):
+        """ Find or create the partial record for a first fragment """
+        key = (satellite_id, time_field)
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = {
+                "key": key,
+                "stream": stream,
+                "total": total,
+                "fragments": {},
+                "size": 0,
+                "updated": now,
+            }
+            self.pending[key] = entry
+        return entry
+
+    def _match(self, stream, index, total):
+        """ Find the most recently updated record from a stream still missing a fragment """
+        for entry in reversed(self.pending.values()):
+            if entry["stream"] == stream and entry["total"] == total and index not in entry["fragments"]:
+                return entry
+        return None
+
+    def _store(self, entry, index, dataset_data, now):
+        if index in entry["fragments"]:
+            # Repeated fragment, keep the first copy
+            return
+        entry["fragments"][index] = dataset_data
+        entry["size"] += len(dataset_data)
+        entry["updated"] = now
+        self.held_bytes += len(dataset_data)
+        self.pending.move_to_end(entry["key"])
+
+    def _hold_early(self, stream, index, total, dataset_data, now):
+        if len(self.early) >= self.max_early:
+            self.held_bytes -= len(self.early.popleft()[3])
+            self.orphaned += 1
+        self.early.append((stream, index, total, dataset_data, now))
+        self.held_bytes += len(dataset_data)
+
+    def _drop(self, entry):
+        del self.pending[entry["key"]]
+        self.held_bytes -= entry["size"]
+
+    def _enforce_limits(self):
+        """ Evict the least recently updated records until within the limits """
+        while self.pending and (len(self.pending) > self.max_pending or self.held_bytes > self.max_bytes):
+            self._drop(next(iter(self.pending.values())))
+            self.evicted += 1
+        while self.early and self.held_bytes > self.max_bytes:
+            self.held_bytes -= len(self.early.popleft()[3])
+            self.orphaned += 1
+
+    def _record(self, entry):
+        """ Build the wod_data.json record from the fragments received """
+        satellite_id, time_field = entry["key"]
+        fragments = entry["fragments"]
+        datasets = []
+        for index in sorted(fragments):
+            datasets.extend(wod.columns_to_datasets(wod.decode_datasets(fragments[index])))
+
+        record = {
+            "satellite_id": satellite_id,
+            "time_field": time_field,
+            "datasets": datasets
+        }
+        missing = [index for index in range(1, entry["total"] + 1) if index not in fragments]
+        if missing:
+            record["incomplete"] = True
+            record["missing_fragments"] = missing
+        return record
@@ -0,0 +1,179 @@
+import re
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+"""
+Declarative layouts for the fixed-size payload types. Each PayloadSchema
+names its fields and binary layout once and compiles them to a struct.Struct
+for decoding single packets and to a NumPy structured dtype for decoding
+many captured payloads in one call. New payload types are added by
+registering a schema, without touching DataManager.
+"""
+
+# struct format codes and the matching NumPy type codes (little-endian
+# variants are chosen from the byte order of the format string)
+_NUMPY_CODES = {
+    'c': 'S1', 'b': 'i1', 'B': 'u1', '?': 'b1',
+    'h': 'i2', 'H': 'u2', 'i': 'i4', 'I': 'u4',
+    'l': 'i4', 'L': 'u4', 'q': 'i8', 'Q': 'u8',
+    'e': 'f2', 'f': 'f4', 'd': 'f8',
+}
+
+_FORMAT_ITEM = re.compile(r'(\d*)([xcbB?hHiIlLqQefds])')
+
+
+class PayloadSchema:
+    """ A fixed-size payload type with named fields """
+    def __init__(self, ssid, name, fields, format_string, file_name=None):
+        """
+        Args:
+            ssid (int): SSID the payload type is sent with
+            name (str): Data type name printed when a packet is received
+            fields (list): Field names in the order they are packed
+            format_string (str): struct format of the payload with an explicit byte
+                order ('<', '>' or '!'), e.g. '<fff i'
+            file_name (str): JSON file the records are stored in
+        """
+        self.ssid = ssid
+        self.name = name
+        self.fields = tuple(fields)
+        self.format_string = format_string
+        self.file_name = file_name or f"{name}_data.json"
+
+        # Without a byte order struct uses native sizes and alignment, which
+        # the NumPy dtype would not match
+        if format_string[:1] not in ('<', '>', '!'):
+            raise ValueError(f"{name} schema format '{format_string}' must start with '<', '>' or '!'")
+
+        self.struct = struct.Struct(format_string)
+        if len(self.struct.unpack(bytes(self.struct.size))) != len(self.fields):
+            raise ValueError(f"{name} schema has {len(self.fields)} field names for format '{format_string}'")
+        self.size = self.struct.size
+        self._dtype = None
+
+    @property
+    def dtype(self):
+        """ NumPy structured dtype with the same layout as the struct format """
+        if self._dtype is None:
+            if np is None:
+                raise ImportError("numpy is required for batched payload decoding")
+            self._dtype = self._build_dtype()
+        return self._dtype
+
+    def _build_dtype(self):
+        fmt = self.format_string.replace(' ', '')
+        byte_order = '>' if fmt[0] in '>!' else '<'
+        fmt = fmt[1:]
+
+        formats, offsets = [], []
+        offset = 0
+        for count, code in _FORMAT_ITEM.findall(fmt):
+            count = int(count) if count else 1
+            if code == 'x':
+                offset += count
+            elif code == 's':
+                formats.append(f"S{count}")
+                offsets.append(offset)
+                offset += count
+            else:
+                numpy_code = _NUMPY_CODES[code]
+                size = int(numpy_code[1:])
+                for _ in range(count):
+                    formats.append(numpy_code if size == 1 else byte_order + numpy_code)
+                    offsets.append(offset)
+                    offset += size
+
+        return np.dtype({
+            'names': list(self.fields),
+            'formats': formats,
+            'offsets': offsets,
+            'itemsize': self.size,
+        })
+
+    def decode(self, raw_data):
+        """ Decode one payload into a dict """
+        return dict(zip(self.fields, self.struct.unpack(raw_data)))
+
+    def decode_many(self, payloads):
+        """
+        Decode many payloads of this type at once
+
+        Args:
+            payloads (list): Raw payloads, each exactly self.size bytes long
+
+        Returns:
+            numpy.recarray: One record per payload
+        """
+        data = b''.join(bytes(payload) for payload in payloads)
+        if len(data) != self.size * len(payloads):
+            raise ValueError(f"{self.name} payloads must be {self.size} bytes long")
+        return np.frombuffer(data, dtype=self.dtype).view(np.recarray)
+
+
+class SchemaRegistry:
+    """ Maps SSIDs to payload schemas """
+    def __init__(self, schemas=()):
+        self._schemas = {}
+        for schema in schemas:
+            self.register(schema)
+
+    def register(self, schema):
+        """ Add or replace the schema for schema.ssid """
+        self._schemas[schema.ssid] = schema
+        return schema
+
+    def get(self, ssid):
+        return self._schemas.get(ssid)
+
+    def __contains__(self, ssid):
+        return ssid in self._schemas
+
+    def __iter__(self):
+        return iter(self._schemas.values())
+
+
+SCIENCE_SCHEMA = PayloadSchema(
+    0b1111, 'science',
+    [
+        "debris_position_x",
+        "debris_position_y",
+        "debris_position_z",
+        "debris_velocity_x",
+        "debris_velocity_y",
+        "debris_velocity_z",
+        "debris_diameter",
+        "time_of_detection",
+        "object_count",
+    ],
+    '<fff fff f i i',
+)
+
+SATELLITE_POSE_SCHEMA = PayloadSchema(
+    0b1101, 'satellite_pose',
+    [
+        "position_x",
+        "position_y",
+        "position_z",
+        "orientation_x",
+        "orientation_y",
+        "orientation_z",
+        "orientation_w",
+        "velocity_x",
+        "velocity_y",
+        "velocity_z",
+    ],
+    '<fff ffff fff',
+    file_name='pose_data.json',
+)
+
+# Schemas used by DataManager unless it is given its own registry
+payload_schemas = SchemaRegistry([SCIENCE_SCHEMA, SATELLITE_POSE_SCHEMA])
+
+
+def register_schema(schema):
+    """ Register a new payload type with the default registry """
+    return payload_schemas.register(schema)
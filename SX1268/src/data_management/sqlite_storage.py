@@ -0,0 +1,253 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .archive import TIME_FIELDS
+from .schemas import payload_schemas
+
+"""
+SQLite storage backend for DataManager. Every data type gets its own table
+named after its JSON file (science_data, wod_data, ...) holding when the
+record was received, its SSID, satellite_id and time_field where the type
+has them, the record as JSON, and one typed column per field of fixed-size
+payload types. Records are inserted in batched transactions on a database
+in WAL mode, so inserting costs the same no matter how much history there is.
+
+The query methods can be used by other tools on the same database file:
+
+    db = SQLiteStorage(path='data/telemetry.db')
+    db.science_between(t1, t2)
+    db.latest_wod()
+"""
+
+SQL_TYPES = {float: 'REAL', int: 'INTEGER', bytes: 'BLOB', bool: 'INTEGER'}
+
+BASE_COLUMNS = (
+    ('received_at', 'REAL NOT NULL'),
+    ('ssid', 'INTEGER NOT NULL'),
+    ('satellite_id', 'TEXT'),
+    ('time_field', 'INTEGER'),
+    ('data', 'TEXT NOT NULL'),
+)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SQLiteStorage:
+    def __init__(self, json_files=None, path=None, schemas=None, batch_size=100, commit_interval=1.0, clock=time.time):
+        """
+        Args:
+            json_files (dict): SSID -> JSON file of the DataManager, names the tables.
+                Only needed to store records, not to query them.
+            path (str): Database file, telemetry.db beside the JSON files by default
+            schemas (SchemaRegistry): Fixed-size payload types, defaults to payload_schemas
+            batch_size (int): Records inserted per transaction
+            commit_interval (float): Commit on the next append once the oldest queued
+                record is this many seconds old, flush() commits straight away and is
+                called periodically by MultiRadioRunner so idle periods are committed too
+            clock (callable): Time source of received_at
+        """
+        if path is None:
+            if not json_files:
+                raise ValueError("Pass the database path or the json_files map")
+            path = os.path.join(os.path.dirname(next(iter(json_files.values()))), 'telemetry.db')
+        self.path = path
+        self.json_files = json_files or {}
+        self.schemas = schemas if schemas is not None else payload_schemas
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.clock = clock
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.lock = threading.RLock()
+
+        # SSID -> (table, field columns, time field, INSERT statement)
+        self.tables = {}
+        for ssid in self.json_files:
+            self.tables[ssid] = self._create_table(ssid)
+
+        # SSID -> rows waiting for the next transaction
+        self.pending = {}
+        self.pending_count = 0
+        self._oldest_pending = None
+
+    def _create_table(self, ssid):
+        table = os.path.splitext(os.path.basename(self.json_files[ssid]))[0]
+        schema = self.schemas.get(ssid)
+        fields = []
+        if schema is not None:
+            sample = schema.struct.unpack(bytes(schema.size))
+            fields = [(name, SQL_TYPES.get(type(value), '')) for name, value in zip(schema.fields, sample)]
+            data_type = schema.name
+        else:
+            data_type = 'wod' if ssid == 0b1110 else None
+        time_field = TIME_FIELDS.get(data_type)
+
+        columns = ['id INTEGER PRIMARY KEY']
+        columns += [f"{name} {sql_type}" for name, sql_type in BASE_COLUMNS]
+        columns += [f"{_quote(name)} {sql_type}".rstrip() for name, sql_type in fields]
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} ({', '.join(columns)})")
+            for column in ('received_at', 'ssid', 'time_field'):
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(f'{table}_{column}')} ON {_quote(table)} ({column})")
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {_quote(f'{table}_satellite')} ON {_quote(table)} (satellite_id, time_field)")
+
+        names = [name for name, _ in BASE_COLUMNS] + [name for name, _ in fields]
+        insert = (f"INSERT INTO {_quote(table)} ({', '.join(_quote(name) for name in names)}) "
+                  f"VALUES ({', '.join('?' * len(names))})")
+        return table, [name for name, _ in fields], time_field, insert
+
+    def _row(self, data, ssid, fields, time_field, received_at):
+        time_value = data.get(time_field) if time_field is not None else None
+        return (
+            received_at, ssid, data.get('satellite_id'), time_value,
+            json.dumps(data, separators=(',', ':')),
+        ) + tuple(data.get(name) for name in fields)
+
+    def append(self, data, ssid):
+        """ Queue a record, committing once the batch is full or old enough """
+        self.append_many([data], ssid)
+
+    def append_many(self, records, ssid):
+        """ Queue several records of an SSID """
+        table = self.tables.get(ssid)
+        if table is None or not records:
+            return
+        _, fields, time_field, _ = table
+        now = self.clock()
+        with self.lock:
+            rows = self.pending.setdefault(ssid, [])
+            rows.extend(self._row(data, ssid, fields, time_field, now) for data in records)
+            self.pending_count += len(records)
+            if self._oldest_pending is None:
+                self._oldest_pending = now
+            if self.pending_count >= self.batch_size or now - self._oldest_pending >= self.commit_interval:
+                self.flush()
+
+    def flush(self):
+        """ Insert every queued record in one transaction """
+        with self.lock:
+            if not self.pending_count:
+                return
+            with self.connection:
+                for ssid, rows in self.pending.items():
+                    self.connection.executemany(self.tables[ssid][3], rows)
+            self.pending = {}
+            self.pending_count = 0
+            self._oldest_pending = None
+
+    def clear(self):
+        """ The database keeps the history across runs, purge() deletes it """
+        pass
+
+    def purge(self):
+        """ Delete every stored record """
+        with self.lock:
+            self.pending = {}
+            self.pending_count = 0
+            self._oldest_pending = None
+            with self.connection:
+                for table in self.table_names():
+                    self.connection.execute(f"DELETE FROM {_quote(table)}")
+
+    def close(self):
+        with self.lock:
+            if self.connection is None:
+                return
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    # Queries
+
+    def table_names(self):
+        rows = self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        return [name for name, in rows]
+
+    def query(self, table, start=None, end=None, by='time_field', satellite_id=None, limit=None, newest_first=False):
+        """
+        Return the records of a table in a time range
+
+        Args:
+            table (str): Table name, e.g. 'science_data'
+            start (float): Earliest time, None for no limit
+            end (float): Time to stop before, None for no limit
+            by (str): 'time_field' (the satellite's time) or 'received_at'
+            satellite_id (str): Only records of this satellite
+            limit (int): Most records returned
+            newest_first (bool): Order by descending time
+
+        Returns:
+            list: Records as stored, with 'received_at' added
+        """
+        if by not in ('time_field', 'received_at'):
+            raise ValueError("by must be 'time_field' or 'received_at'")
+        conditions, parameters = [], []
+        if start is not None:
+            conditions.append(f"{by} >= ?")
+            parameters.append(start)
+        if end is not None:
+            conditions.append(f"{by} < ?")
+            parameters.append(end)
+        if satellite_id is not None:
+            conditions.append("satellite_id = ?")
+            parameters.append(satellite_id)
+
+        sql = f"SELECT received_at, data FROM {_quote(table)}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {by} {'DESC' if newest_first else 'ASC'}, id {'DESC' if newest_first else 'ASC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+
+        with self.lock:
+            self.flush()
+            rows = self.connection.execute(sql, parameters).fetchall()
+        return [self._record(received_at, data) for received_at, data in rows]
+
+    def science_between(self, start, end):
+        """ Every science detection with start <= time_of_detection < end """
+        return self.query('science_data', start, end)
+
+    def latest_wod(self, satellite_id=None):
+        """
+        Return the newest WOD record of each satellite
+
+        Returns:
+            dict: satellite_id -> record
+        """
+        sql = (
+            "SELECT satellite_id, received_at, data FROM ("
+            " SELECT satellite_id, received_at, data, ROW_NUMBER() OVER"
+            " (PARTITION BY satellite_id ORDER BY time_field DESC, id DESC) AS position"
+            " FROM wod_data" + (" WHERE satellite_id = ?" if satellite_id is not None else "") +
+            ") WHERE position = 1"
+        )
+        with self.lock:
+            self.flush()
+            rows = self.connection.execute(sql, [satellite_id] if satellite_id is not None else []).fetchall()
+        return {satellite: self._record(received_at, data) for satellite, received_at, data in rows}
+
+    def count(self, table):
+        with self.lock:
+            self.flush()
+            return self.connection.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+
+    @staticmethod
+    def _record(received_at, data):
+        record = json.loads(data)
+        record['received_at'] = received_at
+        return record
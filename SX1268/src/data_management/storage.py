@@ -0,0 +1,235 @@
+import glob
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+
+"""
+Storage backends used by DataManager to persist parsed packets. Each backend
+is created with the SSID -> JSON file map of the DataManager and provides
+append, append_many, clear, flush and close.
+"""
+
+class JSONArrayStorage:
+    """ Keeps every SSID in a single indented JSON array, rewritten on each append """
+    def __init__(self, json_files):
+        self.json_files = json_files
+
+    def append(self, data, ssid):
+        """ Append data to a JSON file based on SSID"""
+        file_path = self.json_files.get(ssid)
+        try:
+            with open(file_path, 'r+') as file:
+                existing_data = json.load(file)
+                existing_data.append(data)
+                file.seek(0)
+                json.dump(existing_data, file, indent=4)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with open(file_path, 'w') as file:
+                json.dump([data], file, indent=4)
+
+    def append_many(self, records, ssid):
+        """ Append several records of an SSID, rewriting the file once """
+        if not records:
+            return
+        file_path = self.json_files.get(ssid)
+        try:
+            with open(file_path, 'r+') as file:
+                existing_data = json.load(file)
+                existing_data.extend(records)
+                file.seek(0)
+                json.dump(existing_data, file, indent=4)
+        except (FileNotFoundError, json.JSONDecodeError):
+            with open(file_path, 'w') as file:
+                json.dump(list(records), file, indent=4)
+
+    def clear(self):
+        """ Clears all json files """
+        for path in self.json_files.values():
+            try:
+                with open(path, 'w') as file:
+                    file.write('[]')
+            except Exception as e:
+                print(f"Failed to clear JSON file {path}: {str(e)}")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JSONLinesStorage:
+    """
+    Appends one JSON record per line, so storing a packet costs the same no
+    matter how much history there is. Each SSID is written to numbered
+    segments next to its JSON file (wod_data.json -> wod_data.000001.jsonl)
+    which are rotated by size or age and can be gzipped once closed.
+    export_json() rebuilds the JSON array files used by the visualiser.
+    """
+    SEGMENT_SUFFIX = '.jsonl'
+
+    def __init__(self, json_files, max_segment_bytes=4 * 1024 * 1024, max_segment_age=None, compress=False):
+        """
+        Args:
+            json_files (dict): SSID -> JSON array file, segments are stored beside them
+            max_segment_bytes (int): Rotate once a segment would grow past this size
+            max_segment_age (float): Rotate segments older than this many seconds, None to disable
+            compress (bool): Gzip segments once they are rotated out
+        """
+        self.json_files = json_files
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.compress = compress
+
+        # Open segment per SSID as [file, index, size, opened_at]
+        self._active = {}
+
+    def _segment_base(self, ssid):
+        return os.path.splitext(self.json_files[ssid])[0]
+
+    def _segment_path(self, ssid, index):
+        return f"{self._segment_base(ssid)}.{index:06d}{self.SEGMENT_SUFFIX}"
+
+    def _find_segments(self, ssid):
+        """ Return (index, path) for every segment of an SSID, oldest first """
+        pattern = re.compile(re.escape(os.path.basename(self._segment_base(ssid))) + r'\.(\d{6})\.jsonl(\.gz)?$')
+        found = []
+        for path in glob.glob(self._segment_base(ssid) + '.*' + self.SEGMENT_SUFFIX + '*'):
+            match = pattern.match(os.path.basename(path))
+            if match:
+                found.append((int(match.group(1)), path))
+        return sorted(found)
+
+    def segments(self, ssid):
+        """ Return the segment files of an SSID, oldest first """
+        return [path for _, path in self._find_segments(ssid)]
+
+    def _open_segment(self, ssid):
+        """ Open a new segment after the newest existing one """
+        existing = self._find_segments(ssid)
+        index = existing[-1][0] + 1 if existing else 1
+        path = self._segment_path(ssid, index)
+        file = open(path, 'a', encoding='utf-8')
+        segment = [file, index, file.tell(), time.time()]
+        self._active[ssid] = segment
+        return segment
+
+    def _close_segment(self, ssid):
+        """ Close the open segment of an SSID, compressing it if enabled """
+        segment = self._active.pop(ssid, None)
+        if segment is None:
+            return
+        file = segment[0]
+        file.close()
+        if self.compress and os.path.getsize(file.name) > 0:
+            with open(file.name, 'rb') as source, gzip.open(file.name + '.gz', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(file.name)
+
+    def append(self, data, ssid):
+        """ Append data as one line of the open segment of an SSID """
+        if ssid not in self.json_files:
+            return
+        segment = self._write_line(ssid, json.dumps(data, separators=(',', ':')) + '\n')
+        segment[0].flush()
+
+    def append_many(self, records, ssid):
+        """ Append several records of an SSID with a single flush """
+        if ssid not in self.json_files:
+            return
+        segment = None
+        for data in records:
+            segment = self._write_line(ssid, json.dumps(data, separators=(',', ':')) + '\n')
+        if segment is not None:
+            segment[0].flush()
+
+    def _write_line(self, ssid, line):
+        """ Write a line to the open segment of an SSID, rotating it first if needed """
+        segment = self._active.get(ssid)
+        if segment is not None:
+            too_big = segment[2] > 0 and segment[2] + len(line) > self.max_segment_bytes
+            too_old = self.max_segment_age is not None and time.time() - segment[3] > self.max_segment_age
+            if too_big or too_old:
+                self._close_segment(ssid)
+                segment = None
+        if segment is None:
+            segment = self._open_segment(ssid)
+
+        segment[0].write(line)
+        segment[2] += len(line)
+        return segment
+
+    def records(self, ssid):
+        """ Iterate over every stored record of an SSID, oldest first """
+        segment = self._active.get(ssid)
+        if segment is not None:
+            segment[0].flush()
+        for path in self.segments(ssid):
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt', encoding='utf-8') as file:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def export_json(self, ssids=None):
+        """ Write the JSON array files read by the visualiser from the segments """
+        for ssid in (ssids if ssids is not None else self.json_files):
+            with open(self.json_files[ssid], 'w') as file:
+                json.dump(list(self.records(ssid)), file, indent=4)
+
+    def clear(self):
+        """ Removes all segments and empties the JSON array files """
+        for ssid, path in self.json_files.items():
+            self._close_segment(ssid)
+            for segment in self.segments(ssid):
+                try:
+                    os.remove(segment)
+                except OSError as e:
+                    print(f"Failed to remove segment {segment}: {str(e)}")
+            try:
+                with open(path, 'w') as file:
+                    file.write('[]')
+            except Exception as e:
+                print(f"Failed to clear JSON file {path}: {str(e)}")
+
+    def flush(self):
+        for segment in self._active.values():
+            segment[0].flush()
+
+    def close(self):
+        for ssid in list(self._active):
+            self._close_segment(ssid)
+
+
+class StorageGroup:
+    """
+    Writes every record to several backends, e.g. the JSON files for the
+    visualiser and a ColumnarArchive for analysis:
+
+        DataManager(storage=lambda files: StorageGroup(JSONLinesStorage(files), ColumnarArchive(files)))
+    """
+    def __init__(self, *backends):
+        self.backends = backends
+
+    def append(self, data, ssid):
+        for backend in self.backends:
+            backend.append(data, ssid)
+
+    def append_many(self, records, ssid):
+        for backend in self.backends:
+            backend.append_many(records, ssid)
+
+    def clear(self):
+        for backend in self.backends:
+            backend.clear()
+
+    def flush(self):
+        for backend in self.backends:
+            backend.flush()
+
+    def close(self):
+        for backend in self.backends:
+            backend.close()
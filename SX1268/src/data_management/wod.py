@@ -0,0 +1,162 @@
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+"""
+Whole Orbit Data (WOD) decoding. Each dataset is 8 unsigned bytes, so the
+dataset block of a packet is treated as an (N, 8) array and every field is
+converted through a precomputed 256-entry lookup table. Results are returned
+as columns (e.g. battery_voltage[N]) and can be turned into the list of
+dicts stored in wod_data.json.
+"""
+
+DATASET_SIZE = 8
+MAX_DATASETS = 16
+SATELLITE_ID_FORMAT = struct.Struct('5s')
+TIME_FORMAT = struct.Struct('<I')
+HEADER_SIZE = 1 + SATELLITE_ID_FORMAT.size + TIME_FORMAT.size
+
+
+# Conversions from 8 bit unsigned integers back to floats
+def decode_voltage(voltage):
+    if voltage == 0:
+        return 0.0
+    else:
+        return (voltage + 60) / 20.0
+
+def decode_current(current):
+    return (current - 127) / 127.0
+
+def decode_bus_current(current):
+    return current / 40.0
+
+def decode_temperature(temp):
+    return (temp - 60) / 4.0
+
+
+# Field name and conversion of each byte of a dataset
+WOD_FIELDS = (
+    ("satellite_mode", int),
+    ("battery_voltage", decode_voltage),
+    ("battery_current", decode_current),
+    ("regulated_bus_current_3v3", decode_bus_current),
+    ("regulated_bus_current_5v", decode_bus_current),
+    ("temperature_comm", decode_temperature),
+    ("temperature_eps", decode_temperature),
+    ("temperature_battery", decode_temperature),
+)
+WOD_FIELD_NAMES = tuple(name for name, _ in WOD_FIELDS)
+
+# Every possible byte value converted once
+WOD_TABLES = tuple(tuple(convert(value) for value in range(256)) for _, convert in WOD_FIELDS)
+
+if np is not None:
+    WOD_ARRAY_TABLES = tuple(
+        np.array(table, dtype=np.int64 if convert is int else np.float64)
+        for table, (_, convert) in zip(WOD_TABLES, WOD_FIELDS)
+    )
+
+
+def decode_datasets(dataset_data, max_datasets=MAX_DATASETS):
+    """
+    Convert a block of 8-byte datasets into columns
+
+    Args:
+        dataset_data (bytes-like): Dataset block, any trailing partial dataset is ignored
+        max_datasets (int): Maximum number of datasets to decode, None for no limit
+
+    Returns:
+        dict: Field name -> NumPy array (or list without NumPy) of length N
+    """
+    count = len(dataset_data) // DATASET_SIZE
+    if max_datasets is not None:
+        count = min(count, max_datasets)
+    block = bytes(dataset_data[:count * DATASET_SIZE])
+
+    if np is not None:
+        rows = np.frombuffer(block, dtype=np.uint8).reshape(count, DATASET_SIZE)
+        return {name: WOD_ARRAY_TABLES[i][rows[:, i]] for i, name in enumerate(WOD_FIELD_NAMES)}
+
+    # Every eighth byte belongs to the same field
+    return {
+        name: [WOD_TABLES[i][value] for value in block[i::DATASET_SIZE]]
+        for i, name in enumerate(WOD_FIELD_NAMES)
+    }
+
+
+def columns_to_datasets(columns):
+    """ Turn decoded columns into the list of dataset dicts stored in wod_data.json """
+    values = [column.tolist() if hasattr(column, 'tolist') else column for column in
+              (columns[name] for name in WOD_FIELD_NAMES)]
+    return [dict(zip(WOD_FIELD_NAMES, row)) for row in zip(*values)]
+
+
+def fragment_position(packet_id):
+    """
+    Work out which fragment of a WOD record a packet is
+
+    The low nibble of the packet_id byte is the 1-based fragment index and
+    the high nibble the number of fragments. The original two-packet format
+    (packet_id 1 and 2) has a high nibble of 0, meaning two fragments.
+
+    Returns:
+        tuple: (index, total), check it with valid_position before use
+    """
+    return packet_id & 0x0F, (packet_id >> 4) or 2
+
+
+def valid_position(index, total):
+    """ True if a fragment index from fragment_position is within its record """
+    return 1 <= index <= total
+
+
+def split_packet(raw_data):
+    """
+    Split a WOD packet into its header fields and dataset block
+
+    Returns:
+        tuple: (packet_id, satellite_id, time_field, dataset_data), where
+            satellite_id and time_field are None for all but the first fragment
+    """
+    packet_id = raw_data[0]
+    if fragment_position(packet_id)[0] == 1:
+        satellite_id = SATELLITE_ID_FORMAT.unpack_from(raw_data, 1)[0].decode('ascii')
+        time_field = TIME_FORMAT.unpack_from(raw_data, 1 + SATELLITE_ID_FORMAT.size)[0]
+        return packet_id, satellite_id, time_field, raw_data[HEADER_SIZE:]
+    return packet_id, None, None, raw_data[1:]
+
+
+def decode_wod_packets(packets):
+    """
+    Decode many WOD packets at once, e.g. when reprocessing captures
+
+    Packets are paired in order, a first packet starts a new record and
+    following packets add their datasets to it. All dataset blocks are
+    converted in a single pass.
+
+    Args:
+        packets (iterable): Raw WOD payloads (packet_id byte first)
+
+    Returns:
+        dict: 'satellite_id' and 'time_field' per record, 'record' giving the
+            record index of every dataset, and one column per WOD field
+    """
+    satellite_ids, time_fields, record_index = [], [], []
+    blocks = []
+    for raw_data in packets:
+        packet_id, satellite_id, time_field, dataset_data = split_packet(raw_data)
+        if fragment_position(packet_id)[0] == 1 or not satellite_ids:
+            satellite_ids.append(satellite_id)
+            time_fields.append(time_field)
+        count = min(len(dataset_data) // DATASET_SIZE, MAX_DATASETS)
+        blocks.append(bytes(dataset_data[:count * DATASET_SIZE]))
+        record_index.extend([len(satellite_ids) - 1] * count)
+
+    columns = decode_datasets(b''.join(blocks), max_datasets=None)
+    columns['record'] = np.array(record_index, dtype=np.int64) if np is not None else record_index
+    columns['satellite_id'] = satellite_ids
+    columns['time_field'] = time_fields
+    return columns
@@ -3,8 +3,12 @@ import select
 import termios
 import tty
 import asyncio
-from transceiver import Transceiver
-from data_management import DataManager
+from transceiver import MultiRadioRunner
+
+# One entry per LoRa HAT, commands are sent with the first one
+RADIOS = [
+    dict(serial_num="/dev/ttyS0", freq=433, addr=0, power=22, rssi=False, air_speed=2400, relay=False, m0_pin=22, m1_pin=27),
+]
 
 async def handle_send(transceiver):
     """Handles sending data from user input asynchronously."""
@@ -20,18 +24,22 @@ async def handle_send(transceiver):
             break
 
 async def main():
-    # Initialize the transceiver object
-    transceiver = Transceiver(serial_num="/dev/ttyS0", freq=433, addr=0, power=22, rssi=False, air_speed=2400, relay=False)
+    # Initialize the transceivers, they share one data manager
+    runner = MultiRadioRunner.from_settings(RADIOS)
+    transceiver = runner.radios[0]
 
     # Set the terminal to non-canonical mode to immediately process input
     tty.setcbreak(sys.stdin.fileno())
 
     # Clear json files on start up
-    DataManager().clear_json_files()
+    runner.data_manager.clear_json_files()
 
     # Send startup command
     transceiver.startup_command()
 
+    # Start listening to every radio, frames are decoded and stored as they arrive
+    await runner.start()
+
     # Start the input coroutine
     send_task = asyncio.create_task(handle_send(transceiver))
 
@@ -39,9 +47,7 @@ async def main():
     try:
         print("Press \033[1;32mEsc\033[0m to exit")
         print("Press \033[1;32mi\033[0m to send")
-        while True:
-            transceiver.receive_data()
-            await asyncio.sleep(0.01)  # Yield control to the event loop
+        await send_task
 
     except KeyboardInterrupt:
         print("\nClosing connection")
@@ -50,6 +56,7 @@ async def main():
         print(f"An error occurred: {str(e)}")
     finally:
         # Send command for program finish
+        await runner.stop()
         transceiver.ending_command()
         send_task.cancel()
         try:
@@ -57,6 +64,8 @@ async def main():
         except asyncio.CancelledError:
             pass
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, transceiver.old_settings)
+        # Commit whatever the storage still buffers
+        runner.data_manager.storage.close()
 
 if __name__ == '__main__':
     try:
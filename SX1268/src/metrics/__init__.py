@@ -0,0 +1,3 @@
+from .registry import Counter, Histogram, MetricsRegistry, DEFAULT_BUCKETS, registry, enable, disable
+from .exporter import PrometheusExporter, write_prometheus
+from . import pipeline
@@ -0,0 +1,113 @@
+import os
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .registry import registry as default_registry
+
+"""
+Exports a MetricsRegistry in the Prometheus text exposition format, either to
+a file (for the node exporter textfile collector, or just to look at) or on a
+local socket: HTTP on the loopback interface for Prometheus to scrape, or a
+Unix socket which answers every connection with the current text.
+"""
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def write_prometheus(path, registry=None):
+    """Write the metrics to path, replacing it atomically so readers never see a partial file"""
+    registry = registry if registry is not None else default_registry
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(registry.to_prometheus())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class PrometheusExporter:
+    def __init__(self, registry=None):
+        """
+        Args:
+            registry (MetricsRegistry): Defaults to the pipeline registry
+        """
+        self.registry = registry if registry is not None else default_registry
+        self._servers = []
+        self._writer = None
+        self._stop = threading.Event()
+
+    def write(self, path):
+        write_prometheus(path, self.registry)
+
+    def write_periodically(self, path, interval=10.0):
+        """Rewrite the file every interval seconds from a background thread"""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.write(path)
+                except OSError as e:
+                    print(f"Failed to write metrics to {path}: {str(e)}")
+        self._writer = threading.Thread(target=run, name="metrics-writer", daemon=True)
+        self._writer.start()
+
+    def serve_http(self, port=9108, host='127.0.0.1'):
+        """Serve the metrics over HTTP for Prometheus to scrape
+
+        Returns:
+            tuple: The (host, port) actually bound, port 0 picks a free one
+        """
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        self._start(server, "metrics-http")
+        return server.server_address
+
+    def serve_unix(self, path):
+        """Answer every connection to a Unix socket with the metrics text"""
+        registry = self.registry
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                self.request.sendall(registry.to_prometheus().encode('utf-8'))
+
+        if os.path.exists(path):
+            os.unlink(path)
+        server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        self._start(server, "metrics-unix")
+        return path
+
+    def _start(self, server, name):
+        server.daemon_threads = True
+        thread = threading.Thread(target=server.serve_forever, name=name, daemon=True)
+        thread.start()
+        self._servers.append(server)
+
+    def close(self):
+        """Stop serving and writing"""
+        self._stop.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+            if isinstance(server.server_address, str) and os.path.exists(server.server_address):
+                os.unlink(server.server_address)
+        self._servers = []
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
@@ -0,0 +1,37 @@
+import time
+
+from .registry import registry
+
+"""
+The metrics reported by the receive and transmit paths. Stage latencies are
+in seconds; 'uart' runs from the first byte read since the previous frame to
+the frame being complete, 'decode', 'parse' and 'store' are the time spent in
+each step and 'total' runs from the first byte to the record being stored.
+"""
+
+clock = time.perf_counter
+
+BYTES_READ = registry.counter('lora_rx_bytes_total', "Bytes read from the module")
+BYTES_DISCARDED = registry.counter('lora_rx_bytes_discarded_total', "Received bytes that were not part of a frame")
+FRAMES_RECEIVED = registry.counter('lora_rx_frames_total', "Frames split out of the received bytes")
+FRAMES_DECODED = registry.counter('lora_frames_decoded_total', "Frames decoded, by data type", ('ssid',))
+FRAMES_DUPLICATE = registry.counter('lora_frames_duplicate_total', "Frames dropped as copies of one already received, by data type", ('ssid',))
+FCS_FAILURES = registry.counter('lora_fcs_failures_total', "Frames rejected because of their FCS")
+DECODE_ERRORS = registry.counter('lora_decode_errors_total', "Frames that could not be decoded for another reason")
+PARSE_ERRORS = registry.counter('lora_parse_errors_total', "Payloads that failed to parse, by data type", ('ssid',))
+STORAGE_WRITES = registry.counter('lora_storage_writes_total', "Records written to storage, by data type", ('ssid',))
+STORAGE_ERRORS = registry.counter('lora_storage_errors_total', "Records that failed to be stored, by data type", ('ssid',))
+PIPELINE_DROPPED = registry.counter('lora_pipeline_dropped_total', "Items dropped by a full ReceivePipeline queue, by queue", ('queue',))
+TX_PACKETS = registry.counter('lora_tx_packets_total', "Packets written to the module")
+TX_BYTES = registry.counter('lora_tx_bytes_total', "Bytes written to the module")
+STAGE_SECONDS = registry.histogram('lora_stage_seconds', "Time spent in each pipeline stage", ('stage',))
+
+
+def enabled():
+    return registry.enabled
+
+
+def record_tx(data):
+    if registry.enabled:
+        TX_PACKETS.inc()
+        TX_BYTES.inc(len(data))
@@ -0,0 +1,214 @@
+import bisect
+import math
+import threading
+
+"""
+Counters and latency histograms for the ground station pipeline. Metrics
+belong to a MetricsRegistry and are only updated while the registry is
+enabled, so instrumented code costs a single attribute check when metrics are
+off. Values can be read back with value()/snapshot() or rendered in the
+Prometheus text exposition format.
+"""
+
+# Seconds, from a fast decode up to a slow pass through the whole pipeline
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _label_key(label_names, labels):
+    if len(labels) != len(label_names):
+        raise ValueError(f"Expected labels {label_names}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _format_labels(label_names, key, extra=()):
+    pairs = list(zip(label_names, key)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Counter:
+    """A value that only goes up, one per combination of label values"""
+    type_name = 'counter'
+
+    def __init__(self, registry, name, documentation, label_names=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not self.registry.enabled:
+            return
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.label_names, labels), 0)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {key: value for key, value in self._values.items()}
+
+    def exposition(self):
+        for key, value in sorted(self.snapshot().items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Distribution of observed values, e.g. stage latencies in seconds"""
+    type_name = 'histogram'
+
+    def __init__(self, registry, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # Label values -> [count per bucket (last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not self.registry.enabled:
+            return
+        key = _label_key(self.label_names, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, **labels):
+        entry = self._values.get(_label_key(self.label_names, labels))
+        return sum(entry[0]) if entry else 0
+
+    def sum(self, **labels):
+        entry = self._values.get(_label_key(self.label_names, labels))
+        return entry[1] if entry else 0.0
+
+    def quantile(self, q, **labels):
+        """Estimate a quantile from the buckets, as the upper bound of its bucket
+
+        Returns:
+            float: None if nothing was observed
+        """
+        entry = self._values.get(_label_key(self.label_names, labels))
+        if not entry:
+            return None
+        counts = entry[0]
+        target = q * sum(counts)
+        running = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            running += count
+            if running >= target and count:
+                return bound
+        return math.inf
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        """Return {label values: {'buckets': {bound: cumulative count}, 'count': n, 'sum': s}}"""
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        result = {}
+        for key, (counts, total) in values.items():
+            cumulative, running = {}, 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                running += count
+                cumulative[bound] = running
+            result[key] = {'buckets': cumulative, 'count': running, 'sum': total}
+        return result
+
+    def exposition(self):
+        for key, entry in sorted(self.snapshot().items()):
+            for bound, count in entry['buckets'].items():
+                labels = _format_labels(self.label_names, key, [('le', _format_value(float(bound)))])
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(entry['sum'])}"
+            yield f"{self.name}_count{labels} {entry['count']}"
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=False):
+        """
+        Args:
+            enabled (bool): Whether metrics are recorded, can be changed at any time
+        """
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type_name}")
+            return metric
+
+    def counter(self, name, documentation, label_names=()):
+        """Return the counter called name, creating it if needed"""
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        """Return the histogram called name, creating it if needed"""
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def __iter__(self):
+        return iter(list(self._metrics.values()))
+
+    def reset(self):
+        """Zero every metric"""
+        for metric in self:
+            metric.reset()
+
+    def snapshot(self):
+        """Return {metric name: metric snapshot} for every metric"""
+        return {metric.name: metric.snapshot() for metric in self}
+
+    def to_prometheus(self):
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in sorted(self, key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.exposition())
+        return '\n'.join(lines) + '\n'
+
+
+# Registry the pipeline reports to, disabled until enable() is called
+registry = MetricsRegistry()
+
+
+def enable():
+    registry.enabled = True
+
+
+def disable():
+    registry.enabled = False
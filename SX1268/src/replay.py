@@ -0,0 +1,65 @@
+import argparse
+import sys
+import time
+from data_management import DataManager, JSONArrayStorage, JSONLinesStorage
+from transceiver import SPLIT_GAP, CaptureReader, replay, replay_parallel
+
+"""
+Decodes raw capture logs again, run from the src directory:
+
+    python replay.py pass.sxraw                  # as fast as possible
+    python replay.py pass.sxraw --realtime       # at the original pace
+    python replay.py season/*.sxraw --workers 8  # split over 8 processes
+
+Records are stored in the data directory like a live pass.
+"""
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='replay', description="Replay raw capture logs through the receive pipeline")
+    parser.add_argument('captures', nargs='+', help="Capture logs, replayed in the order given")
+    parser.add_argument('--realtime', action='store_true', help="Play at the original pace")
+    parser.add_argument('--speed', type=float, default=1.0, help="Playback speed with --realtime")
+    parser.add_argument('--workers', type=int, default=1, help="Processes to decode with, 0 for one per CPU")
+    parser.add_argument('--min-gap', type=float, default=SPLIT_GAP, help="Shortest silence a capture is split at, in seconds")
+    parser.add_argument('--jsonl', action='store_true', help="Store with JSONLinesStorage")
+    parser.add_argument('--clear', action='store_true', help="Clear the json files first")
+    args = parser.parse_args(argv)
+
+    if args.realtime and args.workers != 1:
+        parser.error("--realtime replays on a single process")
+
+    data_manager = DataManager(storage=JSONLinesStorage if args.jsonl else JSONArrayStorage)
+    if args.clear:
+        data_manager.clear_json_files()
+
+    paths = []
+    for path in args.captures:
+        try:
+            with CaptureReader(path) as reader:
+                print(f"{path}: {len(reader)} records over {reader.duration:.1f}s"
+                      + (", cut short" if reader.truncated else ""))
+        except (OSError, ValueError) as e:
+            print(f"Skipping {path}: {str(e)}")
+            continue
+        paths.append(path)
+
+    if args.workers == 1:
+        for path in paths:
+            began = time.monotonic()
+            stats = replay(path, data_manager, realtime=args.realtime, speed=args.speed)
+            print(f"{path}: {stats['decoded']}/{stats['frames']} frames decoded "
+                  f"in {time.monotonic() - began:.2f}s")
+    elif paths:
+        # Every capture goes into one process pool
+        began = time.monotonic()
+        totals = replay_parallel(paths, data_manager, workers=args.workers or None, min_gap=args.min_gap)
+        for path, stats in zip(paths, totals["files"]):
+            print(f"{path}: {stats['decoded']}/{stats['frames']} frames decoded in {stats['parts']} part(s)")
+        print(f"{totals['decoded']}/{totals['frames']} frames decoded from {len(paths)} capture(s) "
+              f"in {time.monotonic() - began:.2f}s")
+
+    data_manager.storage.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,10 @@
-from .transceiver import Transceiver
\ No newline at end of file
+from .transceiver import Transceiver
+from .async_transport import AsyncTransport
+from .tx_scheduler import TxScheduler
+from .simulator import FakeGPIO, SimulatedAir, VirtualSX126x, simulated_transceiver
+from .config import SX126xConfig
+from .rssi_sampler import RssiSampler
+from .multi_radio import MultiRadioRunner
+from .pipeline import BoundedQueue, ReceivePipeline
+from .capture import CaptureWriter, CaptureReader
+from .replay import ReplayPort, SPLIT_GAP, replay, replay_parallel
@@ -0,0 +1,234 @@
+import asyncio
+import time
+
+from metrics import pipeline as metrics
+from .config import SX126xConfig, read_command, REGISTER_COUNT
+
+"""
+The AsyncTransport class drives an SX126x from an asyncio event loop. The
+UART file descriptor is registered with loop.add_reader, so received bytes
+are deframed as soon as they arrive instead of being polled for, and every
+delay is an asyncio.sleep so the loop is never blocked. The SX126x keeps its
+blocking API for code that does not run in an event loop.
+"""
+class AsyncTransport:
+    def __init__(self, radio, max_queued_frames=64, loop=None):
+        """
+        Args:
+            radio (SX126x): Configured module to drive, its deframer is reused
+            max_queued_frames (int): Received frames kept while nobody is reading,
+                the oldest frame is dropped when the queue is full
+            loop (asyncio.AbstractEventLoop): Defaults to the running loop
+        """
+        self.radio = radio
+        self.loop = loop
+        self.frames = asyncio.Queue(maxsize=max_queued_frames)
+        self.dropped_frames = 0
+        self.bytes_read = 0
+
+        # When the frame last returned by receive() started arriving, and its
+        # packet RSSI in dBm if the module reports it
+        self.last_frame_started = None
+        self.last_frame_rssi = None
+
+        # time.monotonic() of the last byte read from or written to the module
+        self.last_activity = 0.0
+
+        # While a command is waiting for the module's reply, received bytes
+        # are collected here instead of being deframed
+        self._response = None
+        self._response_event = asyncio.Event()
+
+        # Serialises mode switches between send, configure and RSSI queries
+        self._lock = asyncio.Lock()
+        self._started = False
+
+    async def start(self):
+        """Start listening to the UART"""
+        if self._started:
+            return
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        self.loop.add_reader(self.radio.ser.fileno(), self._on_readable)
+        self._started = True
+
+    async def stop(self):
+        """Stop listening to the UART"""
+        if self._started:
+            self.loop.remove_reader(self.radio.ser.fileno())
+            self._started = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def _on_readable(self):
+        """Reader callback, called by the event loop when the UART has data"""
+        waiting = self.radio.ser.inWaiting()
+        if waiting <= 0:
+            return
+        data = self.radio.ser.read(waiting)
+        self.bytes_read += len(data)
+        self.last_activity = time.monotonic()
+
+        if self._response is not None:
+            self._response.extend(data)
+            self._response_event.set()
+            return
+        self._deliver(data)
+
+    def _deliver(self, data):
+        """Deframe received bytes and queue the completed frames"""
+        for raw_frame, started in self.radio.deframe(data):
+            if self.frames.full():
+                self.frames.get_nowait()
+                self.dropped_frames += 1
+            self.frames.put_nowait((raw_frame, started))
+
+    async def _command(self, command, length, timeout):
+        """Write a command and wait for a reply of at least length bytes
+
+        Returns:
+            bytes: The reply, or whatever arrived before the timeout
+        """
+        self._response = bytearray()
+        self._response_event.clear()
+        try:
+            await self.loop.run_in_executor(None, self.radio.ser.write, command)
+            deadline = self.loop.time() + timeout
+            while len(self._response) < length:
+                remaining = deadline - self.loop.time()
+                if remaining <= 0:
+                    break
+                self._response_event.clear()
+                try:
+                    await asyncio.wait_for(self._response_event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            return bytes(self._response)
+        finally:
+            self._response = None
+
+    async def _wait_ready(self):
+        """Asynchronous version of SX126x.wait_ready"""
+        radio = self.radio
+        if radio.aux_pin is None:
+            await asyncio.sleep(radio.SETTLE_TIME)
+            return True
+        deadline = self.loop.time() + radio.MODE_TIMEOUT
+        while not radio.gpio.input(radio.aux_pin):
+            if self.loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.001)
+        return True
+
+    async def _enter_mode(self, mode):
+        """Switch mode, only waiting for the module when the pins changed"""
+        if self.radio.set_mode(mode):
+            await self._wait_ready()
+
+    async def send(self, data):
+        """Send a packet without blocking the event loop"""
+        async with self._lock:
+            await self._enter_mode(self.radio.MODE_NORMAL)
+            await self.loop.run_in_executor(None, self.radio.ser.write, data)
+            metrics.record_tx(data)
+            await self._wait_ready()
+            self.last_activity = time.monotonic()
+
+    async def receive(self):
+        """Wait for the next received frame
+
+        Returns:
+            bytes: The AX.25 frame, including its flags
+        """
+        raw_frame, self.last_frame_started = await self.frames.get()
+        self.last_frame_rssi = -(256 - raw_frame.rssi) if raw_frame.rssi is not None else None
+        return raw_frame.frame
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self.receive()
+
+    async def configure(self, freq, addr, power, rssi, air_speed=2400, net_id=0, buffer_size=240, crypt=0, relay=False):
+        """Asynchronous version of SX126x.set
+
+        Returns:
+            bool: True if the module acknowledged the settings
+        """
+        radio = self.radio
+        async with self._lock:
+            radio.send_to = addr
+            radio.addr = addr
+            radio.rssi = rssi
+            target = radio.build_config(freq, addr, power, rssi, air_speed, net_id, buffer_size, crypt, relay)
+            if target == radio.config:
+                return True
+
+            await self._enter_mode(radio.MODE_CONFIG)
+            radio.deframer.rssi = rssi
+            radio.deframer.reset()
+
+            if radio.config is None:
+                reply = await self._command(read_command(), 3 + REGISTER_COUNT, 0.3)
+                radio.config = SX126xConfig.from_response(reply, radio.start_freq)
+
+            acknowledged = True
+            for command in radio.config_commands(target):
+                for _ in range(2):
+                    reply = await self._command(command, len(command), 0.3)
+                    if radio.config_written(command, reply):
+                        break
+                    print("Setting failed, setting again")
+                else:
+                    print("Setting failed, press Esc to exit and run again")
+                    acknowledged = False
+
+            await self._enter_mode(radio.MODE_NORMAL)
+            return acknowledged
+
+    @property
+    def busy(self):
+        """True while a send, configuration or query is in progress"""
+        return self._lock.locked() or self._response is not None
+
+    async def query_rssi(self, timeout=0.6):
+        """Asynchronous version of SX126x.query_rssi
+
+        Returns:
+            int: The channel noise RSSI in dBm, or None if the module did not reply
+        """
+        length = 3 + self.radio.RSSI_QUERY[5]
+        async with self._lock:
+            await self._enter_mode(self.radio.MODE_NORMAL)
+            reply = await self._command(self.radio.RSSI_QUERY, length, timeout)
+            self.last_activity = time.monotonic()
+
+        if len(reply) >= 4 and reply[0] == 0xC1 and reply[1] == 0x00 and reply[2] == 0x02:
+            # Anything after the reply is received data
+            if len(reply) > length:
+                self._deliver(reply[length:])
+            return -(256 - reply[3])
+
+        # Not a reply, so it belongs to a received packet
+        if reply:
+            self._deliver(reply)
+        return None
+
+    async def get_channel_rssi(self):
+        """Asynchronous version of SX126x.get_channel_rssi
+
+        Returns:
+            int: The channel noise RSSI in dBm, or None if the module did not reply
+        """
+        noise = await self.query_rssi()
+        if noise is not None:
+            print("The current noise RSSI value: {0}dBm".format(noise))
+        else:
+            print("Failed to receive RSSI value")
+        return noise
@@ -0,0 +1,193 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+"""
+Raw capture logs keep every chunk of bytes read from the module, so a pass
+can be decoded again later exactly as it was received. A log starts with a
+header and is followed by one record per chunk:
+
+    header  magic 'SXRAW', version, flags (bit 0: packet RSSI enabled),
+            wall clock time and time.monotonic_ns() when the log was opened
+    record  time.monotonic_ns() of the read (uint64), length (uint32), bytes
+
+All fields are little endian. CaptureReader memory maps a log and indexes
+its records, a log cut short by a crash is read up to its last full record.
+"""
+
+MAGIC = b'SXRAW'
+VERSION = 1
+FLAG_RSSI = 0x01
+
+HEADER = struct.Struct('<5sBBxdQ')
+RECORD = struct.Struct('<QI')
+
+
+class CaptureWriter:
+    def __init__(self, path, rssi=False, flush_interval=1.0, clock=time.monotonic_ns):
+        """
+        Args:
+            path (str): Log file, overwritten if it exists
+            rssi (bool): Whether the module appends the packet RSSI to each packet,
+                needed to split the bytes into frames again
+            flush_interval (float): Longest a chunk stays in the file buffer, in seconds
+            clock (callable): Time source, in nanoseconds
+        """
+        self.path = path
+        self.rssi = rssi
+        self.clock = clock
+        self.flush_interval_ns = int(flush_interval * 1e9)
+        self.lock = threading.Lock()
+
+        self.file = open(path, 'wb')
+        now = clock()
+        self.file.write(HEADER.pack(MAGIC, VERSION, FLAG_RSSI if rssi else 0, time.time(), now))
+        self._flushed_at = now
+
+        # Statistics
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, data, timestamp=None):
+        """Append a chunk, timestamped now unless a clock() value is given"""
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(RECORD.pack(timestamp, len(data)))
+            self.file.write(data)
+            self.records += 1
+            self.bytes += len(data)
+            if timestamp - self._flushed_at >= self.flush_interval_ns:
+                self.file.flush()
+                self._flushed_at = timestamp
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CaptureReader:
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Log written by CaptureWriter
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not a raw capture log")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, flags, self.wall_time_start, self.start_ns = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} raw capture log")
+        self.rssi = bool(flags & FLAG_RSSI)
+
+        # Offset of the data and timestamp of every record
+        self.offsets = array('Q')
+        self.timestamps = array('Q')
+        self.truncated = False
+        self._build_index()
+
+    def _build_index(self):
+        size = len(self.map)
+        offset = HEADER.size
+        while offset + RECORD.size <= size:
+            timestamp, length = RECORD.unpack_from(self.map, offset)
+            offset += RECORD.size
+            if offset + length > size:
+                break
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+            offset += length
+        self.truncated = offset != size
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        """Return (timestamp in ns, bytes) of a record"""
+        offset = self.offsets[index]
+        length = RECORD.unpack_from(self.map, offset - RECORD.size)[1]
+        return self.timestamps[index], self.map[offset:offset + length]
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self, start=0, stop=None):
+        """Iterate over (timestamp in ns, bytes) of records start to stop"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield self[index]
+
+    def find(self, timestamp):
+        """Index of the first record at or after a timestamp in ns"""
+        return bisect_left(self.timestamps, timestamp)
+
+    def wall_time(self, timestamp):
+        """Convert a record timestamp to time.time() seconds"""
+        return self.wall_time_start + (timestamp - self.start_ns) / 1e9
+
+    @property
+    def duration(self):
+        """Seconds between the first and last record"""
+        if not self.timestamps:
+            return 0.0
+        return (self.timestamps[-1] - self.timestamps[0]) / 1e9
+
+    def split(self, parts, min_gap=0.5):
+        """
+        Split the records into about equal ranges that each start after a quiet
+        period, so no frame is cut in two
+
+        Args:
+            parts (int): Ranges wanted, fewer are returned if there are not enough gaps
+            min_gap (float): Shortest silence a range may start after, in seconds
+
+        Returns:
+            list: (start, stop) record index ranges covering every record in order
+        """
+        count = len(self)
+        gap_ns = int(min_gap * 1e9)
+        bounds = [0]
+        for part in range(1, parts):
+            index = max(count * part // parts, bounds[-1] + 1)
+            while index < count and self.timestamps[index] - self.timestamps[index - 1] < gap_ns:
+                index += 1
+            if index >= count:
+                break
+            bounds.append(index)
+        bounds.append(count)
+        return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,204 @@
+"""
+The SX126xConfig class holds the nine configuration registers of an SX126x
+LoRa HAT (ADDH, ADDL, NETID, REG0-REG3, CRYPT_H, CRYPT_L) and gives them
+names. It is parsed from the module's 0xC1 read-back, and diff() lists the
+runs of registers that differ from another configuration so only those need
+to be written with the start address/length form of the 0xC0/0xC2 command.
+"""
+
+# Command headers, each followed by the start register and a length
+CMD_WRITE_PERSISTENT = 0xC0
+CMD_READ = 0xC1
+CMD_WRITE_TEMPORARY = 0xC2
+
+REGISTER_COUNT = 9
+
+# Register indexes
+ADDH, ADDL, NETID, REG0, REG1, REG2, REG3, CRYPT_H, CRYPT_L = range(REGISTER_COUNT)
+
+UART_BAUDRATES = {1200: 0x00, 2400: 0x20, 4800: 0x40, 9600: 0x60, 19200: 0x80, 38400: 0xA0, 57600: 0xC0, 115200: 0xE0}
+AIR_SPEEDS = {1200: 0x01, 2400: 0x02, 4800: 0x03, 9600: 0x04, 19200: 0x05, 38400: 0x06, 62500: 0x07}
+PACKET_SIZES = {240: 0x00, 128: 0x40, 64: 0x80, 32: 0xC0}
+POWERS = {22: 0x00, 17: 0x01, 13: 0x02, 10: 0x03}
+
+# REG1 bit enabling the channel noise RSSI query
+AMBIENT_NOISE = 0x20
+# REG3 bits
+PACKET_RSSI = 0x80
+FIXED_TRANSMISSION = 0x40
+RELAY = 0x20
+LBT = 0x10
+
+
+def _reverse(table):
+    return {code: value for value, code in table.items()}
+
+
+class SX126xConfig:
+    def __init__(self, registers, start_freq=410):
+        """
+        Args:
+            registers (bytes-like): The nine configuration registers
+            start_freq (int): Base frequency of the module band in MHz (410 or 850),
+                the channel register is an offset from it
+        """
+        if len(registers) != REGISTER_COUNT:
+            raise ValueError(f"Expected {REGISTER_COUNT} registers, got {len(registers)}")
+        self.registers = bytes(registers)
+        self.start_freq = start_freq
+
+    @classmethod
+    def from_response(cls, response, start_freq=410):
+        """Parse the module's answer to a read (or write) of all registers
+
+        Returns:
+            SX126xConfig: None if the response is not a full 0xC1 reply
+        """
+        if len(response) < 3 + REGISTER_COUNT or response[0] != CMD_READ or response[1] != 0 or response[2] != REGISTER_COUNT:
+            return None
+        return cls(response[3:3 + REGISTER_COUNT], start_freq)
+
+    @classmethod
+    def from_settings(cls, freq, addr, power, rssi, air_speed=2400, net_id=0, buffer_size=240, crypt=0, relay=False):
+        """Build the configuration SX126x.set writes for these settings"""
+        start_freq = 850 if freq > 850 else 410
+        air_speed_bits = AIR_SPEEDS[air_speed]
+        rssi_bits = PACKET_RSSI if rssi else 0x00
+
+        registers = bytearray(REGISTER_COUNT)
+        if not relay:
+            registers[ADDH] = addr >> 8 & 0xff
+            registers[ADDL] = addr & 0xff
+            registers[NETID] = net_id & 0xff
+            registers[REG3] = 0x43 + rssi_bits
+        else:
+            registers[ADDH] = 0x01
+            registers[ADDL] = 0x02
+            registers[NETID] = 0x03
+            registers[REG3] = 0x03 + rssi_bits
+        registers[REG0] = UART_BAUDRATES[9600] + air_speed_bits
+        registers[REG1] = PACKET_SIZES[buffer_size] + POWERS[power] + AMBIENT_NOISE
+        registers[REG2] = freq - start_freq
+        registers[CRYPT_H] = crypt >> 8 & 0xff
+        registers[CRYPT_L] = crypt & 0xff
+        return cls(registers, start_freq)
+
+    def __eq__(self, other):
+        return isinstance(other, SX126xConfig) and self.registers == other.registers
+
+    def __repr__(self):
+        return f"SX126xConfig({self.registers.hex()})"
+
+    @property
+    def address(self):
+        return (self.registers[ADDH] << 8) | self.registers[ADDL]
+
+    @property
+    def net_id(self):
+        return self.registers[NETID]
+
+    @property
+    def uart_baudrate(self):
+        return _reverse(UART_BAUDRATES).get(self.registers[REG0] & 0xE0)
+
+    @property
+    def air_speed(self):
+        return _reverse(AIR_SPEEDS).get(self.registers[REG0] & 0x07)
+
+    @property
+    def buffer_size(self):
+        return _reverse(PACKET_SIZES).get(self.registers[REG1] & 0xC0)
+
+    @property
+    def power(self):
+        return _reverse(POWERS).get(self.registers[REG1] & 0x03)
+
+    @property
+    def channel(self):
+        return self.registers[REG2]
+
+    @property
+    def frequency(self):
+        """Centre frequency in MHz"""
+        return self.start_freq + self.channel + 0.125
+
+    @property
+    def rssi(self):
+        return bool(self.registers[REG3] & PACKET_RSSI)
+
+    @property
+    def fixed_transmission(self):
+        return bool(self.registers[REG3] & FIXED_TRANSMISSION)
+
+    @property
+    def relay(self):
+        return bool(self.registers[REG3] & RELAY)
+
+    @property
+    def crypt(self):
+        return (self.registers[CRYPT_H] << 8) | self.registers[CRYPT_L]
+
+    def to_registers(self):
+        return self.registers
+
+    def to_dict(self):
+        return {
+            "address": self.address,
+            "net_id": self.net_id,
+            "uart_baudrate": self.uart_baudrate,
+            "air_speed": self.air_speed,
+            "buffer_size": self.buffer_size,
+            "power": self.power,
+            "channel": self.channel,
+            "frequency": self.frequency,
+            "rssi": self.rssi,
+            "fixed_transmission": self.fixed_transmission,
+            "relay": self.relay,
+        }
+
+    def diff(self, target):
+        """
+        Find the registers that must be written to go from this configuration to target
+
+        Returns:
+            list: (start register, values) runs of contiguous differing registers
+        """
+        runs = []
+        start = None
+        for index in range(REGISTER_COUNT + 1):
+            differs = index < REGISTER_COUNT and self.registers[index] != target.registers[index]
+            if differs and start is None:
+                start = index
+            elif not differs and start is not None:
+                runs.append((start, target.registers[start:index]))
+                start = None
+        return runs
+
+    def write_commands(self, target, command=CMD_WRITE_TEMPORARY):
+        """
+        Commands that turn this configuration into target, none if they already match
+
+        Every command costs a round trip to the module, which takes far longer
+        than a few extra bytes, so a single command spans all the differences.
+        """
+        runs = self.diff(target)
+        if not runs:
+            return []
+        start = runs[0][0]
+        end = runs[-1][0] + len(runs[-1][1])
+        return [bytes([command, start, end - start]) + target.registers[start:end]]
+
+    def applied(self, start, values):
+        """Return the configuration after values have been written from register start"""
+        registers = bytearray(self.registers)
+        registers[start:start + len(values)] = values
+        return SX126xConfig(registers, self.start_freq)
+
+
+def read_command(start=0, length=REGISTER_COUNT):
+    return bytes([CMD_READ, start, length])
+
+
+def write_command(config, command=CMD_WRITE_TEMPORARY):
+    """Command writing every register of config"""
+    return bytes([command, 0, REGISTER_COUNT]) + config.registers
@@ -0,0 +1,207 @@
+import asyncio
+import time
+
+from AX25UI import AX25UIDeduplicator
+from data_management import DataManager
+from .async_transport import AsyncTransport
+from .transceiver import Transceiver
+
+"""
+The MultiRadioRunner class receives on several LoRa HATs at once, e.g. on
+different frequencies or antennas. Every radio gets its own AsyncTransport,
+so all UARTs are watched by one event loop and CPU use does not grow with
+the number of radios while they are quiet. Frames from every radio go
+through the same decode and storage pipeline, one at a time, and statistics
+are kept per radio.
+
+    runner = MultiRadioRunner.from_settings([
+        dict(serial_num="/dev/ttyS0", freq=433, m0_pin=22, m1_pin=27),
+        dict(serial_num="/dev/ttyAMA1", freq=468, m0_pin=23, m1_pin=24),
+    ])
+    await runner.run()
+"""
+
+class RadioStats:
+    """Reception figures of one radio, every frame counts as one of decoded, errors or duplicates"""
+    __slots__ = ('frames', 'decoded', 'errors', 'duplicates', 'last_frame_at', 'last_rssi')
+
+    def __init__(self):
+        self.frames = 0
+        self.decoded = 0
+        self.errors = 0
+        self.duplicates = 0
+        self.last_frame_at = None
+        self.last_rssi = None
+
+
+class MultiRadioRunner:
+    def __init__(self, radios, names=None, max_queued_frames=64, deduplicator=None, housekeeping_interval=1.0):
+        """
+        Args:
+            radios (list): Configured Transceivers, normally sharing one DataManager
+            names (list): Name of each radio in the statistics, the serial port by default
+            max_queued_frames (int): Frames buffered per radio while the pipeline is busy
+            deduplicator (AX25UIDeduplicator): Shared by every radio so a frame heard by
+                several is only stored once, one is created when there is more than one radio
+            housekeeping_interval (float): Seconds between stores of timed out partial
+                records and flushes of the storage, so buffered records reach disk while idle
+        """
+        self.housekeeping_interval = housekeeping_interval
+        self.radios = list(radios)
+        self.names = list(names) if names is not None else [radio.serial_n for radio in self.radios]
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("Every radio needs a different name")
+
+        if deduplicator is None and len(self.radios) > 1:
+            deduplicator = AX25UIDeduplicator()
+        self.deduplicator = deduplicator
+        if deduplicator is not None:
+            for radio in self.radios:
+                radio.deduplicator = deduplicator
+
+        self.transports = [AsyncTransport(radio, max_queued_frames) for radio in self.radios]
+        self.stats = {name: RadioStats() for name in self.names}
+        self._tasks = []
+
+        # Called with (radio name, frame) for every new frame stored
+        self.listeners = []
+
+    @classmethod
+    def from_settings(cls, settings, data_manager=None, **kwargs):
+        """
+        Create the Transceivers and the runner
+
+        Args:
+            settings (list): Keyword arguments of each Transceiver, a 'name' entry names the radio
+            data_manager (DataManager): Shared by every radio, created if not given
+        """
+        data_manager = data_manager if data_manager is not None else DataManager()
+        radios, names = [], []
+        for radio_settings in settings:
+            radio_settings = dict(radio_settings)
+            name = radio_settings.pop('name', None)
+            radio = Transceiver(data_manager=data_manager, **radio_settings)
+            radios.append(radio)
+            names.append(name if name is not None else radio.serial_n)
+        return cls(radios, names, **kwargs)
+
+    @property
+    def data_manager(self):
+        return self.radios[0].data_manager
+
+    async def start(self):
+        """Start listening on every radio"""
+        if self._tasks:
+            return
+        for name, radio, transport in zip(self.names, self.radios, self.transports):
+            await transport.start()
+            self._tasks.append(asyncio.create_task(self._receive(name, radio, transport)))
+            if radio.rssi:
+                self._tasks.append(asyncio.create_task(radio.rssi_sampler.run(transport)))
+        self._tasks.append(asyncio.create_task(self._housekeeping()))
+
+    async def stop(self):
+        """Stop listening, frames still queued are dropped"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        for transport in self.transports:
+            await transport.stop()
+
+        # Partial records still held are stored as incomplete rather than lost
+        for data_manager in self.data_managers():
+            data_manager.flush_wod_data(force=True)
+            data_manager.flush_json_files()
+
+    async def run(self):
+        """Receive until cancelled"""
+        await self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+    def data_managers(self):
+        """Every DataManager used by the radios, each once"""
+        return list({id(radio.data_manager): radio.data_manager for radio in self.radios}.values())
+
+    async def _housekeeping(self):
+        # Runs on the event loop like the frame handling, so no locking is needed
+        while True:
+            await asyncio.sleep(self.housekeeping_interval)
+            for data_manager in self.data_managers():
+                try:
+                    data_manager.flush_wod_data()
+                    data_manager.flush_json_files()
+                except Exception as e:
+                    print(f"Error flushing stored data: {str(e)}")
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def _receive(self, name, radio, transport):
+        stats = self.stats[name]
+        async for frame in transport:
+            stats.frames += 1
+            stats.last_frame_at = time.time()
+            stats.last_rssi = transport.last_frame_rssi
+
+            # Everything runs on the event loop thread, so the shared
+            # DataManager only ever sees one frame at a time
+            hits = self.deduplicator.hits if self.deduplicator is not None else 0
+            decoded = radio.handle_frame(frame, transport.last_frame_started, transport.last_frame_rssi)
+            if decoded is None:
+                stats.errors += 1
+                continue
+            if self.deduplicator is not None and self.deduplicator.hits != hits:
+                stats.duplicates += 1
+                continue
+            stats.decoded += 1
+            for listener in list(self.listeners):
+                try:
+                    listener(name, decoded)
+                except Exception as e:
+                    print(f"Error in frame listener: {str(e)}")
+
+    def add_listener(self, callback):
+        """Call callback(radio name, AX25UIFrameView) for every new frame, on the event loop"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def radio(self, name):
+        """Return the Transceiver called name"""
+        return self.radios[self.names.index(name)]
+
+    def transport(self, name):
+        return self.transports[self.names.index(name)]
+
+    def statistics(self):
+        """Return {radio name: dict of figures}"""
+        result = {}
+        for name, transport in zip(self.names, self.transports):
+            stats = self.stats[name]
+            result[name] = {
+                "frames": stats.frames,
+                "decoded": stats.decoded,
+                "errors": stats.errors,
+                "duplicates": stats.duplicates,
+                "dropped": transport.dropped_frames,
+                "bytes_read": transport.bytes_read,
+                "queued": transport.frames.qsize(),
+                "last_frame_at": stats.last_frame_at,
+                "last_rssi": stats.last_rssi,
+                "noise_rssi": transport.radio.rssi_sampler.latest(),
+            }
+        return result
@@ -0,0 +1,322 @@
+import threading
+import time
+from collections import deque
+
+from metrics import pipeline as metrics
+
+"""
+The ReceivePipeline class splits reception into three stages joined by
+bounded queues, so a slow disk never stops the UART from being drained:
+
+    reader  - reads frames from the module into the frame queue
+    parser  - decodes and parses frames into records for the record queue
+    writer  - stores records in batches, one write and flush per SSID
+
+What happens when a queue is full is chosen per queue. The frame queue may
+only drop frames (oldest or newest) since the reader must never wait on the
+stages behind it. The record queue blocks by default, which pushes back on
+the parser until the frame queue fills up and starts dropping.
+
+    pipeline = ReceivePipeline(transceiver, frame_queue_size=256)
+    pipeline.start()
+    ...
+    pipeline.stop()
+"""
+
+# Partial WOD records that time out are queued with this SSID
+WOD_SSID = 0b1110
+
+class BoundedQueue:
+    """Thread-safe FIFO with a fixed size and an explicit overflow policy"""
+    DROP_OLDEST = 'drop_oldest'
+    DROP_NEWEST = 'drop_newest'
+    BLOCK = 'block'
+    POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+    def __init__(self, maxsize, policy=DROP_OLDEST, name='queue'):
+        """
+        Args:
+            maxsize (int): Items held before the policy applies
+            policy (str): 'drop_oldest' discards the oldest item to make room,
+                'drop_newest' discards the item being put, 'block' waits for room
+            name (str): Name of the queue in the metrics
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown overflow policy {policy!r}, expected one of {', '.join(self.POLICIES)}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.name = name
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self.closed = False
+
+        # Statistics
+        self.dropped = 0
+        self.high_watermark = 0
+
+    def put(self, item, timeout=None):
+        """
+        Add an item, applying the overflow policy if the queue is full
+
+        Returns:
+            bool: False if the item was dropped or the queue is closed
+        """
+        with self._lock:
+            if self.closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                if self.policy == self.DROP_NEWEST:
+                    self._drop()
+                    return False
+                elif self.policy == self.DROP_OLDEST:
+                    self._items.popleft()
+                    self._drop()
+                else:
+                    deadline = None if timeout is None else time.monotonic() + timeout
+                    while len(self._items) >= self.maxsize and not self.closed:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self._drop()
+                            return False
+                        self._not_full.wait(remaining)
+                    if self.closed:
+                        return False
+
+            self._items.append(item)
+            self.high_watermark = max(self.high_watermark, len(self._items))
+            self._not_empty.notify()
+            return True
+
+    def get_many(self, max_items, timeout=None):
+        """
+        Take up to max_items, waiting up to timeout seconds for the first one
+
+        Returns:
+            list: Oldest items first, empty on timeout or once closed and empty
+        """
+        with self._lock:
+            if not self._items and not self.closed:
+                self._not_empty.wait_for(lambda: self._items or self.closed, timeout)
+            count = min(max_items, len(self._items))
+            items = [self._items.popleft() for _ in range(count)]
+            if items:
+                self._not_full.notify_all()
+            return items
+
+    def get(self, timeout=None):
+        """Take the oldest item, None on timeout or once closed and empty"""
+        items = self.get_many(1, timeout)
+        return items[0] if items else None
+
+    def close(self):
+        """Refuse new items and wake every waiting thread, queued items can still be taken"""
+        with self._lock:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._not_full.notify_all()
+
+    def _drop(self):
+        self.dropped += 1
+        if metrics.enabled():
+            metrics.PIPELINE_DROPPED.inc(queue=self.name)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+
+class ReceivePipeline:
+    def __init__(
+            self,
+            transceiver,
+            frame_queue_size=256,
+            record_queue_size=1024,
+            frame_policy=BoundedQueue.DROP_OLDEST,
+            record_policy=BoundedQueue.BLOCK,
+            batch_size=64,
+            batch_interval=0.5,
+            poll_interval=0.005
+        ):
+        """
+        Args:
+            transceiver (Transceiver): Configured radio, its DataManager stores the records
+            frame_queue_size (int): Frames waiting to be decoded
+            record_queue_size (int): Parsed records waiting to be stored
+            frame_policy (str): 'drop_oldest' or 'drop_newest', the reader never blocks
+            record_policy (str): 'block', 'drop_oldest' or 'drop_newest'
+            batch_size (int): Most records stored in one batch
+            batch_interval (float): Longest a record waits for its batch to fill up, in seconds
+            poll_interval (float): Wait between reads while the module has nothing
+        """
+        if frame_policy == BoundedQueue.BLOCK:
+            raise ValueError("The frame queue cannot block, the UART would stop being read")
+        self.radio = transceiver
+        self.frames = BoundedQueue(frame_queue_size, frame_policy, 'frames')
+        self.records = BoundedQueue(record_queue_size, record_policy, 'records')
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.poll_interval = poll_interval
+
+        self._running = threading.Event()
+        self._threads = []
+
+        # Statistics
+        self.frames_read = 0
+        self.frames_parsed = 0
+        self.parse_errors = 0
+        self.records_stored = 0
+        self.storage_errors = 0
+        self.batches = 0
+
+    def start(self):
+        """Start the reader, parser and writer threads"""
+        if self._threads:
+            return
+        self.frames = BoundedQueue(self.frames.maxsize, self.frames.policy, 'frames')
+        self.records = BoundedQueue(self.records.maxsize, self.records.policy, 'records')
+        self._running.set()
+        for target, name in ((self._read, 'reader'), (self._parse, 'parser'), (self._write, 'writer')):
+            thread = threading.Thread(target=target, name=f"rx-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, drain=True, timeout=None):
+        """
+        Stop reading and wait for the threads
+
+        Args:
+            drain (bool): Decode and store the frames already read, otherwise they are dropped
+            timeout (float): Longest to wait for each thread
+        """
+        if not self._threads:
+            return
+        reader, parser, writer = self._threads
+        self._running.clear()
+        reader.join(timeout)
+
+        # Each stage finishes its queue before the next one is closed
+        if not drain:
+            self.frames.clear()
+        self.frames.close()
+        parser.join(timeout)
+        if not drain:
+            self.records.clear()
+        self.records.close()
+        writer.join(timeout)
+        self._threads = []
+
+    def _read(self):
+        # Stage 1, only ever waits on the module
+        radio = self.radio
+        while self._running.is_set():
+            data = radio.receive()
+            if not data:
+                time.sleep(self.poll_interval)
+                continue
+            self.frames_read += 1
+            self.frames.put((data, radio.last_frame_started, radio.last_frame_rssi))
+
+    def _parse(self):
+        # Stage 2, a single thread since reassembly depends on frame order
+        while True:
+            items = self.frames.get_many(self.batch_size, self.batch_interval)
+            if not items:
+                if self.frames.closed:
+                    # Partial records still held are stored as incomplete rather than lost
+                    self._queue_partial(force=True)
+                    return
+                self._queue_partial()
+                continue
+            self._queue_partial()
+            for data, started, rssi in items:
+                result = self.radio.parse_frame(data, rssi)
+                if result is None:
+                    self.parse_errors += 1
+                    continue
+                self.frames_parsed += 1
+                _, ssid, json_data = result
+                if json_data is not None:
+                    self.records.put((ssid, json_data, started))
+
+    def _queue_partial(self, force=False):
+        # Timed out partial WOD records go to the writer like any other record
+        for record in self.radio.data_manager.expired_wod_data(force):
+            self.records.put((WOD_SSID, record, None))
+
+    def _write(self):
+        # Stage 3, records are grouped per SSID and stored with one write each
+        while True:
+            batch = self.records.get_many(self.batch_size, self.batch_interval)
+            if not batch:
+                if self.records.closed:
+                    return
+                continue
+
+            # Wait a little for the batch to fill up, bounded by batch_interval
+            deadline = time.monotonic() + self.batch_interval
+            while len(batch) < self.batch_size and not self.records.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                more = self.records.get_many(self.batch_size - len(batch), remaining)
+                if not more:
+                    break
+                batch.extend(more)
+            self.store_batch(batch)
+
+    def store_batch(self, batch):
+        """Store (ssid, record, started) tuples, one append per SSID then a single flush"""
+        by_ssid = {}
+        for ssid, json_data, started in batch:
+            by_ssid.setdefault(ssid, []).append((json_data, started))
+
+        data_manager = self.radio.data_manager
+        timed = metrics.enabled()
+        for ssid, entries in by_ssid.items():
+            t0 = metrics.clock() if timed else 0
+            try:
+                data_manager.append_many_to_json([json_data for json_data, _ in entries], ssid)
+            except Exception as e:
+                self.storage_errors += len(entries)
+                if timed:
+                    metrics.STORAGE_ERRORS.inc(len(entries), ssid=ssid)
+                print(f"Error storing received data: {str(e)}")
+                continue
+            self.records_stored += len(entries)
+            if timed:
+                t1 = metrics.clock()
+                metrics.STAGE_SECONDS.observe(t1 - t0, stage='store')
+                metrics.STORAGE_WRITES.inc(len(entries), ssid=ssid)
+                for _, started in entries:
+                    if started is not None:
+                        metrics.STAGE_SECONDS.observe(t1 - started, stage='total')
+        try:
+            data_manager.flush_json_files()
+        except Exception as e:
+            print(f"Error flushing stored data: {str(e)}")
+        self.batches += 1
+
+    def stats(self):
+        return {
+            "frames_read": self.frames_read,
+            "frames_parsed": self.frames_parsed,
+            "parse_errors": self.parse_errors,
+            "records_stored": self.records_stored,
+            "storage_errors": self.storage_errors,
+            "batches": self.batches,
+            "frames_queued": len(self.frames),
+            "frames_dropped": self.frames.dropped,
+            "frames_high_watermark": self.frames.high_watermark,
+            "records_queued": len(self.records),
+            "records_dropped": self.records.dropped,
+            "records_high_watermark": self.records.high_watermark,
+        }
@@ -0,0 +1,245 @@
+import contextlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from AX25UI import AX25UIReassembler
+from data_management import DataManager
+from data_management.reassembly import WODReassembler
+from .capture import CaptureReader
+from .simulator import FakeGPIO
+from .transceiver import Transceiver
+
+"""
+Replays raw capture logs through the same receive, decode, parse and store
+steps as a live pass. ReplayPort stands in for the serial port and hands the
+recorded chunks to a Transceiver, either as fast as they are read or paced
+like the original reception.
+
+replay_parallel() decodes many captures, e.g. a season of passes, in one
+process pool, and splits captures at quiet periods when there are fewer
+files than workers. Each worker keeps its records in memory and the parent
+stores them in file and capture order, so the files end up as if the
+captures had been replayed one after another.
+
+The reassemblers time out partial data by the capture timestamps rather
+than the wall clock, and what they still hold at the end of a capture or
+part is flushed, so a parallel replay stores the same records as a serial
+one as long as the parts are split at silences longer than the timeouts.
+"""
+
+# Shortest silence a capture is split at by default, a shorter one could
+# separate packets the reassemblers would still have joined
+SPLIT_GAP = max(WODReassembler.DEFAULT_TIMEOUT, AX25UIReassembler.DEFAULT_TIMEOUT)
+
+class ReplayPort:
+    """Serial port that plays back capture records instead of a module"""
+    def __init__(self, reader, start=0, stop=None, realtime=False, speed=1.0, clock=time.monotonic):
+        """
+        Args:
+            reader (CaptureReader): Open capture log
+            start (int): First record to play
+            stop (int): Record to stop before, the end of the log by default
+            realtime (bool): Deliver records with their original spacing
+            speed (float): Playback speed when realtime, 2.0 plays twice as fast
+            clock (callable): Time source for the pacing, in seconds
+        """
+        self.reader = reader
+        self.index = start
+        self.stop = len(reader) if stop is None else min(stop, len(reader))
+        self.realtime = realtime
+        self.speed = speed
+        self.clock = clock
+
+        # Acknowledgements of configuration commands, then the record being read
+        self.replies = bytearray()
+        self.pending = bytearray()
+
+        # Records are held back until play(), so configuring the Transceiver
+        # only reads acknowledgements
+        self.playing = False
+
+        # (clock(), record timestamp) when playback started
+        self._started = None
+
+    def write(self, data):
+        # Configuration commands are acknowledged like the module does
+        if data[:1] in (b'\xC0', b'\xC2'):
+            self.replies.extend(b'\xC1' + bytes(data[1:]))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def play(self):
+        self.playing = True
+
+    def record_time(self):
+        """Capture timestamp of the last record delivered, in seconds, a clock for the reassemblers"""
+        index = max(self.index - 1, 0)
+        if index >= len(self.reader):
+            return 0.0
+        return self.reader.timestamps[index] / 1e9
+
+    def next_due(self):
+        """Seconds until the next record arrives, 0 if it already has"""
+        if not self.realtime or self.index >= self.stop:
+            return 0.0
+        timestamp = self.reader.timestamps[self.index]
+        if self._started is None:
+            self._started = (self.clock(), timestamp)
+        started_at, first = self._started
+        return max(0.0, (timestamp - first) / 1e9 / self.speed - (self.clock() - started_at))
+
+    def inWaiting(self):
+        # One record at a time, so reads see the same chunks as the live port
+        if self.playing and not self.replies and not self.pending and self.index < self.stop and self.next_due() == 0:
+            self.pending.extend(self.reader[self.index][1])
+            self.index += 1
+        return len(self.replies) + len(self.pending)
+
+    in_waiting = property(inWaiting)
+
+    def read(self, size=1):
+        source = self.replies if self.replies else self.pending
+        data = bytes(source[:size])
+        del source[:size]
+        return data
+
+    def flushInput(self):
+        # Recorded bytes have not arrived yet, only stale replies are dropped
+        self.replies.clear()
+
+    reset_input_buffer = flushInput
+
+    @property
+    def exhausted(self):
+        return self.index >= self.stop and not self.pending
+
+
+class RecordCollector:
+    """Storage backend that keeps records in memory, for replay workers"""
+    def __init__(self, json_files):
+        self.json_files = json_files
+        self.records = {}
+
+    def append(self, data, ssid):
+        if ssid in self.json_files:
+            self.records.setdefault(ssid, []).append(data)
+
+    def append_many(self, records, ssid):
+        if ssid in self.json_files:
+            self.records.setdefault(ssid, []).extend(records)
+
+    def clear(self):
+        self.records.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def replay(path, data_manager=None, realtime=False, speed=1.0, start=0, stop=None, **kwargs):
+    """
+    Push a capture through receive, decode, parse and store
+
+    Args:
+        path (str): Capture log
+        data_manager (DataManager): Where the records are stored, created if not given
+        realtime (bool): Play the capture at its original pace
+        speed (float): Playback speed when realtime
+        start (int): First record to play
+        stop (int): Record to stop before
+        **kwargs: Other Transceiver arguments, the serial_num names the stream
+
+    Returns:
+        dict: Records played, bytes, frames received and frames decoded
+    """
+    kwargs.setdefault('serial_num', path)
+    with CaptureReader(path) as reader:
+        port = ReplayPort(reader, start, stop, realtime, speed)
+        radio = Transceiver(gpio=FakeGPIO(), ser=port, rssi=reader.rssi, data_manager=data_manager, **kwargs)
+        wod_reassembler = radio.data_manager.wod_reassembler
+        live_clock = wod_reassembler.clock
+        radio.reassembler.clock = port.record_time
+        wod_reassembler.clock = port.record_time
+        port.play()
+
+        frames = decoded = 0
+        while True:
+            data = radio.receive()
+            if data is not None:
+                frames += 1
+                if radio.handle_frame(data, radio.last_frame_started, radio.last_frame_rssi) is not None:
+                    decoded += 1
+            elif port.exhausted:
+                break
+            else:
+                time.sleep(port.next_due())
+
+        # Partial data left at the end of the capture is flushed as a timeout would
+        radio.reassembler.flush_expired(force=True)
+        radio.data_manager.flush_wod_data(force=True)
+        wod_reassembler.clock = live_clock
+        radio.data_manager.flush_json_files()
+
+        records = port.stop - start
+        size = sum(len(reader[index][1]) for index in range(start, port.stop))
+    return {"records": records, "bytes": size, "frames": frames, "decoded": decoded}
+
+
+def _replay_part(path, start, stop, kwargs):
+    data_manager = DataManager(storage=RecordCollector)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        stats = replay(path, data_manager, start=start, stop=stop, **kwargs)
+    return data_manager.storage.records, stats
+
+
+def replay_parallel(paths, data_manager=None, workers=None, min_gap=SPLIT_GAP, **kwargs):
+    """
+    Replay captures as fast as possible on several processes
+
+    Args:
+        paths (str or list): Capture log, or capture logs in the order to store them
+        data_manager (DataManager): Where the records are stored, created if not given
+        workers (int): Processes to use, one per CPU by default
+        min_gap (float): Shortest silence a capture is split at, in seconds. A gap
+            shorter than the reassembly timeouts can store different records than replay()
+        **kwargs: Other Transceiver arguments
+
+    Returns:
+        dict: Totals of the replay() figures and the number of parts, with the
+            figures of each capture under 'files' in the order given
+    """
+    if isinstance(paths, (str, os.PathLike)):
+        paths = [paths]
+    workers = workers or os.cpu_count() or 1
+
+    # Whole files keep the workers busy, captures are only split when there are too few
+    parts_per_file = max(1, -(-workers // max(len(paths), 1)))
+    jobs = []
+    for index, path in enumerate(paths):
+        with CaptureReader(path) as reader:
+            jobs.extend((index, path, start, stop) for start, stop in reader.split(parts_per_file, min_gap))
+
+    data_manager = data_manager if data_manager is not None else DataManager()
+    keys = ("records", "bytes", "frames", "decoded")
+    files = [dict.fromkeys(keys + ("parts",), 0) for _ in paths]
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(jobs), 1))) as pool:
+        futures = [(index, pool.submit(_replay_part, path, start, stop, kwargs)) for index, path, start, stop in jobs]
+
+        # Stored in file and capture order as they complete
+        for index, future in futures:
+            records, stats = future.result()
+            for ssid, items in records.items():
+                data_manager.append_many_to_json(items, ssid)
+            for key in keys:
+                files[index][key] += stats[key]
+            files[index]["parts"] += 1
+    data_manager.flush_json_files()
+
+    totals = {key: sum(stats[key] for stats in files) for key in keys + ("parts",)}
+    totals["files"] = files
+    return totals
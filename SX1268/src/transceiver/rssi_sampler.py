@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+"""
+The RssiSampler class samples the channel noise RSSI in the background
+instead of after every received packet. A sample is only taken when the
+module has been quiet for a while, so the query never lands in the middle of
+a packet, and bytes that arrive while waiting for the reply are passed on to
+the deframer rather than flushed. Samples are kept with their timestamp in a
+fixed-size ring buffer.
+"""
+class RssiSampler:
+    def __init__(self, radio, interval=1.0, idle_time=0.25, history=512, timeout=0.1, clock=time.time):
+        """
+        Args:
+            radio (SX126x): Module to sample, it must be configured with rssi enabled
+            interval (float): Seconds between samples
+            idle_time (float): Seconds without UART traffic before the module counts as idle
+            history (int): Number of samples kept
+            timeout (float): Seconds to wait for the module's reply
+            clock (callable): Source of the sample timestamps
+        """
+        self.radio = radio
+        self.interval = interval
+        self.idle_time = idle_time
+        self.timeout = timeout
+        self.clock = clock
+
+        # (timestamp, dBm), oldest first
+        self.samples = deque(maxlen=history)
+
+        self._thread = None
+        self._stop = threading.Event()
+
+        # Statistics
+        self.skipped = 0
+        self.failures = 0
+
+    def record(self, noise):
+        if noise is None:
+            self.failures += 1
+        else:
+            self.samples.append((self.clock(), noise))
+        return noise
+
+    def latest(self):
+        """Return the newest (timestamp, dBm) sample, or None"""
+        return self.samples[-1] if self.samples else None
+
+    def average(self, seconds=None):
+        """Mean noise RSSI in dBm over the last seconds (all samples if None)"""
+        samples = list(self.samples)
+        if seconds is not None:
+            cutoff = self.clock() - seconds
+            samples = [sample for sample in samples if sample[0] >= cutoff]
+        if not samples:
+            return None
+        return sum(noise for _, noise in samples) / len(samples)
+
+    def is_idle(self, last_activity):
+        """True if the module can be queried without getting in the way of traffic"""
+        radio = self.radio
+        if radio.mode != radio.MODE_NORMAL:
+            return False
+        if time.monotonic() - last_activity < self.idle_time:
+            return False
+        # AUX is low while the module is receiving or transmitting
+        return radio.aux_pin is None or bool(radio.gpio.input(radio.aux_pin))
+
+    def sample(self):
+        """Take one sample if the module is idle, from the blocking API
+
+        Returns:
+            int: The noise RSSI in dBm, or None if no sample was taken
+        """
+        radio = self.radio
+        if not self.is_idle(radio.last_activity) or not radio.io_lock.acquire(blocking=False):
+            self.skipped += 1
+            return None
+        try:
+            # Bytes waiting are the start of a packet, leave them to receive()
+            if radio.ser.inWaiting() > 0 or not self.is_idle(radio.last_activity):
+                self.skipped += 1
+                return None
+            return self.record(radio.query_rssi(self.timeout))
+        finally:
+            radio.io_lock.release()
+
+    def start(self):
+        """Sample from a background thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rssi-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"RSSI sampling failed: {str(e)}")
+
+    async def run(self, transport):
+        """Sample through an AsyncTransport until cancelled"""
+        radio = self.radio
+        while True:
+            await asyncio.sleep(self.interval)
+            # The TX scheduler and blocking API mark the radio, the transport
+            # only knows about its own traffic
+            last_activity = max(radio.last_activity, transport.last_activity)
+            if not self.is_idle(last_activity) or transport.busy or not radio.io_lock.acquire(blocking=False):
+                self.skipped += 1
+                continue
+            try:
+                # Held by the event loop thread, so other threads cannot write
+                # to the module until the reply is in
+                self.record(await transport.query_rssi(self.timeout))
+            finally:
+                radio.io_lock.release()
@@ -0,0 +1,304 @@
+import os
+import random
+import select
+import threading
+import time
+import tty
+
+from . import config
+
+"""
+Hardware-free simulation of SX126x LoRa HATs for throughput and latency
+testing on an ordinary Linux machine.
+
+FakeGPIO stands in for RPi.GPIO and VirtualSX126x emulates a module behind a
+pseudo-terminal pair: the 0xC0/0xC1/0xC2 configuration protocol while M1 is
+high and, in normal mode, fixed transmission with the 3-byte address/channel
+header, packet and channel noise RSSI bytes and a transmit delay computed
+from the configured air speed. Modules attached to the same SimulatedAir
+hear each other, with configurable loss and corruption.
+
+    air = SimulatedAir(loss_rate=0.01)
+    ground = simulated_transceiver(air, freq=433, addr=0)
+    satellite = simulated_transceiver(air, freq=433, addr=0)
+
+A Transceiver is the ground station: it encodes uplinks with the data type
+in the source SSID and decodes downlinks by their destination SSID. Two
+simulated Transceivers therefore do not exchange typed payloads, their
+frames arrive as SSID 0. The peer standing in for the satellite has to send
+downlink frames itself, e.g. benchmarks.frames.downlink_frame() behind the
+module header with satellite.send().
+"""
+
+class FakeGPIO:
+    """Minimal stand-in for the RPi.GPIO module, one instance per simulated board"""
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.pins = {}
+        self.directions = {}
+        self.mode = None
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction):
+        self.directions[pin] = direction
+        self.pins.setdefault(pin, self.LOW)
+
+    def output(self, pin, value):
+        self.pins[pin] = self.HIGH if value else self.LOW
+
+    def input(self, pin):
+        return self.pins.get(pin, self.LOW)
+
+    def cleanup(self):
+        self.pins.clear()
+        self.directions.clear()
+
+
+class SimulatedAir:
+    """The radio channel shared by simulated modules"""
+    def __init__(self, loss_rate=0.0, corruption_rate=0.0, packet_rssi=-60, noise_rssi=-110, seed=None):
+        """
+        Args:
+            loss_rate (float): Probability that a packet is not received
+            corruption_rate (float): Probability that a received packet has a bit flipped
+            packet_rssi (int): RSSI reported for received packets, in dBm
+            noise_rssi (int): Channel noise RSSI reported, in dBm
+            seed (int): Seed for the loss and corruption decisions
+        """
+        self.loss_rate = loss_rate
+        self.corruption_rate = corruption_rate
+        self.packet_rssi = packet_rssi
+        self.noise_rssi = noise_rssi
+        self.random = random.Random(seed)
+        self.modules = []
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.sent = 0
+        self.lost = 0
+        self.corrupted = 0
+
+    def attach(self, module):
+        with self._lock:
+            self.modules.append(module)
+
+    def detach(self, module):
+        with self._lock:
+            if module in self.modules:
+                self.modules.remove(module)
+
+    def transmit(self, sender, payload, target_addr, channel, air_time):
+        """Deliver a packet to every module listening on the channel once it has been on air"""
+        with self._lock:
+            self.sent += 1
+            receivers = [m for m in self.modules if m is not sender and m.accepts(target_addr, channel)]
+            deliveries = []
+            for module in receivers:
+                if self.random.random() < self.loss_rate:
+                    self.lost += 1
+                    continue
+                data = bytearray(payload)
+                if data and self.random.random() < self.corruption_rate:
+                    data[self.random.randrange(len(data))] ^= 1 << self.random.randrange(8)
+                    self.corrupted += 1
+                deliveries.append((module, bytes(data)))
+
+        for module, data in deliveries:
+            timer = threading.Timer(air_time, module.deliver, (data, self.packet_rssi))
+            timer.daemon = True
+            timer.start()
+
+
+class VirtualSX126x:
+    """An emulated SX126x behind a pseudo-terminal"""
+    # Registers 0x00-0x08: ADDH, ADDL, NETID, REG0, REG1, REG2 (channel), REG3, CRYPT_H, CRYPT_L
+    DEFAULT_REGISTERS = bytes([0x00, 0x00, 0x00, 0x62, 0x00, 0x12, 0x43, 0x00, 0x00])
+
+    # Register bits -> setting, the module also accepts 0x00 (300 bps) which SX126x never writes
+    AIR_SPEEDS = {0x00: 300, **{bits: speed for speed, bits in config.AIR_SPEEDS.items()}}
+    PACKET_SIZES = {bits: size for size, bits in config.PACKET_SIZES.items()}
+
+    # A packet ends when the UART has been idle this long or the packet is full
+    IDLE_GAP = 0.005
+
+    def __init__(self, air, gpio=None, m0_pin=22, m1_pin=27, aux_pin=None):
+        """
+        Args:
+            air (SimulatedAir): Channel the module transmits on
+            gpio (FakeGPIO): Board the M0, M1 and AUX pins are on
+        """
+        self.air = air
+        self.gpio = gpio if gpio is not None else FakeGPIO()
+        self.m0_pin = m0_pin
+        self.m1_pin = m1_pin
+        self.aux_pin = aux_pin
+        self.registers = bytearray(self.DEFAULT_REGISTERS)
+
+        # The host opens the slave side like a UART
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+
+        self._rx = bytearray()
+        self._last_rx = 0.0
+        self._write_lock = threading.Lock()
+        self._running = True
+        self._set_aux(True)
+
+        self._thread = threading.Thread(target=self._run, name="virtual-sx126x", daemon=True)
+        self._thread.start()
+        air.attach(self)
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self.air.detach(self)
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+    # Module state derived from the pins and registers
+    @property
+    def config_mode(self):
+        return bool(self.gpio.input(self.m1_pin)) and not self.gpio.input(self.m0_pin)
+
+    @property
+    def normal_mode(self):
+        return not self.gpio.input(self.m1_pin) and not self.gpio.input(self.m0_pin)
+
+    @property
+    def address(self):
+        return (self.registers[0] << 8) | self.registers[1]
+
+    @property
+    def channel(self):
+        return self.registers[5]
+
+    @property
+    def air_speed(self):
+        return self.AIR_SPEEDS[self.registers[3] & 0x07]
+
+    @property
+    def packet_size(self):
+        return self.PACKET_SIZES[self.registers[4] & 0xC0]
+
+    def accepts(self, target_addr, channel):
+        """True if a packet sent to target_addr on channel reaches this module"""
+        return self.normal_mode and channel == self.channel and target_addr in (self.address, 0xFFFF)
+
+    def _set_aux(self, ready):
+        if self.aux_pin is not None:
+            self.gpio.output(self.aux_pin, ready)
+
+    def _write(self, data):
+        with self._write_lock:
+            os.write(self.master_fd, data)
+
+    def deliver(self, payload, rssi):
+        """Called by the air when a packet for this module has been received"""
+        if not self.normal_mode:
+            return
+        data = bytes(payload)
+        if self.registers[6] & 0x80:
+            data += bytes([(256 + rssi) & 0xFF])
+        self._write(data)
+
+    # Host side of the UART
+    def _run(self):
+        while self._running:
+            readable, _, _ = select.select([self.master_fd], [], [], self.IDLE_GAP / 2)
+            now = time.monotonic()
+            if readable:
+                try:
+                    data = os.read(self.master_fd, 4096)
+                except OSError:
+                    return
+                self._rx.extend(data)
+                self._last_rx = now
+                if self.config_mode:
+                    self._handle_config()
+                continue
+
+            if self._rx and now - self._last_rx >= self.IDLE_GAP:
+                if self.config_mode:
+                    # Incomplete command, the module ignores it
+                    self._rx.clear()
+                else:
+                    self._handle_normal()
+
+    def _handle_config(self):
+        """Answer complete 0xC0/0xC1/0xC2 commands"""
+        while len(self._rx) >= 3:
+            command, start, length = self._rx[0], self._rx[1], self._rx[2]
+            if command not in (0xC0, 0xC1, 0xC2) or start + length > len(self.registers):
+                # Not a command, the module answers with an error
+                self._rx.clear()
+                self._write(bytes([0xFF, 0xFF, 0xFF]))
+                return
+
+            if command == 0xC1:
+                del self._rx[:3]
+            else:
+                if len(self._rx) < 3 + length:
+                    return
+                self.registers[start:start + length] = self._rx[3:3 + length]
+                del self._rx[:3 + length]
+            self._write(bytes([0xC1, start, length]) + bytes(self.registers[start:start + length]))
+
+    def _handle_normal(self):
+        """Handle an RSSI query or transmit a packet in fixed transmission mode"""
+        data = bytes(self._rx)
+        self._rx.clear()
+
+        if data[:4] == bytes([0xC0, 0xC1, 0xC2, 0xC3]) and len(data) == 6:
+            start, length = data[4], data[5]
+            if self.registers[4] & 0x20:
+                values = bytes([(256 + self.air.noise_rssi) & 0xFF, (256 + self.air.packet_rssi) & 0xFF])
+                self._write(bytes([0xC1, start, length]) + values[start:start + length])
+            return
+
+        # Packets longer than the packet size are split like the real module does
+        while len(data) > 3:
+            target_addr = (data[0] << 8) | data[1]
+            channel = data[2]
+            payload = data[3:3 + self.packet_size]
+            data = data[:3] + data[3 + self.packet_size:] if len(data) > 3 + self.packet_size else b''
+
+            air_time = len(payload) * 8 / self.air_speed
+            self._set_aux(False)
+            self.air.transmit(self, payload, target_addr, channel, air_time)
+            time.sleep(air_time)
+            self._set_aux(True)
+
+
+def simulated_transceiver(air, aux_pin=None, gpio=None, **kwargs):
+    """
+    Create a Transceiver talking to a new VirtualSX126x on air
+
+    Keyword arguments are passed on to Transceiver. The virtual module is
+    kept as the transceiver's simulator attribute. Radios sharing a board
+    are given the same gpio and their own m0_pin/m1_pin.
+
+    The transceiver encodes frames as the ground station does, a peer that
+    plays the satellite must send satellite-side (downlink) frames.
+    """
+    import serial
+    from .transceiver import Transceiver
+
+    gpio = gpio if gpio is not None else FakeGPIO()
+    pins = {name: kwargs[name] for name in ('m0_pin', 'm1_pin') if kwargs.get(name) is not None}
+    module = VirtualSX126x(air, gpio=gpio, aux_pin=aux_pin, **pins)
+    ser = serial.Serial(module.port, 9600)
+    transceiver = Transceiver(serial_num=module.port, gpio=gpio, ser=ser, aux_pin=aux_pin, **kwargs)
+    transceiver.simulator = module
+    return transceiver
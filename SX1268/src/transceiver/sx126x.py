@@ -1,7 +1,23 @@
-import RPi.GPIO as GPIO
-import serial
+import threading
 import time
 
+# Only available on the Pi, a GPIO module and serial port can be injected instead
+try:
+    import RPi.GPIO as GPIO
+except (ImportError, RuntimeError):
+    GPIO = None
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+from collections import deque
+from AX25UI import AX25UIDeframer
+from metrics import pipeline as metrics
+from .config import SX126xConfig, CMD_READ, read_command, write_command, REGISTER_COUNT
+from .capture import CaptureWriter
+
 """The SX126x class is used for interfacing with LoRa hat transceivers like the SX1268"""
 class SX126x:
     # Pins on the transceiver
@@ -21,207 +37,365 @@ class SX126x:
     # Offset between start and end frequency of the LoRa module (in MHz)
     offset_freq = 18
 
-    SX126X_UART_BAUDRATE_1200 = 0x00
-    SX126X_UART_BAUDRATE_2400 = 0x20
-    SX126X_UART_BAUDRATE_4800 = 0x40
-    SX126X_UART_BAUDRATE_9600 = 0x60
-    SX126X_UART_BAUDRATE_19200 = 0x80
-    SX126X_UART_BAUDRATE_38400 = 0xA0
-    SX126X_UART_BAUDRATE_57600 = 0xC0
-    SX126X_UART_BAUDRATE_115200 = 0xE0
-
-    SX126X_PACKAGE_SIZE_240_BYTE = 0x00
-    SX126X_PACKAGE_SIZE_128_BYTE = 0x40
-    SX126X_PACKAGE_SIZE_64_BYTE = 0x80
-    SX126X_PACKAGE_SIZE_32_BYTE = 0xC0
-
-    SX126X_Power_22dBm = 0x00
-    SX126X_Power_17dBm = 0x01
-    SX126X_Power_13dBm = 0x02
-    SX126X_Power_10dBm = 0x03
-
-    lora_air_speed_dic = {
-        1200: 0x01,
-        2400: 0x02,
-        4800: 0x03,
-        9600: 0x04,
-        19200: 0x05,
-        38400: 0x06,
-        62500: 0x07
-    }
-
-    lora_power_dic = {
-        22: 0x00,
-        17: 0x01,
-        13: 0x02,
-        10: 0x03
-    }
-
-    lora_buffer_size_dic = {
-        240: SX126X_PACKAGE_SIZE_240_BYTE,
-        128: SX126X_PACKAGE_SIZE_128_BYTE,
-        64: SX126X_PACKAGE_SIZE_64_BYTE,
-        32: SX126X_PACKAGE_SIZE_32_BYTE
-    }
-
-    def __init__(self, serial_num, freq, addr, power, rssi, air_speed=2400, net_id=0, buffer_size=240, crypt=0, relay=False, lbt=False, wor=False):
+    # Operating modes as (M0, M1) pin levels
+    MODE_NORMAL = (0, 0)
+    MODE_CONFIG = (0, 1)
+
+    # Time allowed for the module to switch mode or answer a command. When the
+    # AUX pin is connected it is waited on, otherwise SETTLE_TIME is slept.
+    MODE_TIMEOUT = 0.5
+    SETTLE_TIME = 0.1
+    RESPONSE_TIMEOUT = 0.5
+
+    # Command to read the current channel noise RSSI in normal mode
+    RSSI_QUERY = bytes([0xC0, 0xC1, 0xC2, 0xC3, 0x00, 0x02])
+
+    def __init__(self, serial_num, freq, addr, power, rssi, air_speed=2400, net_id=0, buffer_size=240, crypt=0, relay=False, lbt=False, wor=False, gpio=None, ser=None, aux_pin=None, m0_pin=None, m1_pin=None, capture=None):
         self.rssi = rssi
         self.addr = addr
         self.freq = freq
         self.serial_n = serial_num
         self.power = power
+
+        # GPIO module, RPi.GPIO unless a replacement is given
+        self.gpio = gpio if gpio is not None else GPIO
+        if self.gpio is None:
+            raise RuntimeError("RPi.GPIO is not available, pass a gpio module instead")
+
+        # AUX is high while the module is idle and ready for a command
+        self.aux_pin = aux_pin
+
+        # Each HAT needs its own M0 and M1 pins when several are connected
+        if m0_pin is not None:
+            self.M0 = m0_pin
+        if m1_pin is not None:
+            self.M1 = m1_pin
+
         # Initialize the GPIO for M0 and M1 pins
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
-        GPIO.setup(self.M0, GPIO.OUT)
-        GPIO.setup(self.M1, GPIO.OUT)
-        GPIO.output(self.M0, GPIO.LOW)
-        GPIO.output(self.M1, GPIO.HIGH)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
+        self.gpio.setup(self.M0, self.gpio.OUT)
+        self.gpio.setup(self.M1, self.gpio.OUT)
+        if self.aux_pin is not None:
+            self.gpio.setup(self.aux_pin, self.gpio.IN)
+        # Unknown until set() below enters configuration mode, so that first
+        # switch drives the pins and waits for the module
+        self.mode = None
 
         # The hardware UART of Pi3B+, Pi4B is /dev/ttyS0
-        self.ser = serial.Serial(serial_num, 9600)
+        if ser is None:
+            if serial is None:
+                raise RuntimeError("pyserial is not available, pass a serial port instead")
+            ser = serial.Serial(serial_num, 9600)
+        self.ser = ser
         self.ser.flushInput()
+
+        # Splits the received byte stream into frames. The module puts the
+        # sender's address and channel (3 bytes) before each frame.
+        self.deframer = AX25UIDeframer(prefix_len=3, rssi=rssi)
+        self.rx_frames = deque()
+
+        # CaptureWriter that every chunk read from the module is logged to, if any
+        self.capture = capture
+
+        # When the frame last returned by receive() started arriving, and the
+        # first byte read since the previous frame, only kept while metrics are on
+        self.last_frame_started = None
+        self._rx_first = None
+
+        # What the module is known to hold, None until it has been read back
+        self.config = None
+
+        # Held while talking to the module, so background RSSI queries never
+        # interleave with a packet or a configuration command
+        self.io_lock = threading.RLock()
+        # time.monotonic() of the last byte read from or written to the module
+        self.last_activity = 0.0
+
+        # Packet RSSI in dBm of the frame last returned by receive(), if the module reports it
+        self.last_frame_rssi = None
         self.set(freq, addr, power, rssi, air_speed, net_id, buffer_size, crypt, relay, lbt, wor)
 
     def set(self, freq, addr, power, rssi, air_speed=2400, net_id=0, buffer_size=240, crypt=0, relay=False, lbt=False, wor=False):
+        """Configure the module, writing only the registers that change
+
+        Returns:
+            bool: True if the module holds the requested settings
+        """
         self.send_to = addr
         self.addr = addr
+        target = self.build_config(freq, addr, power, rssi, air_speed, net_id, buffer_size, crypt, relay)
+
+        # Nothing to do if the module already has these settings
+        if target == self.config:
+            return True
+
+        with self.io_lock:
+            return self._program(target, rssi)
+
+    def _program(self, target, rssi):
+        """Write target to the module, the caller holds io_lock"""
         # Pull up the M1 pin when setting the module
-        GPIO.output(self.M0, GPIO.LOW)
-        GPIO.output(self.M1, GPIO.HIGH)
-        time.sleep(0.1)
-
-        low_addr = addr & 0xff
-        high_addr = addr >> 8 & 0xff
-        net_id_temp = net_id & 0xff
-        if freq > 850:
-            freq_temp = freq - 850
-            self.start_freq = 850
-            self.offset_freq = freq_temp
-        elif freq > 410:
-            freq_temp = freq - 410
-            self.start_freq = 410
-            self.offset_freq = freq_temp
-
-        air_speed_temp = self.lora_air_speed_dic.get(air_speed, None)
-        buffer_size_temp = self.lora_buffer_size_dic.get(buffer_size, None)
-        power_temp = self.lora_power_dic.get(power, None)
-
-        if rssi:
-            rssi_temp = 0x80  # Enable RSSI value print
-        else:
-            rssi_temp = 0x00  # Disable RSSI value print
-
-        l_crypt = crypt & 0xff
-        h_crypt = crypt >> 8 & 0xff
-
-        if relay == False:
-            self.cfg_reg[3] = high_addr
-            self.cfg_reg[4] = low_addr
-            self.cfg_reg[5] = net_id_temp
-            self.cfg_reg[6] = self.SX126X_UART_BAUDRATE_9600 + air_speed_temp
-            self.cfg_reg[7] = buffer_size_temp + power_temp + 0x20
-            self.cfg_reg[8] = freq_temp
-            self.cfg_reg[9] = 0x43 + rssi_temp
-            self.cfg_reg[10] = h_crypt
-            self.cfg_reg[11] = l_crypt
-        else:
-            self.cfg_reg[3] = 0x01
-            self.cfg_reg[4] = 0x02
-            self.cfg_reg[5] = 0x03
-            self.cfg_reg[6] = self.SX126X_UART_BAUDRATE_9600 + air_speed_temp
-            self.cfg_reg[7] = buffer_size_temp + power_temp + 0x20
-            self.cfg_reg[8] = freq_temp
-            self.cfg_reg[9] = 0x03 + rssi_temp
-            self.cfg_reg[10] = h_crypt
-            self.cfg_reg[11] = l_crypt
+        self.enter_mode(self.MODE_CONFIG)
         self.ser.flushInput()
+        self.deframer.rssi = rssi
+        self.deframer.reset()
+        self.rx_frames.clear()
+        self._rx_first = None
+
+        # Read back what the module holds the first time, so that only the
+        # registers that differ are written
+        if self.config is None:
+            self.ser.write(read_command())
+            self.config = SX126xConfig.from_response(self.read_response(3 + REGISTER_COUNT), self.start_freq)
+
+        acknowledged = True
+        for command in self.config_commands(target):
+            for i in range(2):
+                self.ser.write(command)
 
-        for i in range(2):
-            self.ser.write(bytes(self.cfg_reg))
-            r_buff = 0
-            time.sleep(0.2)
-            if self.ser.inWaiting() > 0:
-                time.sleep(0.1)
-                r_buff = self.ser.read(self.ser.inWaiting())
-                if r_buff[0] == 0xC1:
-                    pass
+                # The module echoes the settings back, starting with 0xC1
+                if self.config_written(command, self.read_response(len(command))):
+                    break
                 else:
-                    pass
-                break
-            else:
-                print("Setting failed, setting again")
-                self.ser.flushInput()
-                time.sleep(0.2)
-                print('\x1b[1A', end='\r')
-                if i == 1:
-                    print("Setting failed, press Esc to exit and run again")
+                    print("Setting failed, setting again")
+                    self.ser.flushInput()
+                    print('\x1b[1A', end='\r')
+                    if i == 1:
+                        print("Setting failed, press Esc to exit and run again")
+                        acknowledged = False
+
+        self.enter_mode(self.MODE_NORMAL)
+        return acknowledged
+
+    def build_config(self, freq, addr, power, rssi, air_speed=2400, net_id=0, buffer_size=240, crypt=0, relay=False):
+        """Fill in cfg_reg and return it as an SX126xConfig"""
+        self.build_cfg_reg(freq, addr, power, rssi, air_speed, net_id, buffer_size, crypt, relay)
+        return SX126xConfig(self.cfg_reg[3:], self.start_freq)
+
+    def config_commands(self, target):
+        """Commands that program target, only the registers that differ when the current settings are known"""
+        if self.config is None:
+            return [write_command(target, self.cfg_reg[0])]
+        return self.config.write_commands(target, self.cfg_reg[0])
+
+    def config_written(self, command, response):
+        """Check the module's answer to a write command and update config
+
+        Returns:
+            bool: True if the module acknowledged the write
+        """
+        if len(response) < len(command) or response[0] != CMD_READ:
+            return False
+        start, length = command[1], command[2]
+        if self.config is None:
+            if start != 0 or length != REGISTER_COUNT:
+                return True
+            self.config = SX126xConfig(command[3:], self.start_freq)
+        else:
+            self.config = self.config.applied(start, command[3:3 + length])
+        return True
+
+    def set_mode(self, mode):
+        """Drive the M0 and M1 pins for one of the MODE_* operating modes
 
-        GPIO.output(self.M0, GPIO.LOW)
-        GPIO.output(self.M1, GPIO.LOW)
-        time.sleep(0.1)
+        Returns:
+            bool: False if the module was already in that mode and nothing was written
+        """
+        if mode == self.mode:
+            return False
+        self.gpio.output(self.M0, mode[0])
+        self.gpio.output(self.M1, mode[1])
+        self.mode = mode
+        return True
+
+    def enter_mode(self, mode):
+        """Switch to an operating mode and wait until the module is ready in it"""
+        if self.set_mode(mode):
+            self.wait_ready()
+
+    def wait_ready(self, timeout=None):
+        """Wait until the module is ready, from the AUX pin if it is connected
+
+        Returns:
+            bool: False if AUX did not go high before the timeout
+        """
+        if self.aux_pin is None:
+            time.sleep(self.SETTLE_TIME)
+            return True
+
+        deadline = time.monotonic() + (self.MODE_TIMEOUT if timeout is None else timeout)
+        while not self.gpio.input(self.aux_pin):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def read_response(self, length, timeout=None):
+        """Wait for the module to answer a command with length bytes
+
+        Returns:
+            bytes: The bytes received, which may be fewer than length on timeout
+        """
+        deadline = time.monotonic() + (self.RESPONSE_TIMEOUT if timeout is None else timeout)
+        while self.ser.inWaiting() < length and time.monotonic() < deadline:
+            time.sleep(0.001)
+        waiting = self.ser.inWaiting()
+        return self.ser.read(waiting) if waiting > 0 else b''
+
+    def build_cfg_reg(self, freq, addr, power, rssi, air_speed=2400, net_id=0, buffer_size=240, crypt=0, relay=False):
+        """Fill in cfg_reg for the requested settings without touching the module"""
+        self.air_speed = air_speed
+        self.buffer_size = buffer_size
+
+        config = SX126xConfig.from_settings(freq, addr, power, rssi, air_speed, net_id, buffer_size, crypt, relay)
+        self.start_freq = config.start_freq
+        self.offset_freq = config.channel
+
+        # Each module gets its own copy, the class attribute is only the default
+        self.cfg_reg = self.cfg_reg[:3] + list(config.registers)
+        return self.cfg_reg
 
     def get_settings(self):
-        # The M1 pin of LoRa HAT must be high when entering setting mode and getting parameters
-        GPIO.output(self.M1, GPIO.HIGH)
-        time.sleep(0.1)
-
-        # Send command to get setting parameters
-        self.ser.write(bytes([0xC1, 0x00, 0x09]))
-        if self.ser.inWaiting() > 0:
-            time.sleep(0.1)
-            self.get_reg = self.ser.read(self.ser.inWaiting())
-
-        # Check the return characters from HAT and print the setting parameters
-        if self.get_reg[0] == 0xC1 and self.get_reg[2] == 0x09:
-            fre_temp = self.get_reg[8]
-            addr_temp = self.get_reg[3] + self.get_reg[4]
-            air_speed_temp = self.get_reg[6] & 0x03
-            power_temp = self.get_reg[7] & 0x03
-
-            print("Frequency is {0}.125MHz.".format(fre_temp))
-            print("Node address is {0}.".format(addr_temp))
-            print("Air speed is {0} bps".format(self.lora_air_speed_dic.get(air_speed_temp, None)))
-            print("Power is {0} dBm".format(self.lora_power_dic.get(power_temp, None)))
-            GPIO.output(self.M1, GPIO.LOW)
+        """Read the settings back from the module and print them
+
+        Returns:
+            SX126xConfig: None if the module did not answer
+        """
+        with self.io_lock:
+            # The M1 pin of LoRa HAT must be high when entering setting mode and getting parameters
+            self.enter_mode(self.MODE_CONFIG)
+
+            # Send command to get setting parameters
+            self.ser.write(read_command())
+            response = self.read_response(3 + REGISTER_COUNT)
+            if response:
+                self.get_reg = response
+
+            # Check the return characters from HAT and print the setting parameters
+            config = SX126xConfig.from_response(response, self.start_freq)
+            if config is not None:
+                print("Frequency is {0}MHz.".format(config.frequency))
+                print("Node address is {0}.".format(config.address))
+                print("Air speed is {0} bps".format(config.air_speed))
+                print("Power is {0} dBm".format(config.power))
+            else:
+                print("Failed to read settings")
+            self.enter_mode(self.MODE_NORMAL)
+        return config
 
     def send(self, data):
-        # Set the module to transmission mode
-        GPIO.output(self.M1, GPIO.LOW)
-        GPIO.output(self.M0, GPIO.LOW)
-        time.sleep(0.1)
+        with self.io_lock:
+            # Set the module to transmission mode, if it is not already
+            self.enter_mode(self.MODE_NORMAL)
 
-        # Send data
-        self.ser.write(data)
-        time.sleep(0.1)
+            # Send data and wait until it has left the UART and the module is idle
+            self.ser.write(data)
+            self.ser.flush()
+            metrics.record_tx(data)
+            self.wait_ready()
+            self.last_activity = time.monotonic()
 
     def receive(self):
-        # Check if there is data to read
-        if self.ser.inWaiting() > 0:
-            time.sleep(0.5)
-            r_buff = self.ser.read(self.ser.inWaiting())
-            message = r_buff[3:]
-
-            if self.rssi:
-                print("The packet RSSI value: -{0}dBm".format(256 - r_buff[-1:][0]))
-                self.get_channel_rssi()
-            return message
-        else:
-            return None
+        """Return the next complete frame received, or None if there is none yet"""
+        with self.io_lock:
+            # Read whatever has arrived, without waiting for the rest of a packet
+            if not self.rx_frames:
+                waiting = self.ser.inWaiting()
+                if waiting > 0:
+                    data = self.ser.read(waiting)
+                    self.last_activity = time.monotonic()
+                    self.rx_frames.extend(self.deframe(data))
+            if not self.rx_frames:
+                return None
+            raw_frame, self.last_frame_started = self.rx_frames.popleft()
+
+        # The module appends the packet RSSI when rssi is enabled
+        self.last_frame_rssi = -(256 - raw_frame.rssi) if raw_frame.rssi is not None else None
+        return raw_frame.frame
+
+    def deframe(self, data):
+        """Feed received bytes to the deframer
+
+        Returns:
+            list: (RawFrame, time the frame started arriving) tuples, the time
+                is None while metrics are disabled
+        """
+        if self.capture is not None:
+            self.capture.write(data)
+
+        if not metrics.enabled():
+            return [(raw_frame, None) for raw_frame in self.deframer.feed(data)]
+
+        now = metrics.clock()
+        if self._rx_first is None:
+            self._rx_first = now
+        discarded = self.deframer.bytes_discarded
+        raw_frames = self.deframer.feed(data)
+
+        metrics.BYTES_READ.inc(len(data))
+        metrics.BYTES_DISCARDED.inc(self.deframer.bytes_discarded - discarded)
+        if not raw_frames:
+            return []
+
+        started = self._rx_first
+        metrics.FRAMES_RECEIVED.inc(len(raw_frames))
+        metrics.STAGE_SECONDS.observe(now - started, stage='uart')
+        # Bytes left over belong to the next frame, which started in this read
+        self._rx_first = now if len(self.deframer.buffer) > self.deframer.prefix_len else None
+        return [(raw_frame, started) for raw_frame in raw_frames]
+
+    def start_capture(self, path, flush_interval=1.0):
+        """Log every chunk read from the module to a raw capture file
+
+        Returns:
+            CaptureWriter: The open log
+        """
+        self.stop_capture()
+        self.capture = CaptureWriter(path, rssi=self.rssi, flush_interval=flush_interval)
+        return self.capture
+
+    def stop_capture(self):
+        """Close the raw capture log, if one is open"""
+        capture, self.capture = self.capture, None
+        if capture is not None:
+            capture.close()
+
+    def query_rssi(self, timeout=None):
+        """Ask the module for the channel noise RSSI
+
+        Received bytes are never thrown away, anything in the answer that is
+        not the reply is passed on to the deframer.
+
+        Returns:
+            int: The channel noise RSSI in dBm, or None if the module did not reply
+        """
+        with self.io_lock:
+            self.enter_mode(self.MODE_NORMAL)
+            self.ser.write(self.RSSI_QUERY)
+            # 0xC1, start, length and the requested registers
+            response = self.read_response(3 + self.RSSI_QUERY[5], timeout)
+            self.last_activity = time.monotonic()
+
+            if len(response) >= 4 and response[0] == 0xC1 and response[1] == 0x00 and response[2] == 0x02:
+                noise = -(256 - response[3])
+                received = response[3 + self.RSSI_QUERY[5]:]
+            else:
+                noise = None
+                received = response
+            if received:
+                self.rx_frames.extend(self.deframe(received))
+        return noise
 
     def get_channel_rssi(self):
-        # Set the module to normal mode and get channel RSSI
-        GPIO.output(self.M1, GPIO.LOW)
-        GPIO.output(self.M0, GPIO.LOW)
-        time.sleep(0.1)
-        self.ser.flushInput()
-        self.ser.write(bytes([0xC0, 0xC1, 0xC2, 0xC3, 0x00, 0x02]))
-        time.sleep(0.5)
-        re_temp = bytes(5)
-        if self.ser.inWaiting() > 0:
-            time.sleep(0.1)
-            re_temp = self.ser.read(self.ser.inWaiting())
-        if re_temp[0] == 0xC1 and re_temp[1] == 0x00 and re_temp[2] == 0x02:
-            print("The current noise RSSI value: -{0}dBm".format(256 - re_temp[3]))
+        """Query and print the channel noise RSSI
+
+        Returns:
+            int: The channel noise RSSI in dBm, or None if the module did not reply
+        """
+        noise = self.query_rssi()
+        if noise is not None:
+            print("The current noise RSSI value: {0}dBm".format(noise))
         else:
             print("Failed to receive RSSI value")
+        return noise
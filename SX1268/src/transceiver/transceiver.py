@@ -2,9 +2,12 @@ import json
 import sys
 import termios
 from .sx126x import SX126x
+from .tx_scheduler import TxScheduler
+from .rssi_sampler import RssiSampler
 import tty
-from AX25UI import AX25UIFrameDecoder, AX25UIFrame
+from AX25UI import AX25UIFrameDecoder, AX25UIPacketEncoder, AX25UIFragmenter, AX25UIReassembler, AX25UIDeduplicator, AX25UICommandCodec, FCSError, FRAGMENT_SSID
 from data_management import DataManager
+from metrics import pipeline as metrics
 
 class Transceiver(SX126x):
     def __init__(
@@ -15,75 +18,278 @@ class Transceiver(SX126x):
             power=22, 
             rssi=False, 
             air_speed=2400, 
-            relay=False
+            relay=False,
+            buffer_size=240,
+            gpio=None,
+            ser=None,
+            aux_pin=None,
+            m0_pin=None,
+            m1_pin=None,
+            data_manager=None,
+            deduplicator=None,
+            capture=None
         ) -> None:
-        super().__init__(serial_num=serial_num, freq=freq, addr=addr, power=power, rssi=rssi, air_speed=air_speed, relay=relay)
+        super().__init__(serial_num=serial_num, freq=freq, addr=addr, power=power, rssi=rssi, air_speed=air_speed, buffer_size=buffer_size, relay=relay, gpio=gpio, ser=ser, aux_pin=aux_pin, m0_pin=m0_pin, m1_pin=m1_pin, capture=capture)
         
-        # Terminal settings
-        self.old_settings = termios.tcgetattr(sys.stdin)
+        # Terminal settings, there are none when stdin is not a terminal
+        # (e.g. simulated links in tests and benchmarks)
+        try:
+            self.old_settings = termios.tcgetattr(sys.stdin)
+        except (termios.error, ValueError):
+            self.old_settings = None
 
-        # Data manajer initialisation
-        self.data_manager = DataManager()
+        # Data manajer initialisation, radios in one station can share one
+        self.data_manager = data_manager if data_manager is not None else DataManager()
 
         # File path of received commands for visualization
         self.json_file_path = 'received_commands.json'
+
+        # Frame decoder
+        self.decoder = AX25UIFrameDecoder()
+
+        # Packet encoder, caches the module header and addresses between packets
+        self.packet_encoder = AX25UIPacketEncoder()
+
+        # Queues packets and sends them in paced bursts
+        self.tx_scheduler = TxScheduler(self)
+
+        # Splits payloads larger than the module packet size and rebuilds received ones
+        self.fragmenter = AX25UIFragmenter(self.buffer_size)
+        self.reassembler = AX25UIReassembler()
+
+        # Packs several commands into one frame
+        self.command_codec = AX25UICommandCodec(self.buffer_size)
+
+        # Repeated frames are only stored once, a relay repeats every frame
+        self.deduplicator = deduplicator if deduplicator is not None else (AX25UIDeduplicator() if relay else None)
+
+        # Channel noise RSSI, sampled in the background while the channel is quiet
+        self.rssi_sampler = RssiSampler(self)
+
+    def build_packet(
+            self,
+            message,
+            ssid_type=0b0111
+        ) -> bytes:
+        """Encodes a message into an AX.25 frame behind the module header
+
+        Args:
+            message (str or bytes): Info field of the frame
+            ssid_type (int): Data type of the message, commands by default
+        """
+        DEFAULT_ADDRESS = 0
+        offset_frequency = self.freq - (850 if self.freq > 850 else 410)
+        return self.packet_encoder.encode(
+            message, ssid_type,
+            DEFAULT_ADDRESS, offset_frequency,
+            self.addr, self.offset_freq
+        )
     
+    def send_commands(
+            self,
+            messages,
+            priority=TxScheduler.PRIORITY_NORMAL,
+            binary=True
+        ) -> int:
+        """Sends many commands back to back in a single burst
+
+        Args:
+            messages (list): Commands in the format <component>,<component_id>,<command>
+            priority (int): TxScheduler priority of the commands
+            binary (bool): Pack as many commands as fit into each frame, otherwise
+                send one ASCII command per frame
+
+        Returns:
+            int: Number of packets sent
+        """
+        payloads = self.command_codec.encode(messages) if binary else messages
+        for payload in payloads:
+            self.tx_scheduler.submit(self.build_packet(payload), priority)
+        return self.tx_scheduler.flush()
+
+    def send_command(
+            self,
+            message,
+            priority=TxScheduler.PRIORITY_NORMAL,
+            on_done=None
+        ) -> int:
+        """Queues one command on the TxScheduler without waiting for it to be sent
+
+        Args:
+            message (str or bytes): Command in the format <component>,<component_id>,<command>
+            priority (int): TxScheduler priority of the command
+            on_done (callable): Called with the sequence number and None once it has
+                been sent, or the exception if it could not be
+
+        Returns:
+            int: TxScheduler sequence number of the packet
+        """
+        if not self.fragmenter.fits(message.encode() if isinstance(message, str) else message):
+            raise ValueError(f"Command is longer than the {self.buffer_size} byte packet")
+        return self.tx_scheduler.submit(self.build_packet(message), priority, on_done)
+
+    def send_payload(
+            self,
+            payload,
+            ssid_type,
+            priority=TxScheduler.PRIORITY_BULK
+        ) -> int:
+        """Sends a payload of any size, split into fragments if it does not fit in one packet
+
+        Args:
+            payload (bytes): Data to send
+            ssid_type (int): Data type of the payload
+            priority (int): TxScheduler priority of the packets
+
+        Returns:
+            int: Number of packets sent
+        """
+        if self.fragmenter.fits(payload):
+            self.tx_scheduler.submit(self.build_packet(payload, ssid_type), priority)
+        else:
+            for fragment in self.fragmenter.fragment(payload, ssid_type):
+                self.tx_scheduler.submit(self.build_packet(fragment, FRAGMENT_SSID), priority)
+        return self.tx_scheduler.flush()
+
     def send_deal(
             self
         ) -> None:
         """Sends data after taking input from the user"""
         # Receive message from user
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self.old_settings)
-        print("\nPlease input your commands in the format <component>,<component_id>,<command>: ", end='')
-        message = input()
-
-        # Frame encoder
-        ssid_type = 0b0111  # Command data type
-        ax25_frame = AX25UIFrame(message, ssid_type)
-        frame = ax25_frame.create_frame()
+        print("\nPlease input your commands in the format <component>,<component_id>,<command>, separated by ';': ", end='')
+        messages = [message for message in input().split(';') if message.strip()]
 
-        # Package encoder details
-        DEFAULT_ADDRESS = 0
-        offset_frequency = self.freq - (850 if self.freq > 850 else 410)        
-        data = (bytes([DEFAULT_ADDRESS >> 8]) + 
-                bytes([DEFAULT_ADDRESS & 0xff]) +
-                bytes([offset_frequency]) + 
-                bytes([self.addr >> 8]) + 
-                bytes([self.addr & 0xff]) + 
-                bytes([self.offset_freq]) + 
-                frame)
-        self.send(data)
-        print("Message sent!")
+        # Commands are packed into as few frames as possible
+        try:
+            self.send_commands(messages)
+            print("Message sent!")
+        except ValueError as e:
+            print(f"Message not sent: {str(e)}")
         tty.setcbreak(sys.stdin.fileno())
         return None
 
 
     def receive_data(self):
+        """Decode and store every frame received so far, returning the decoded frames"""
+        decoded_frames = []
         data = self.receive()
+        while data:
+            decoded_frame = self.handle_frame(data, self.last_frame_started, self.last_frame_rssi)
+            if decoded_frame is not None:
+                decoded_frames.append(decoded_frame)
+            data = self.receive()
+        return decoded_frames
 
-        if data:
-            try:
-                # Make sure data is in byts
-                if isinstance(data, bytes):
-                    # Initialise decoder
-                    decoder = AX25UIFrameDecoder()
-                    decoded_frame = decoder.decode_ax25_frame(data)
-
-                    # Take out ssid and info
-                    ssid = decoded_frame["d_ssid"]
-                    info_data = decoded_frame["info"]
-
-                    # Append to json files
-                    json_data = self.data_manager.convert_bytes_to_json(info_data, ssid)
-                    self.data_manager.append_to_json(json_data, ssid)
-                    return decoded_frame
-                else:
-                    print("Received non-byte data")
-                    return None
-            except Exception as e:
-                print(f"Error handling received data: {str(e)}")
+    def handle_frame(self, data, started=None, rssi=None):
+        """Decode a single AX.25 frame and append its contents to the json files
+
+        Args:
+            data (bytes): The frame, including its flags
+            started (float): metrics.clock() time the frame started arriving, for the total latency
+            rssi (int): Packet RSSI in dBm, kept on the returned frame
+
+        Returns:
+            AX25UIFrameView: The decoded frame, use to_dict() for the dict format
+        """
+        # Store partial WOD records that have timed out
+        self.data_manager.flush_wod_data()
+
+        result = self.parse_frame(data, rssi)
+        if result is None:
+            return None
+        frame, ssid, json_data = result
+
+        # Append to json files, multi-packet data only once it is complete
+        if json_data is not None and not self.store_record(json_data, ssid, started):
+            return None
+        return frame
+
+    def parse_frame(self, data, rssi=None):
+        """Decode a single AX.25 frame and parse its payload without storing it
+
+        Returns:
+            tuple: (frame, ssid, json_data), json_data is None when there is
+                nothing to store yet (duplicates, incomplete multi-packet data).
+                None if the frame could not be decoded or parsed.
+        """
+        timed = metrics.enabled()
+        stage, ssid = 'decode', None
+        try:
+            # Make sure data is in byts
+            if isinstance(data, bytes):
+                t0 = metrics.clock() if timed else 0
+
+                # Check the frame, fields are read straight from the buffer
+                frame = self.decoder.decode_view(data)
+                frame.rssi = rssi
+
+                # Take out ssid and info
+                ssid = frame.ssid
+                info_data = frame.info
+                if timed:
+                    t1 = metrics.clock()
+                    metrics.STAGE_SECONDS.observe(t1 - t0, stage='decode')
+                    metrics.FRAMES_DECODED.inc(ssid=ssid)
+                    t0 = t1
+
+                # Copies of a frame already handled are not stored again
+                if self.deduplicator is not None and self.deduplicator.seen(frame):
+                    if timed:
+                        metrics.FRAMES_DUPLICATE.inc(ssid=ssid)
+                    return frame, ssid, None
+
+                # Frames from this radio and sender are reassembled together
+                stream = (self.serial_n, frame.s_call)
+
+                # Payloads split over several frames are handled once complete
+                stage = 'parse'
+                if ssid == FRAGMENT_SSID:
+                    payload = self.reassembler.add(info_data, stream)
+                    if payload is None:
+                        return frame, ssid, None
+                    ssid, info_data = payload
+
+                json_data = self.data_manager.convert_bytes_to_json(info_data, ssid, stream)
+                if timed:
+                    metrics.STAGE_SECONDS.observe(metrics.clock() - t0, stage='parse')
+                return frame, ssid, json_data
+            else:
+                print("Received non-byte data")
                 return None
-            
+        except Exception as e:
+            if timed:
+                if stage == 'decode':
+                    failures = metrics.FCS_FAILURES if isinstance(e, FCSError) else metrics.DECODE_ERRORS
+                    failures.inc()
+                else:
+                    metrics.PARSE_ERRORS.inc(ssid=ssid)
+            print(f"Error handling received data: {str(e)}")
+            return None
+
+    def store_record(self, json_data, ssid, started=None):
+        """Append a parsed record to the json files
+
+        Returns:
+            bool: False if it could not be stored
+        """
+        timed = metrics.enabled()
+        try:
+            t0 = metrics.clock() if timed else 0
+            self.data_manager.append_to_json(json_data, ssid)
+            if timed:
+                t1 = metrics.clock()
+                metrics.STAGE_SECONDS.observe(t1 - t0, stage='store')
+                metrics.STORAGE_WRITES.inc(ssid=ssid)
+                if started is not None:
+                    metrics.STAGE_SECONDS.observe(t1 - started, stage='total')
+            return True
+        except Exception as e:
+            if timed:
+                metrics.STORAGE_ERRORS.inc(ssid=ssid)
+            print(f"Error handling received data: {str(e)}")
+            return False
+
     def startup_command(
             self
         ) -> None:
@@ -91,24 +297,9 @@ class Transceiver(SX126x):
         # Draft startup message
         message = "c,0,1"
 
-        # Frame encoder
-        ssid_type = 0b0111  # Command data type
-        ax25_frame = AX25UIFrame(message, ssid_type)
-        frame = ax25_frame.create_frame()
-
-        # Package encoder details
-        DEFAULT_ADDRESS = 0
-        offset_frequency = self.freq - (850 if self.freq > 850 else 410)        
-        data = (bytes([DEFAULT_ADDRESS >> 8]) + 
-                bytes([DEFAULT_ADDRESS & 0xff]) +
-                bytes([offset_frequency]) + 
-                bytes([self.addr >> 8]) + 
-                bytes([self.addr & 0xff]) + 
-                bytes([self.offset_freq]) + 
-                frame)
-        self.send(data)
+        # Frame and package encoder
+        self.send(self.build_packet(message))
         print("Startup command sent")
-        tty.setcbreak(sys.stdin.fileno())
         return None
     
 
@@ -119,30 +310,16 @@ class Transceiver(SX126x):
         # Draft ending message
         message = "c,0,0"
 
-        # Frame encoder
-        ssid_type = 0b0111  # Command data type
-        ax25_frame = AX25UIFrame(message, ssid_type)
-        frame = ax25_frame.create_frame()
-
-        # Package encoder details
-        DEFAULT_ADDRESS = 0
-        offset_frequency = self.freq - (850 if self.freq > 850 else 410)        
-        data = (bytes([DEFAULT_ADDRESS >> 8]) + 
-                bytes([DEFAULT_ADDRESS & 0xff]) +
-                bytes([offset_frequency]) + 
-                bytes([self.addr >> 8]) + 
-                bytes([self.addr & 0xff]) + 
-                bytes([self.offset_freq]) + 
-                frame)
-        self.send(data)
+        # Frame and package encoder
+        self.send(self.build_packet(message))
         print("Ending command sent")
-        tty.setcbreak(sys.stdin.fileno())
         return None
     
 
     def reset_terminal_settings(self):
         """ Reset terminal settings to their original state. """
-        termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self.old_settings)
+        if self.old_settings is not None:
+            termios.tcsetattr(sys.stdin, termios.TCSADRAIN, self.old_settings)
         return None
 
     
\ No newline at end of file
@@ -0,0 +1,194 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+
+from metrics import pipeline as metrics
+
+"""
+The TxScheduler class queues packets for an SX126x and sends them in bursts.
+The module is switched to transmission mode once per burst instead of once
+per packet, and writes are paced from the configured air speed and the
+packet size rather than fixed sleeps. Packets are sent in priority order,
+so urgent commands jump ahead of bulk traffic that is still queued.
+"""
+class TxScheduler:
+    PRIORITY_URGENT = 0
+    PRIORITY_NORMAL = 10
+    PRIORITY_BULK = 20
+
+    def __init__(self, radio, uart_baudrate=9600, margin=1.2, settle_time=0.1, history=256, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            radio (SX126x): Configured module to send with
+            uart_baudrate (int): Baud rate between the Pi and the module
+            margin (float): Factor applied to the computed time on air
+            settle_time (float): Time for the module to switch mode at the start of a burst
+            history (int): Number of per-packet latencies kept
+            clock (callable): Time source, in seconds
+            sleep (callable): Used to wait between packets
+        """
+        self.radio = radio
+        self.uart_baudrate = uart_baudrate
+        self.margin = margin
+        self.settle_time = settle_time
+        self.clock = clock
+        self.sleep = sleep
+
+        # Heap of (priority, sequence, data, submitted, on_done)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+        # When the module will be ready for the next packet
+        self._ready_at = 0.0
+
+        # Statistics
+        self.sent = 0
+        self.failed = 0
+        self.sent_bytes = 0
+        self.latencies = deque(maxlen=history)
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def airtime(self, length):
+        """Seconds the module needs to take in and transmit a packet of length bytes"""
+        air_speed = getattr(self.radio, 'air_speed', None) or 2400
+        uart_time = length * 10 / self.uart_baudrate
+        air_time = length * 8 / air_speed
+        return max(uart_time, air_time) * self.margin
+
+    def submit(self, data, priority=PRIORITY_NORMAL, on_done=None):
+        """
+        Queue a packet for sending
+
+        Args:
+            data (bytes): Module header and frame, e.g. from Transceiver.build_packet
+            priority (int): Lower values are sent first
+            on_done (callable): Called with the sequence number and None once the packet
+                has been written to the module, or the exception if it could not be,
+                from the thread that sent it
+
+        Returns:
+            int: Sequence number of the packet
+        """
+        with self._condition:
+            sequence = next(self._sequence)
+            heapq.heappush(self._queue, (priority, sequence, bytes(data), self.clock(), on_done))
+            self._condition.notify()
+        return sequence
+
+    def _pop(self):
+        with self._condition:
+            if not self._queue:
+                return None
+            return heapq.heappop(self._queue)
+
+    def _transmit(self, item):
+        """Send one packet, waiting until the module is ready for it"""
+        _, sequence, data, submitted, on_done = item
+        delay = self._ready_at - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+        try:
+            # The mode is checked for every packet under the lock, a configuration
+            # change between two packets of a burst leaves the module in CONFIG
+            with self.radio.io_lock:
+                # Only wait for the module to settle if the pins actually changed
+                if self.radio.set_mode(self.radio.MODE_NORMAL):
+                    self.sleep(self.settle_time)
+                self.radio.ser.write(data)
+                # The module stays busy until the packet has been sent
+                self.radio.last_activity = time.monotonic() + self.airtime(len(data))
+        except Exception as e:
+            self.failed += 1
+            print(f"Error sending packet {sequence}: {str(e)}")
+            self._done(on_done, sequence, e)
+            return
+
+        metrics.record_tx(data)
+        now = self.clock()
+        self._ready_at = now + self.airtime(len(data))
+
+        self.sent += 1
+        self.sent_bytes += len(data)
+        self.latencies.append(now - submitted)
+        self._done(on_done, sequence, None)
+
+    @staticmethod
+    def _done(on_done, sequence, error):
+        if on_done is None:
+            return
+        try:
+            on_done(sequence, error)
+        except Exception as e:
+            print(f"Error in packet sent callback: {str(e)}")
+
+    def flush(self):
+        """Send everything queued as a single burst, blocking until done
+
+        Returns:
+            int: Number of packets sent
+        """
+        count = 0
+        item = self._pop()
+        while item is not None:
+            self._transmit(item)
+            count += 1
+            item = self._pop()
+        return count
+
+    def start(self):
+        """Send queued packets from a background thread"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="tx-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, drain=True):
+        """Stop the background thread, sending what is still queued if drain is True"""
+        if self._thread is None:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._thread = None
+        if drain:
+            self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._queue:
+                    self._condition.wait()
+                if not self._running:
+                    return
+            item = self._pop()
+            if item is None:
+                continue
+            try:
+                self._transmit(item)
+            except Exception as e:
+                # Anything _transmit did not report, the thread keeps sending the rest
+                print(f"Error in TX scheduler: {str(e)}")
+
+    def stats(self):
+        """Return queue depth, packets sent and latency figures as a dict"""
+        latencies = list(self.latencies)
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "sent_bytes": self.sent_bytes,
+            "failed": self.failed,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "latency_max": max(latencies) if latencies else None,
+            "latency_last": latencies[-1] if latencies else None,
+        }